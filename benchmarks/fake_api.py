@@ -0,0 +1,284 @@
+"""
+Local stand-in of the BigQuery REST API and the Storage API used by the offline benchmarks.
+
+It keeps datasets and tables in memory and implements just enough of the endpoints the component calls:
+dataset get/patch with ETag (``If-Match`` => HTTP 412) semantics, table get/insert/patch/delete with view schema
+derived from the view query, project and dataset listing, the OAuth token endpoint and the Storage API
+bucket table listing and table detail. Every request can be delayed and dataset updates can fail with
+an injected HTTP 412 to simulate concurrent writers.
+"""
+
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+SOURCE_COLUMNS = ["id", "name", "amount", "updated_at"]
+
+_DATASET_PATH = re.compile(r"^/bigquery/v2/projects/([^/]+)/datasets/([^/]+)$")
+_TABLES_PATH = re.compile(r"^/bigquery/v2/projects/([^/]+)/datasets/([^/]+)/tables$")
+_TABLE_PATH = re.compile(r"^/bigquery/v2/projects/([^/]+)/datasets/([^/]+)/tables/([^/]+)$")
+_SAPI_BUCKET_TABLES_PATH = re.compile(r"^/v2/storage/buckets/([^/]+)/tables$")
+_SAPI_TABLE_PATH = re.compile(r"^/v2/storage/tables/([^/]+)$")
+_VIEW_SOURCE = re.compile(r"FROM\s+`([^`]+)`\.`([^`]+)`\.`([^`]+)`", re.IGNORECASE)
+
+
+def _etag():
+    return uuid.uuid4().hex
+
+
+class FakeApi:
+    """
+    In-memory state of the fake APIs with request counting, latency and conflict injection.
+    """
+
+    def __init__(self, latency_ms=0.0, conflict_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.conflict_rate = conflict_rate
+        self.random = random.Random(seed)
+        self.datasets = {}
+        self.tables = {}
+        self.sapi_tables = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self._server = None
+
+    # state setup
+
+    def add_dataset(self, project, dataset_id, location="US"):
+        self.datasets[(project, dataset_id)] = {
+            "kind": "bigquery#dataset",
+            "id": f"{project}:{dataset_id}",
+            "datasetReference": {"projectId": project, "datasetId": dataset_id},
+            "location": location,
+            "etag": _etag(),
+            "access": [{"role": "OWNER", "specialGroup": "projectOwners"}],
+        }
+
+    def add_source_bucket(self, project, bucket_id, table_count):
+        """
+        Creates the BigQuery dataset of the bucket with its tables and the matching Storage API tables.
+        """
+        stage, bucket = bucket_id.split(".")
+        dataset_id = f"{stage}_{bucket.replace('-', '_')}"
+        self.add_dataset(project, dataset_id)
+        for index in range(table_count):
+            name = f"table_{index:05d}"
+            self.tables[(project, dataset_id, name)] = self._table_resource(
+                project, dataset_id, name, {"type": "TABLE", "schema": {"fields": self._fields(SOURCE_COLUMNS)}}
+            )
+            self.sapi_tables[f"{bucket_id}.{name}"] = {
+                "id": f"{bucket_id}.{name}",
+                "name": name,
+                "displayName": name,
+                "bucket": {"id": bucket_id},
+                "columns": SOURCE_COLUMNS,
+                "lastChangeDate": "2024-01-01T00:00:00+0100",
+                "metadata": [{"key": "KBC.description", "value": f"Table {name}"}],
+                "columnMetadata": {"id": [{"key": "KBC.description", "value": "Identifier"}]},
+            }
+
+    @staticmethod
+    def _fields(columns):
+        return [{"name": column, "type": "STRING", "mode": "NULLABLE"} for column in columns]
+
+    @staticmethod
+    def _table_resource(project, dataset_id, table_id, body):
+        resource = dict(body)
+        resource.update(
+            {
+                "kind": "bigquery#table",
+                "id": f"{project}:{dataset_id}.{table_id}",
+                "tableReference": {"projectId": project, "datasetId": dataset_id, "tableId": table_id},
+                "creationTime": str(int(time.time() * 1000)),
+                "etag": _etag(),
+            }
+        )
+        return resource
+
+    def count(self, prefix=""):
+        with self.lock:
+            return sum(1 for r in self.requests if r["operation"].startswith(prefix))
+
+    def latencies(self):
+        with self.lock:
+            return [r["seconds"] for r in self.requests if r["operation"] != "token"]
+
+    def reset_requests(self):
+        with self.lock:
+            self.requests = []
+
+    # server
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # request handling
+
+    def handle(self, method, path, headers, body):
+        """
+        Returns (operation, HTTP status, response body).
+        """
+        if path == "/token":
+            return "token", 200, {"access_token": "fake-token", "token_type": "Bearer", "expires_in": 3600}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            match = _DATASET_PATH.match(path)
+            if match:
+                return self._dataset(method, match.groups(), headers, body)
+            match = _TABLES_PATH.match(path)
+            if match and method == "POST":
+                return self._insert_table(match.groups(), body)
+            if match and method == "GET":
+                project, dataset_id = match.groups()
+                tables = [t for (p, d, _), t in self.tables.items() if (p, d) == (project, dataset_id)]
+                return "list_tables", 200, {"tables": tables, "totalItems": len(tables)}
+            match = _TABLE_PATH.match(path)
+            if match:
+                return self._table(method, match.groups(), headers, body)
+            if path == "/bigquery/v2/projects":
+                projects = sorted({p for p, _ in self.datasets})
+                return "list_projects", 200, {
+                    "projects": [
+                        {"id": p, "projectReference": {"projectId": p}, "friendlyName": p} for p in projects
+                    ]
+                }
+            match = _SAPI_BUCKET_TABLES_PATH.match(path)
+            if match:
+                bucket_id = match.group(1)
+                return "sapi_list_tables", 200, [
+                    t for t in self.sapi_tables.values() if t["bucket"]["id"] == bucket_id
+                ]
+            match = _SAPI_TABLE_PATH.match(path)
+            if match and match.group(1) in self.sapi_tables:
+                return "sapi_tables_detail", 200, self.sapi_tables[match.group(1)]
+        return "unknown", 404, {"error": {"code": 404, "message": f"Not found: {method} {path}"}}
+
+    def _dataset(self, method, key, headers, body):
+        dataset = self.datasets.get(key)
+        if dataset is None:
+            return "get_dataset", 404, {"error": {"code": 404, "message": f"Not found: Dataset {key}"}}
+        if method == "GET":
+            return "get_dataset", 200, dataset
+        if_match = headers.get("If-Match")
+        if (if_match and if_match != dataset["etag"]) or self.random.random() < self.conflict_rate:
+            return "update_dataset", 412, {"error": {"code": 412, "message": "Precondition check failed."}}
+        dataset.update({k: v for k, v in body.items() if k in ("access", "description", "labels")})
+        dataset["etag"] = _etag()
+        return "update_dataset", 200, dataset
+
+    def _view_fields(self, query):
+        source = _VIEW_SOURCE.search(query or "")
+        if source is None:
+            return None
+        source_table = self.tables.get(source.groups())
+        if source_table is None:
+            return None
+        select = query[: source.start()]
+        columns = [f["name"] for f in source_table["schema"]["fields"]]
+        if "*" not in select:
+            columns = [column for column in re.findall(r"`([^`]+)`", select) if column in columns]
+        return self._fields(columns)
+
+    def _apply_view(self, resource, body):
+        """
+        Derives the view schema from its query; a provided schema must match it (descriptions are kept).
+        """
+        fields = self._view_fields(resource.get("view", {}).get("query"))
+        if fields is None:
+            return {"error": {"code": 400, "message": "Invalid view query"}}
+        provided = body.get("schema", {}).get("fields")
+        if provided:
+            if [f["name"] for f in provided] != [f["name"] for f in fields]:
+                return {"error": {"code": 400, "message": "Provided Schema does not match the view query"}}
+            fields = provided
+        resource["schema"] = {"fields": fields}
+        return None
+
+    def _insert_table(self, key, body):
+        project, dataset_id = key
+        table_id = body["tableReference"]["tableId"]
+        if (project, dataset_id, table_id) in self.tables:
+            return "create_table", 409, {"error": {"code": 409, "message": "Already Exists"}}
+        resource = self._table_resource(project, dataset_id, table_id, body)
+        if "view" in body:
+            resource["type"] = "VIEW"
+            error = self._apply_view(resource, body)
+            if error:
+                return "create_table", 400, error
+        self.tables[(project, dataset_id, table_id)] = resource
+        return "create_table", 200, resource
+
+    def _table(self, method, key, headers, body):
+        key = tuple(unquote(part) for part in key)
+        table = self.tables.get(key)
+        operation = {"GET": "get_table", "PATCH": "update_table", "PUT": "update_table", "DELETE": "delete_table"}
+        if table is None:
+            return operation[method], 404, {"error": {"code": 404, "message": f"Not found: Table {key}"}}
+        if method == "GET":
+            return "get_table", 200, table
+        if method == "DELETE":
+            del self.tables[key]
+            return "delete_table", 204, None
+        if_match = headers.get("If-Match")
+        if if_match and if_match != table["etag"]:
+            return "update_table", 412, {"error": {"code": 412, "message": "Precondition check failed."}}
+        updated = dict(table)
+        updated.update({k: v for k, v in body.items() if k in ("view", "description", "schema")})
+        if "view" in body:
+            schema_body = body if "schema" in body else {}
+            error = self._apply_view(updated, schema_body)
+            if error:
+                return "update_table", 400, error
+        updated["etag"] = _etag()
+        self.tables[key] = updated
+        return "update_table", 200, updated
+
+
+def _handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # headers and body are written separately, Nagle's algorithm would delay every response by ~40 ms
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def _serve(self):
+            start = time.perf_counter()
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            body = {}
+            if raw and self.headers.get("Content-Type", "").startswith("application/json"):
+                body = json.loads(raw)
+            operation, status, response = api.handle(self.command, urlparse(self.path).path, self.headers, body)
+            payload = json.dumps(response).encode("utf-8") if response is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            with api.lock:
+                api.requests.append({"operation": operation, "status": status, "seconds": time.perf_counter() - start})
+
+        do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _serve
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
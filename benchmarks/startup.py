@@ -0,0 +1,144 @@
+"""
+Cold-start benchmark of the sync actions.
+
+Every action runs in a fresh interpreter, the remote API calls are stubbed out, so the measured time is only
+what the config UI waits for on top of the network: importing the component and constructing the clients.
+For every action it reports the import time of the component module, the time to the first response
+and which heavy client libraries got loaded.
+
+    python benchmarks/startup.py [--repeat 5] [--budget-ms 1500]
+
+With ``--budget-ms`` the script exits with 1 when the median first response of any action exceeds the budget.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src")
+
+HEAVY_MODULES = ["google.cloud.bigquery", "google.oauth2.service_account", "kbcstorage.base"]
+
+# action => (stubbed callable, stubbed return value)
+ACTIONS = {
+    "get_buckets": ("kbcstorage.buckets.Buckets.list", [{"id": "in.c-test", "name": "test"}]),
+    "get_tables": (
+        "kbcstorage.buckets.Buckets.list_tables",
+        [{"id": "in.c-test.orders", "name": "orders", "displayName": "orders"}],
+    ),
+    "get_columns": ("storage_api.Tables.detail", {"columns": ["id", "name"]}),
+    "get_source_projects": ("google.cloud.bigquery.Client.list_projects", "PROJECTS"),
+    "get_destination_projects": ("google.cloud.bigquery.Client.list_projects", "PROJECTS"),
+    "get_datasets": ("google.cloud.bigquery.Client.list_datasets", []),
+}
+
+PROBE = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import component
+imported = time.perf_counter()
+
+import mock
+target, return_value = sys.argv[1], json.loads(sys.argv[2])
+if return_value == "PROJECTS":
+    project = mock.MagicMock(project_id="kbc-grpn-1234-abcd", friendly_name="KBC")
+    return_value = mock.MagicMock(pages=[[project]])
+with mock.patch(target, return_value=return_value), contextlib.redirect_stdout(io.StringIO()):
+    component.Component().execute_action()
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (done - start) * 1000,
+    "loaded": [m for m in sys.argv[3].split(",") if m in sys.modules],
+}))
+"""
+
+
+def _service_account():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode("utf-8")
+    return json.dumps(
+        {
+            "type": "service_account",
+            "project_id": "benchmark",
+            "client_email": "benchmark@benchmark.iam.gserviceaccount.com",
+            "private_key": private_key,
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }
+    )
+
+
+def _data_dir(action, service_account):
+    data_dir = tempfile.mkdtemp()
+    with open(os.path.join(data_dir, "config.json"), "w") as config_file:
+        json.dump(
+            {
+                "action": action,
+                "parameters": {
+                    "#service_account": service_account,
+                    "#storage_token": "token",
+                    "source_bucket": "in.c-test",
+                    "source_table_id": "in.c-test.orders",
+                    "destination_project_id": "destination",
+                },
+            },
+            config_file,
+        )
+    return data_dir
+
+
+def _probe(action, service_account):
+    target, return_value = ACTIONS[action]
+    env = dict(
+        os.environ,
+        KBC_DATADIR=_data_dir(action, service_account),
+        KBC_STACKID="connection.keboola.com",
+        KBC_PROJECTID="1234",
+        # no metadata cache from a previous probe
+        TMPDIR=tempfile.mkdtemp(),
+        PYTHONPATH=SRC_DIR,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, target, json.dumps(return_value), ",".join(HEAVY_MODULES)],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if output.returncode:
+        raise RuntimeError(f"Action {action} failed: {output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    service_account = _service_account()
+    over_budget = []
+    print(f"{'action':<26}{'import ms':>12}{'first response ms':>20}  loaded clients")
+    for action in ACTIONS:
+        probes = [_probe(action, service_account) for _ in range(args.repeat)]
+        import_ms = statistics.median(p["import_ms"] for p in probes)
+        first_response_ms = statistics.median(p["first_response_ms"] for p in probes)
+        print(f"{action:<26}{import_ms:>12.1f}{first_response_ms:>20.1f}  {', '.join(probes[0]['loaded'])}")
+        if args.budget_ms is not None and first_response_ms > args.budget_ms:
+            over_budget.append(action)
+
+    if over_budget:
+        print(f"Over the budget of {args.budget_ms} ms: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
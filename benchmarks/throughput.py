@@ -0,0 +1,174 @@
+"""
+Offline end-to-end throughput benchmark of the view publishing against the local fake APIs (see fake_api.py).
+
+Scenarios, each run over every size:
+  - create_view: ``BigqueryClient.create_view`` called once per view, as one config row per view does
+  - run: ``Component.run`` in the bulk mode publishing a whole bucket
+  - run_rerun: the same run again with the state of the first one (nothing changed upstream)
+
+For every scenario it reports views/sec, API calls per view and p50/p99 latency of the API requests.
+
+    python benchmarks/throughput.py [--sizes 1,100,1000] [--latency-ms 20] [--conflict-rate 0.1] [--workers 8]
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import mock
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from fake_api import FakeApi  # noqa: E402
+
+KBC_PROJECT_ID = "1234"
+SOURCE_PROJECT = f"kbc-grpn-{KBC_PROJECT_ID}-bench"
+SOURCE_BUCKET = "in.c-bench"
+SOURCE_DATASET = "in_c_bench"
+DESTINATION_PROJECT = "byodb-bench"
+DESTINATION_DATASET = "views"
+
+_PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+).decode("utf-8")
+
+
+def _percentile(values, percentile):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percentile / 100 * len(ordered)) - 1, 0)]
+
+
+def _service_account(url):
+    return {
+        "type": "service_account",
+        "project_id": DESTINATION_PROJECT,
+        "client_email": "bench@byodb-bench.iam.gserviceaccount.com",
+        "private_key": _PRIVATE_KEY,
+        "token_uri": f"{url}/token",
+    }
+
+
+def _start_api(args, size):
+    api = FakeApi(latency_ms=args.latency_ms, conflict_rate=args.conflict_rate)
+    api.add_source_bucket(SOURCE_PROJECT, SOURCE_BUCKET, size)
+    api.add_dataset(DESTINATION_PROJECT, DESTINATION_DATASET)
+    url = api.start()
+    os.environ["BIGQUERY_EMULATOR_HOST"] = url
+    return api, url
+
+
+def bench_create_view(args, size):
+    from google_cloud.bigquery_client import BigqueryClient
+
+    api, url = _start_api(args, size)
+    try:
+        bq = BigqueryClient(BigqueryClient.get_service_account_credentials(_service_account(url), []))
+        destination = bq.find_dataset(DESTINATION_PROJECT, DESTINATION_DATASET)
+        view_seconds = []
+        start = time.perf_counter()
+        for index in range(size):
+            view_start = time.perf_counter()
+            # one config row per view: the source dataset is looked up (from the cache) for every view
+            source = bq.find_dataset(SOURCE_PROJECT, SOURCE_DATASET)
+            name = f"table_{index:05d}"
+            bq.create_view(destination, source, name, {"id": "Identifier"}, None, f"v_{name}", f"Table {name}")
+            view_seconds.append(time.perf_counter() - view_start)
+        return time.perf_counter() - start, api, view_seconds
+    finally:
+        api.stop()
+
+
+def _component(data_dir, url):
+    from component import Component
+
+    env = {"KBC_DATADIR": data_dir, "KBC_PROJECTID": KBC_PROJECT_ID, "KBC_STACKID": "fake"}
+    with mock.patch.dict(os.environ, env):
+        component = Component()
+    logging.getLogger().setLevel(logging.WARNING)
+    return component
+
+
+def _data_dir(args, url, state=None):
+    data_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(data_dir, "in"))
+    os.makedirs(os.path.join(data_dir, "out"))
+    parameters = {
+        "#service_account": json.dumps(_service_account(url)),
+        "#storage_token": "token",
+        "source_project_id": SOURCE_PROJECT,
+        "destination_project_id": DESTINATION_PROJECT,
+        "destination_dataset_id": DESTINATION_DATASET,
+        "destination_view_name": "v_{table_name}",
+        "bulk_mode": True,
+        "source_bucket": SOURCE_BUCKET,
+        "max_workers": args.workers,
+    }
+    with open(os.path.join(data_dir, "config.json"), "w") as config_file:
+        json.dump({"parameters": parameters}, config_file)
+    if state is not None:
+        shutil.copy(state, os.path.join(data_dir, "in", "state.json"))
+    return data_dir
+
+
+def bench_run(args, size, rerun=False):
+    api, url = _start_api(args, size)
+    try:
+        with mock.patch("component.Component._get_kbc_root_url", return_value=url):
+            state = None
+            if rerun:
+                first = _data_dir(args, url)
+                _component(first, url).run()
+                state = os.path.join(first, "out", "state.json")
+                api.reset_requests()
+            component = _component(_data_dir(args, url, state), url)
+            start = time.perf_counter()
+            component.run()
+            return time.perf_counter() - start, api, []
+    finally:
+        api.stop()
+
+
+SCENARIOS = {
+    "create_view": bench_create_view,
+    "run": bench_run,
+    "run_rerun": lambda args, size: bench_run(args, size, rerun=True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,100,1000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to every API request")
+    parser.add_argument("--conflict-rate", type=float, default=0.0, help="probability of HTTP 412 on dataset update")
+    parser.add_argument("--workers", type=int, default=8, help="max workers of the bulk mode")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print(
+        f"{'scenario':<14}{'views':>7}{'seconds':>10}{'views/s':>10}{'calls/view':>12}"
+        f"{'req p50 ms':>12}{'req p99 ms':>12}{'view p50 ms':>13}{'view p99 ms':>13}"
+    )
+    for scenario in args.scenarios.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            seconds, api, view_seconds = SCENARIOS[scenario](args, size)
+            latencies = api.latencies()
+            print(
+                f"{scenario:<14}{size:>7}{seconds:>10.2f}{size / seconds:>10.1f}{len(latencies) / size:>12.2f}"
+                f"{_percentile(latencies, 50) * 1000:>12.1f}{_percentile(latencies, 99) * 1000:>12.1f}"
+                f"{_percentile(view_seconds, 50) * 1000:>13.1f}{_percentile(view_seconds, 99) * 1000:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
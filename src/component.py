@@ -1,14 +1,27 @@
+import hashlib
 import logging
 import json
+import os
 import re
-from typing import List
+import tempfile
+from contextlib import contextmanager
+from dataclasses import asdict
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from kbcstorage.client import Client
 from keboola.component.base import ComponentBase, sync_action
 from keboola.component.exceptions import UserException
 from keboola.component.sync_actions import SelectElement
 
-from google_cloud.bigquery_client import BigqueryClient
+from google_cloud.metadata_cache import MetadataCache
+from google_cloud.query_cost import BYTES_PER_GB, format_bytes
+from google_cloud.view_definition import InvalidViewQuery, MaterializedViewOptions, RowFilter, ViewDefinition
+from metrics import ApiMetrics
+from storage_metadata import TableMetadataLoader
+from view_state import KEY_STATE_VIEWS, ViewState
+
+if TYPE_CHECKING:
+    from google_cloud.bigquery_client import BigqueryClient
 
 # configuration variables
 KEY_SERVICE_ACCOUNT = "#service_account"
@@ -23,6 +36,44 @@ KEY_DESTINATION_VIEW_NAME = "destination_view_name"
 KEY_CUSTOM_COLUMNS = "custom_columns"
 KEY_COLUMNS = "columns"
 
+KEY_BULK_MODE = "bulk_mode"
+KEY_TABLE_INCLUDE = "table_include"
+KEY_TABLE_EXCLUDE = "table_exclude"
+KEY_MAX_WORKERS = "max_workers"
+KEY_FULL_REFRESH = "full_refresh"
+KEY_AUTHORIZATION = "authorization"
+KEY_ADDITIONAL_DESTINATIONS = "additional_destinations"
+KEY_ROW_FILTER = "row_filter"
+KEY_TIME_WINDOW_COLUMN = "time_window_column"
+KEY_TIME_WINDOW_DAYS = "time_window_days"
+KEY_PARTITION_FILTER = "partition_filter"
+KEY_RUN_ALL_ROWS = "run_all_rows"
+KEY_DRY_RUN = "dry_run"
+KEY_ESTIMATE_QUERY_COSTS = "estimate_query_costs"
+KEY_QUERY_COST_WARNING_GB = "query_cost_warning_gb"
+KEY_MATERIALIZED_VIEW = "materialized_view"
+KEY_REFRESH_INTERVAL_MINUTES = "refresh_interval_minutes"
+KEY_MAX_STALENESS_MINUTES = "max_staleness_minutes"
+KEY_CLUSTERING_FIELDS = "clustering_fields"
+KEY_PARTITION_FIELD = "partition_field"
+
+DEFAULT_MAX_WORKERS = 8
+# how the views get access to the source dataset: one access entry per view
+# or the whole destination dataset authorized once
+AUTHORIZATION_VIEW = "view"
+AUTHORIZATION_DATASET = "dataset"
+# placeholder of the view name template in bulk mode
+TABLE_NAME_PLACEHOLDER = "{table_name}"
+
+# API calls metrics of the run, written to the data folder
+METRICS_FILE_NAME = "run_metrics.json"
+# changes planned by the dry run, written to the data folder
+CHANGE_SET_FILE_NAME = "change_set.json"
+CHANGE_SET_FILE_TAG = "bigquery-views-change-set"
+
+# key of the BigQuery metadata cache in the component state file
+KEY_STATE_METADATA_CACHE = "metadata_cache"
+
 # list of mandatory parameters => if some is missing,
 # component will fail with readable message on initialization.
 REQUIRED_PARAMETERS = [
@@ -49,6 +100,12 @@ class Component(ComponentBase):
 
     def __init__(self):
         super().__init__()
+        self._metadata_loader = None
+        self._metadata_cache = None
+        self._metrics = ApiMetrics()
+        # long-lived API clients, created on the first use
+        self._storage_client = None
+        self._bigquery_client = None
 
     @staticmethod
     def validate_credentials(parameters):
@@ -71,12 +128,18 @@ class Component(ComponentBase):
 
         return parameters
 
-    def get_bigquery_credentials(self):
+    def _get_service_account_info(self):
         credentials = self.configuration.config_data.get("image_parameters", {}).get(
             KEY_SERVICE_ACCOUNT
         ) or self.configuration.parameters.get(KEY_SERVICE_ACCOUNT)
 
-        credentials_json = self.validate_credentials(credentials)
+        return self.validate_credentials(credentials)
+
+    def get_bigquery_credentials(self):
+        credentials_json = self._get_service_account_info()
+
+        # imported on demand, so the Storage API only sync actions do not pay for loading the BigQuery libraries
+        from google_cloud.bigquery_client import BigqueryClient
 
         try:
             return BigqueryClient.get_service_account_credentials(
@@ -93,75 +156,570 @@ class Component(ComponentBase):
         """
         Main execution code
         """
-        # check for missing configuration parameters
-        self.validate_configuration_parameters(REQUIRED_PARAMETERS)
         params = self.configuration.parameters
-
+        if params.get(KEY_RUN_ALL_ROWS):
+            # the rows are validated one by one, the runner row itself needs only the credentials
+            self.validate_configuration_parameters([KEY_SERVICE_ACCOUNT])
+        else:
+            # check for missing configuration parameters
+            self.validate_configuration_parameters(REQUIRED_PARAMETERS)
+            self._check_source_project(params)
+        cost_warning_bytes = self._get_query_cost_warning_bytes()
+
+        state = self.get_state_file()
+        view_state = ViewState(None if params.get(KEY_FULL_REFRESH) else state.get(KEY_STATE_VIEWS))
+        self._metadata_cache = MetadataCache.from_dict(
+            None if params.get(KEY_FULL_REFRESH) else state.get(KEY_STATE_METADATA_CACHE)
+        )
+        try:
+            if params.get(KEY_DRY_RUN):
+                self._dry_run(view_state)
+            elif params.get(KEY_RUN_ALL_ROWS):
+                self._run_all_rows(view_state)
+            elif params.get(KEY_BULK_MODE):
+                self._run_bulk(view_state)
+            elif params.get(KEY_SOURCE_TABLE_ID):
+                self._run_single(view_state)
+            else:
+                # delete view if exists
+                logging.warning("No source table selected. Deleting view if exists.")
+                self._delete_views(view_state, self._get_destinations(params))
+        finally:
+            # the dry run estimates the planned queries, not the existing views
+            self._check_query_costs(cost_warning_bytes, None if params.get(KEY_DRY_RUN) else view_state)
+            state[KEY_STATE_VIEWS] = view_state.to_dict()
+            state[KEY_STATE_METADATA_CACHE] = self._metadata_cache.to_dict()
+            self.write_state_file(state)
+            self._metrics.save(os.path.join(self.data_folder_path, METRICS_FILE_NAME))
+
+    def _check_source_project(self, params):
         # check if source BigQuery project is actual KBC project
         if self._get_kbc_project_id() not in params.get(KEY_SOURCE_PROJECT_ID):
             raise UserException("Another project storage backend is not supported!")
 
-        # create bigquery client
-        bg = BigqueryClient(self.get_bigquery_credentials())
+    def _delete_views(self, view_state, destinations):
+        bg = self._get_bigquery_client()
+        for project_id, dataset_id, view_name in destinations:
+            bg.delete_view(bg.find_dataset(project_id, dataset_id), view_name)
+            view_state.remove(f"{project_id}.{dataset_id}.{view_name}")
 
-        # get destination datasets
-        destination_dataset = bg.find_dataset(
-            params.get(KEY_DESTINATION_PROJECT_ID),
-            params.get(KEY_DESTINATION_DATASET_ID),
-        )
-        if params.get(KEY_SOURCE_TABLE_ID):
-            # expand and unify KBC table id to dataset and table (in.c-test.Account > in_c_test, Account)
-            source_dataset, source_table = self.expand_table_id(
-                params.get(KEY_SOURCE_TABLE_ID)
+    def _run_single(self, view_state):
+        params = self.configuration.parameters
+        source_dataset_id, pending = self._plan_single(params, view_state)
+        if not pending:
+            return
+
+        bg = self._get_bigquery_client()
+        source_dataset = bg.find_dataset(params.get(KEY_SOURCE_PROJECT_ID), source_dataset_id)
+        targets = self._get_targets(bg, source_dataset, pending)
+        authorize_dataset = self._authorize_dataset(params)
+
+        if len(targets) > 1:
+            # one source read, the views created concurrently and authorized with one access update
+            results = self._publish_views([(source_dataset, targets, authorize_dataset)])
+            self._update_view_state(view_state, results, {view_id: entry for *_, view_id, entry in pending})
+            return
+
+        # create view
+        destination_dataset, definition = targets[0]
+        try:
+            bg.create_view(
+                destination_dataset,
+                source_dataset,
+                definition.source_table,
+                definition.columns_descriptions,
+                definition.custom_columns,
+                definition.view_name,
+                definition.description,
+                authorize_dataset=authorize_dataset,
+                row_filter=definition.row_filter,
+                materialized=definition.materialized,
             )
+        except InvalidViewQuery as err:
+            raise UserException(str(err))
+        _, _, _, view_id, state_entry = pending[0]
+        view_state.update(view_id, state_entry)
 
-            sapi_client = Client(self._get_kbc_root_url(), self._get_storage_token())
+    def _plan_single(self, params, view_state):
+        """
+        Returns the source dataset id and the (project, dataset, definition, view id, state entry) of the views
+        of the source table that changed since the last run.
+        """
+        # expand and unify KBC table id to dataset and table (in.c-test.Account > in_c_test, Account)
+        source_dataset_id, source_table = self.expand_table_id(
+            params.get(KEY_SOURCE_TABLE_ID)
+        )
 
-            tables = sapi_client.tables.detail(params.get(KEY_SOURCE_TABLE_ID))
+        tables = self._get_metadata_loader().get_table(params.get(KEY_SOURCE_TABLE_ID))
 
-            tables_metadata = tables.get("metadata")
+        table_desc = self._get_table_description(tables)
 
-            table_desc = next((item["value"] for item in tables_metadata if item["key"] == "KBC.description"), None)
+        source_table_columns_descriptions = self._get_fields_descriptions(tables)
 
-            source_table_columns_descriptions = self._get_fields_descriptions(tables)
+        custom_columns = (
+            params.get(KEY_COLUMNS) if params.get(KEY_CUSTOM_COLUMNS) else None
+        )
+
+        row_filter = self._get_row_filter(params)
+        materialized = self._get_materialized_view_options(params)
 
-            # get destination datasets
-            source_dataset = bg.find_dataset(
-                params.get(KEY_SOURCE_PROJECT_ID), source_dataset
+        pending = []
+        for project_id, dataset_id, view_name in self._get_destinations(params):
+            view_id = f"{project_id}.{dataset_id}.{view_name}"
+            definition = ViewDefinition(
+                view_name,
+                source_table,
+                source_table_columns_descriptions,
+                custom_columns,
+                table_desc,
+                row_filter,
+                materialized,
             )
+            state_entry = self._build_state_entry(params, tables, definition, view_id)
+            if view_state.is_unchanged(view_id, state_entry):
+                logging.info(f"Source table and configuration of view {view_id} did not change since the last run.")
+                continue
+            pending.append((project_id, dataset_id, definition, view_id, state_entry))
+        return source_dataset_id, pending
+
+    def _run_bulk(self, view_state):
+        """
+        Creates a view for every table of the source bucket matching the include/exclude patterns.
+        """
+        params = self.configuration.parameters
+        source_dataset_id, pending = self._plan_bulk(params, view_state)
+        if not pending:
+            return
+
+        bg = self._get_bigquery_client()
+        source_dataset = bg.find_dataset(params.get(KEY_SOURCE_PROJECT_ID), source_dataset_id)
+        targets = self._get_targets(bg, source_dataset, pending)
+        results = self._publish_views([(source_dataset, targets, self._authorize_dataset(params))])
+        self._update_view_state(view_state, results, {view_id: entry for *_, view_id, entry in pending})
 
-            custom_columns = (
-                params.get(KEY_COLUMNS) if params.get(KEY_CUSTOM_COLUMNS) else None
+    def _plan_bulk(self, params, view_state):
+        """
+        Returns the source dataset id and the (project, dataset, definition, view id, state entry) of the views
+        of the bucket tables that changed since the last run.
+        """
+        bucket_id = params.get(KEY_BUCKETS)
+        if not bucket_id:
+            raise UserException("No source bucket selected for the bulk mode.")
+
+        destinations = self._get_destinations(params)
+        if any(TABLE_NAME_PLACEHOLDER not in view_name for _, _, view_name in destinations):
+            raise UserException(
+                f"Destination view name must contain the {TABLE_NAME_PLACEHOLDER} placeholder in the bulk mode."
             )
-            # add check if dataset exist is in the same region
-            if source_dataset.location != destination_dataset.location:
-                raise Exception(
-                    "Source and destination datasets are in different locations! View creation is not supported."
+
+        tables = self._filter_tables(
+            self._get_metadata_loader().load_bucket(bucket_id),
+            params.get(KEY_TABLE_INCLUDE),
+            params.get(KEY_TABLE_EXCLUDE),
+        )
+        if not tables:
+            raise UserException(f"No tables in bucket {bucket_id} match the include/exclude patterns.")
+
+        row_filter = self._get_row_filter(params)
+        materialized = self._get_materialized_view_options(params)
+        pending = []
+        for table in tables:
+            for project_id, dataset_id, view_name_template in destinations:
+                definition = ViewDefinition(
+                    view_name=view_name_template.replace(TABLE_NAME_PLACEHOLDER, table["name"]),
+                    source_table=table["name"],
+                    columns_descriptions=self._get_fields_descriptions(table),
+                    description=self._get_table_description(table),
+                    row_filter=row_filter,
+                    materialized=materialized,
                 )
+                view_id = f"{project_id}.{dataset_id}.{definition.view_name}"
+                state_entry = self._build_state_entry(params, table, definition, view_id)
+                if view_state.is_unchanged(view_id, state_entry):
+                    continue
+                pending.append((project_id, dataset_id, definition, view_id, state_entry))
+
+        if not pending:
+            logging.info(f"None of {len(tables)} tables of bucket {bucket_id} changed since the last run.")
+        else:
+            logging.info(
+                f"Creating {len(pending)} views for {len(tables)} tables of bucket {bucket_id} "
+                f"with {self._get_max_workers()} workers, the others did not change since the last run."
+            )
+        return self.expand_bucket_id(bucket_id), pending
+
+    def _get_targets(self, bg, source_dataset, pending):
+        """
+        (destination dataset, definition) of the pending views, every destination dataset is looked up once.
+        """
+        destination_datasets = {}
+        for project_id, dataset_id, _, _, _ in pending:
+            if (project_id, dataset_id) not in destination_datasets:
+                destination_datasets[(project_id, dataset_id)] = bg.find_dataset(project_id, dataset_id)
+                self._check_locations(source_dataset, destination_datasets[(project_id, dataset_id)])
+        return [
+            (destination_datasets[(project_id, dataset_id)], definition)
+            for project_id, dataset_id, definition, _, _ in pending
+        ]
+
+    def _run_all_rows(self, view_state):
+        """
+        Publishes the views of all rows of the configuration in this job. The credentials, API clients,
+        table metadata and dataset lookups are shared by the rows and the views of the rows reading the same
+        source dataset are published together (concurrently, authorized with one access entries update).
+        """
+        rows = self._get_runner_rows()
+        groups, deletions = self._plan_rows(rows, view_state)
+
+        if deletions:
+            logging.warning(f"Deleting {len(deletions)} views of the rows without a source table if they exist.")
+            self._delete_views(view_state, deletions)
+        if not groups:
+            logging.info(f"None of the views of {len(rows)} rows changed since the last run.")
+            return
+
+        publish_groups, state_entries = self._resolve_groups(groups)
+        self._update_view_state(view_state, self._publish_views(publish_groups), state_entries)
+
+    def _get_runner_rows(self) -> List[dict]:
+        rows = [row for row in self._get_configured_rows() if not row.get(KEY_RUN_ALL_ROWS)]
+        if not rows:
+            raise UserException("The configuration has no other rows to run.")
+        for row in rows:
+            missing = [key for key in REQUIRED_PARAMETERS if not row.get(key)]
+            if missing:
+                raise UserException(f"Row {row.get(KEY_DESTINATION_VIEW_NAME)} misses parameters {missing}.")
+        self._preload_shared_buckets(rows)
+        return rows
+
+    def _plan_rows(self, rows, view_state):
+        """
+        Returns the pending views of the rows grouped by (source project, source dataset id, authorize dataset)
+        and the (project, dataset, view name) destinations of the rows without a source table.
+        """
+        groups, deletions, planned = {}, [], set()
+        for row in rows:
+            self._check_source_project(row)
+            if row.get(KEY_BULK_MODE):
+                source_dataset_id, pending = self._plan_bulk(row, view_state)
+            elif row.get(KEY_SOURCE_TABLE_ID):
+                source_dataset_id, pending = self._plan_single(row, view_state)
             else:
-                logging.info(
-                    f"Source and destination datasets are in the same location: {source_dataset.location}"
+                deletions.extend(self._get_destinations(row))
+                continue
+            for *_, view_id, _ in pending:
+                if view_id in planned:
+                    raise UserException(f"View {view_id} is published by more than one row.")
+                planned.add(view_id)
+            key = (row[KEY_SOURCE_PROJECT_ID], source_dataset_id, self._authorize_dataset(row))
+            groups.setdefault(key, []).extend(pending)
+        return {key: pending for key, pending in groups.items() if pending}, deletions
+
+    def _resolve_groups(self, groups):
+        """
+        Looks up the datasets of the grouped pending views, returns the (source dataset, targets,
+        authorize dataset) groups and the state entries of the views.
+        """
+        bg = self._get_bigquery_client()
+        publish_groups, state_entries = [], {}
+        for (source_project, source_dataset_id, authorize_dataset), pending in groups.items():
+            logging.info(f"{len(pending)} views of source dataset {source_project}.{source_dataset_id} to publish")
+            source_dataset = bg.find_dataset(source_project, source_dataset_id)
+            publish_groups.append((source_dataset, self._get_targets(bg, source_dataset, pending), authorize_dataset))
+            state_entries.update({view_id: entry for *_, view_id, entry in pending})
+        return publish_groups, state_entries
+
+    def _plan_changes(self, view_state):
+        """
+        Computes the change set of the row (or of all rows with the run all rows option) without any change,
+        the views that did not change since the last run are left out.
+        """
+        params = self.configuration.parameters
+        rows = self._get_runner_rows() if params.get(KEY_RUN_ALL_ROWS) else [params]
+        groups, deletions = self._plan_rows(rows, view_state)
+        publish_groups, _ = self._resolve_groups(groups)
+        return self._get_bigquery_client().plan_changes(publish_groups, self._get_max_workers(), deletions)
+
+    def _dry_run(self, view_state):
+        change_set = self._plan_changes(view_state)
+        os.makedirs(self.files_out_path, exist_ok=True)
+        file_definition = self.create_out_file_definition(CHANGE_SET_FILE_NAME, tags=[CHANGE_SET_FILE_TAG])
+        with open(file_definition.full_path, "w") as change_set_file:
+            json.dump(change_set.to_dict(), change_set_file, indent=2)
+        self.write_manifest(file_definition)
+        logging.info(
+            f"Dry run, nothing was changed. Planned changes: {change_set.summary()}, "
+            f"{change_set.estimated_api_calls()} API calls, {len(change_set.errors)} errors."
+        )
+
+    def _publish_views(self, groups):
+        """
+        Publishes the (source dataset, targets, authorize dataset) groups,
+        maps every full view id to ``None`` on success or to the exception it failed with.
+        """
+        bg = self._get_bigquery_client()
+        results = {}
+        for source_dataset, targets, authorize_dataset in groups:
+            results.update(bg.publish_views(source_dataset, targets, self._get_max_workers(), authorize_dataset))
+        return results
+
+    def _preload_shared_buckets(self, rows):
+        """
+        Loads the metadata of every bucket read by more than one row with one listing call.
+        """
+        buckets = [row[KEY_BUCKETS] for row in rows if row.get(KEY_BULK_MODE) and row.get(KEY_BUCKETS)]
+        buckets += [
+            ".".join(row[KEY_SOURCE_TABLE_ID].split(".")[:2])
+            for row in rows
+            if not row.get(KEY_BULK_MODE) and row.get(KEY_SOURCE_TABLE_ID)
+        ]
+        for bucket_id in sorted({bucket_id for bucket_id in buckets if buckets.count(bucket_id) > 1}):
+            self._get_metadata_loader().load_bucket(bucket_id)
+
+    @staticmethod
+    def _update_view_state(view_state, results, state_entries):
+        """
+        Stores the state entries of the created views, fails with the list of views that could not be created.
+        """
+        for view_id, error in results.items():
+            if error is None:
+                view_state.update(view_id, state_entries[view_id])
+            else:
+                view_state.remove(view_id)
+
+        failed = {view_id: error for view_id, error in results.items() if error is not None}
+        logging.info(f"Views publishing finished: {len(results) - len(failed)} views created, {len(failed)} failed.")
+        if failed:
+            details = "; ".join(f"{view_id}: {error}" for view_id, error in sorted(failed.items()))
+            raise UserException(f"Failed to create {len(failed)} of {len(results)} views: {details}")
+
+    def _get_metadata_loader(self) -> TableMetadataLoader:
+        if self._metadata_loader is None:
+            self._metadata_loader = TableMetadataLoader(self._get_storage_client(), self._metrics)
+        return self._metadata_loader
+
+    def _get_storage_client(self):
+        # imported on demand, so the BigQuery only sync actions do not pay for loading the Storage API client
+        from http_session import get_session, pool_size_for
+        from storage_api import StorageClient
+
+        if self._storage_client is None:
+            self._storage_client = StorageClient(
+                self._get_kbc_root_url(),
+                self._get_storage_token(),
+                self.environment_variables.branch_id,
+                get_session("storage", pool_size_for(self._get_max_workers())),
+            )
+        return self._storage_client
+
+    def _get_bigquery_client(self) -> "BigqueryClient":
+        from google_cloud.bigquery_client import BigqueryClient
+        from http_session import pool_size_for
+
+        if self._metadata_cache is None:
+            self._metadata_cache = MetadataCache()
+        if self._bigquery_client is None or self._bigquery_client.cache is not self._metadata_cache:
+            self._bigquery_client = BigqueryClient(
+                self.get_bigquery_credentials(),
+                self._metadata_cache,
+                self._metrics,
+                pool_size_for(self._get_max_workers()),
+                estimate_query_costs=self._estimate_query_costs(),
+                config_id=self.environment_variables.config_id,
+            )
+        return self._bigquery_client
+
+    @contextmanager
+    def _persistent_metadata_cache(self):
+        """
+        Sync actions have no state file, their metadata cache is kept in a local file of the service account.
+        """
+        client_email = self._get_service_account_info().get("client_email")
+        path = os.path.join(
+            tempfile.gettempdir(),
+            f"bigquery-metadata-{hashlib.sha256(client_email.encode('utf-8')).hexdigest()[:16]}.json",
+        )
+        self._metadata_cache = MetadataCache.load(path)
+        try:
+            yield
+        finally:
+            self._metadata_cache.save(path)
+
+    @staticmethod
+    def _get_destinations(params) -> List[Tuple[str, str, str]]:
+        """
+        (project, dataset, view name) of the row destination followed by its additional destinations,
+        the view name of an additional destination defaults to the view name of the row.
+        """
+        view_name = params.get(KEY_DESTINATION_VIEW_NAME)
+        destinations = [(params.get(KEY_DESTINATION_PROJECT_ID), params.get(KEY_DESTINATION_DATASET_ID), view_name)]
+        for target in params.get(KEY_ADDITIONAL_DESTINATIONS) or []:
+            if not target.get(KEY_DESTINATION_PROJECT_ID) or not target.get(KEY_DESTINATION_DATASET_ID):
+                raise UserException("Every additional destination must have a destination project and dataset.")
+            destination = (
+                target[KEY_DESTINATION_PROJECT_ID],
+                target[KEY_DESTINATION_DATASET_ID],
+                target.get(KEY_DESTINATION_VIEW_NAME) or view_name,
+            )
+            if destination not in destinations:
+                destinations.append(destination)
+        return destinations
+
+    def _build_state_entry(self, params, table_detail, definition, view_id) -> dict:
+        view_definition = {
+            "source_project_id": params.get(KEY_SOURCE_PROJECT_ID),
+            "view_id": view_id,
+            "source_table": definition.source_table,
+            "custom_columns": definition.custom_columns,
+            "description": definition.description,
+            "columns_descriptions": definition.columns_descriptions,
+        }
+        # only the non-default options are part of the definition, so the existing state entries stay valid
+        if self._authorize_dataset(params):
+            view_definition["authorization"] = AUTHORIZATION_DATASET
+        if definition.row_filter:
+            view_definition["row_filter"] = asdict(definition.row_filter)
+        if definition.materialized:
+            view_definition["materialized"] = asdict(definition.materialized)
+        return ViewState.build_entry(table_detail, view_definition)
+
+    @staticmethod
+    def _get_row_filter(params) -> Optional[RowFilter]:
+        days = params.get(KEY_TIME_WINDOW_DAYS)
+        row_filter = RowFilter(
+            predicate=(params.get(KEY_ROW_FILTER) or "").strip() or None,
+            time_window_column=params.get(KEY_TIME_WINDOW_COLUMN) or None,
+            time_window_days=days or None,
+            partition_filter=bool(params.get(KEY_PARTITION_FILTER)),
+        )
+        if row_filter.time_window_days is not None:
+            try:
+                row_filter.time_window_days = int(days)
+            except (TypeError, ValueError):
+                raise UserException(f"Time window days must be a positive integer, got {days}.")
+            if row_filter.time_window_days < 1:
+                raise UserException(f"Time window days must be a positive integer, got {days}.")
+            if not row_filter.time_window_column and not row_filter.partition_filter:
+                raise UserException("Time window needs a time window column or the partition filter.")
+        elif row_filter.time_window_column or row_filter.partition_filter:
+            raise UserException("Time window column and partition filter need the time window days.")
+        if row_filter == RowFilter():
+            return None
+        return row_filter
+
+    @staticmethod
+    def _get_materialized_view_options(params) -> Optional[MaterializedViewOptions]:
+        if not params.get(KEY_MATERIALIZED_VIEW):
+            return None
+
+        def minutes(key, value):
+            if value in (None, ""):
+                return None
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise UserException(f"{key} must be a non-negative integer, got {value}.")
+            if value < 0:
+                raise UserException(f"{key} must be a non-negative integer, got {value}.")
+            return value
+
+        refresh_interval = params.get(KEY_REFRESH_INTERVAL_MINUTES)
+        if refresh_interval in (None, ""):
+            refresh_interval = MaterializedViewOptions().refresh_interval_minutes
+        return MaterializedViewOptions(
+            # 0 disables the automatic refresh
+            refresh_interval_minutes=minutes(KEY_REFRESH_INTERVAL_MINUTES, refresh_interval) or None,
+            max_staleness_minutes=minutes(KEY_MAX_STALENESS_MINUTES, params.get(KEY_MAX_STALENESS_MINUTES)) or None,
+            clustering_fields=[c for c in params.get(KEY_CLUSTERING_FIELDS) or [] if c] or None,
+            partition_field=params.get(KEY_PARTITION_FIELD) or None,
+        )
+
+    @staticmethod
+    def _authorize_dataset(params) -> bool:
+        authorization = params.get(KEY_AUTHORIZATION) or AUTHORIZATION_VIEW
+        if authorization not in (AUTHORIZATION_VIEW, AUTHORIZATION_DATASET):
+            raise UserException(
+                f"Authorization must be one of {AUTHORIZATION_VIEW}, {AUTHORIZATION_DATASET}, got {authorization}."
+            )
+        return authorization == AUTHORIZATION_DATASET
+
+    def _estimate_query_costs(self) -> bool:
+        params = self.configuration.parameters
+        # the warning threshold needs the estimates
+        return bool(params.get(KEY_ESTIMATE_QUERY_COSTS) or params.get(KEY_QUERY_COST_WARNING_GB))
+
+    def _get_query_cost_warning_bytes(self) -> Optional[float]:
+        threshold = self.configuration.parameters.get(KEY_QUERY_COST_WARNING_GB)
+        if threshold in (None, ""):
+            return None
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            raise UserException(f"Query cost warning threshold must be a positive number of GB, got {threshold}.")
+        if threshold <= 0:
+            raise UserException(f"Query cost warning threshold must be a positive number of GB, got {threshold}.")
+        return threshold * BYTES_PER_GB
+
+    def _check_query_costs(self, threshold, view_state=None):
+        """
+        Warns about the views whose estimated query cost exceeds the threshold (in bytes), stores the estimates
+        in the state entries of the published views.
+        """
+        for view_id, cost in sorted(self._metrics.query_costs().items()):
+            if view_state is not None:
+                view_state.set_query_cost(view_id, cost)
+            if threshold is not None and cost["selected_bytes"] > threshold:
+                logging.warning(
+                    f"Query of view {view_id} processes {format_bytes(cost['selected_bytes'])} "
+                    f"({format_bytes(cost['full_bytes'])} with all source table columns), "
+                    f"more than the warning threshold of {format_bytes(threshold)}."
                 )
 
-            # create view
-            bg.create_view(
-                destination_dataset,
-                source_dataset,
-                source_table,
-                source_table_columns_descriptions,
-                custom_columns,
-                params.get(KEY_DESTINATION_VIEW_NAME),
-                table_desc,
+    def _get_max_workers(self) -> int:
+        max_workers = self.configuration.parameters.get(KEY_MAX_WORKERS) or DEFAULT_MAX_WORKERS
+        try:
+            max_workers = int(max_workers)
+        except (TypeError, ValueError):
+            raise UserException(f"Max workers must be a positive integer, got {max_workers}.")
+        if max_workers < 1:
+            raise UserException(f"Max workers must be a positive integer, got {max_workers}.")
+        return max_workers
+
+    @staticmethod
+    def _filter_tables(tables, include_patterns, exclude_patterns):
+        """
+        Filters tables by their names with glob patterns (e.g. ``orders_*``), no include pattern means all tables.
+        """
+        return [
+            table
+            for table in tables
+            if (not include_patterns or any(fnmatch(table["name"], p) for p in include_patterns))
+            and not any(fnmatch(table["name"], p) for p in exclude_patterns or [])
+        ]
+
+    @staticmethod
+    def _check_locations(source_dataset, destination_dataset):
+        # add check if dataset exist is in the same region
+        if source_dataset.location != destination_dataset.location:
+            raise Exception(
+                "Source and destination datasets are in different locations! View creation is not supported."
             )
         else:
-            # delete view if exists
-            logging.warning("No source table selected. Deleting view if exists.")
-            bg.delete_view(destination_dataset, params.get(KEY_DESTINATION_VIEW_NAME))
+            logging.info(
+                f"Source and destination datasets are in the same location: {source_dataset.location}"
+            )
+
+    @staticmethod
+    def _get_table_description(tables):
+        return next(
+            (item["value"] for item in (tables.get("metadata") or []) if item["key"] == "KBC.description"), None
+        )
 
     @staticmethod
     def _get_fields_descriptions(tables):
         fields_descriptions = {}
-        columns_metadata = tables.get("columnMetadata")
+        # an empty column metadata comes as a list from the API
+        columns_metadata = tables.get("columnMetadata") or {}
         for column_name, metadata in columns_metadata.items():
             for item in metadata:
                 if "KBC.description" == item.get("key"):
@@ -172,9 +730,13 @@ class Component(ComponentBase):
     def expand_table_id(table_id):
         # in.c-test.Account > in_c_test, Account
         split = table_id.split(".")
-        stage = split[0]
-        bucket = split[1].replace("-", "_")
-        return f"{stage}_{bucket}", split[2]
+        return Component.expand_bucket_id(".".join(split[:2])), split[2]
+
+    @staticmethod
+    def expand_bucket_id(bucket_id):
+        # in.c-test > in_c_test
+        stage, bucket = bucket_id.split(".")[:2]
+        return f"{stage}_{bucket.replace('-', '_')}"
 
     def _get_kbc_root_url(self):
         return f"https://{self.environment_variables.stack_id}"
@@ -188,6 +750,74 @@ class Component(ComponentBase):
             or self.environment_variables.token
         )
 
+    def _get_configured_rows(self) -> List[dict]:
+        """
+        Parameters of all rows of this configuration (merged with the configuration parameters).
+        """
+        component_id = self.environment_variables.component_id
+        config_id = self.environment_variables.config_id
+        if not component_id or not config_id:
+            raise UserException("The rows of the configuration can be read only for a saved configuration.")
+        detail = self._get_storage_client().configurations.detail(component_id, config_id)
+        parameters = (detail.get("configuration") or {}).get("parameters") or {}
+        return [
+            dict(parameters, **((row.get("configuration") or {}).get("parameters") or {}))
+            for row in detail.get("rows", [])
+        ]
+
+    def _get_expected_views(self, rows):
+        """
+        Returns the view names published into every destination dataset (``project.dataset``)
+        and the source datasets of the rows. Rows without a source table publish nothing.
+        """
+        expected_views, source_datasets = {}, set()
+        for row in rows:
+            if not row.get(KEY_DESTINATION_PROJECT_ID) or not row.get(KEY_DESTINATION_DATASET_ID):
+                continue
+            destinations = self._get_destinations(row)
+            for project_id, dataset_id, _ in destinations:
+                expected_views.setdefault(f"{project_id}.{dataset_id}", set())
+            source_project = row.get(KEY_SOURCE_PROJECT_ID)
+            if not source_project:
+                continue
+            if row.get(KEY_BULK_MODE) and row.get(KEY_BUCKETS):
+                tables = self._filter_tables(
+                    self._get_metadata_loader().load_bucket(row[KEY_BUCKETS]),
+                    row.get(KEY_TABLE_INCLUDE),
+                    row.get(KEY_TABLE_EXCLUDE),
+                )
+                for project_id, dataset_id, view_name in destinations:
+                    expected_views[f"{project_id}.{dataset_id}"].update(
+                        view_name.replace(TABLE_NAME_PLACEHOLDER, table["name"]) for table in tables
+                    )
+                source_datasets.add(f"{source_project}.{self.expand_bucket_id(row[KEY_BUCKETS])}")
+            elif row.get(KEY_SOURCE_TABLE_ID):
+                for project_id, dataset_id, view_name in destinations:
+                    expected_views[f"{project_id}.{dataset_id}"].add(view_name)
+                source_datasets.add(f"{source_project}.{self.expand_table_id(row[KEY_SOURCE_TABLE_ID])[0]}")
+        return expected_views, source_datasets
+
+    def _reconcile(self, dry_run) -> dict:
+        """
+        Deletes the views no config row publishes and removes their access entries from the source datasets.
+        """
+        from google_cloud.reconcile import Reconciler
+
+        expected_views, source_datasets = self._get_expected_views(self._get_configured_rows())
+        if not expected_views:
+            raise UserException("No config row has a destination dataset, nothing to reconcile.")
+        with self._persistent_metadata_cache():
+            reconciler = Reconciler(self._get_bigquery_client(), self._get_max_workers())
+            plan = reconciler.plan(expected_views, source_datasets)
+            logging.info(f"Reconciliation plan: {json.dumps(plan.to_dict())}")
+            if not dry_run and not plan.is_empty():
+                results = reconciler.apply(plan)
+                failed = {item: error for item, error in results.items() if error is not None}
+                if failed:
+                    details = "; ".join(f"{item}: {error}" for item, error in sorted(failed.items()))
+                    raise UserException(f"Reconciliation failed for {len(failed)} of {len(results)} items: {details}")
+        return {"status": "success", "dry_run": dry_run, "plan": plan.to_dict()}
+
     @sync_action("get_buckets")
     def get_buckets(self) -> List[SelectElement]:
         """
@@ -195,7 +825,7 @@ class Component(ComponentBase):
         Returns:
 
         """
-        sapi_client = Client(self._get_kbc_root_url(), self._get_storage_token())
+        sapi_client = self._get_storage_client()
 
         buckets = sapi_client.buckets.list()
         return [
@@ -213,7 +843,7 @@ class Component(ComponentBase):
         bucket = self.configuration.parameters.get(KEY_BUCKETS)
         if not bucket:
             raise UserException("No bucket selected.")
-        sapi_client = Client(self._get_kbc_root_url(), self._get_storage_token())
+        sapi_client = self._get_storage_client()
 
         tables = sapi_client.buckets.list_tables(bucket)
         return [
@@ -231,11 +861,30 @@ class Component(ComponentBase):
         table_id = table = self.configuration.parameters.get(KEY_SOURCE_TABLE_ID)
         if not table:
             raise UserException("No table selected.")
-        sapi_client = Client(self._get_kbc_root_url(), self._get_storage_token())
+        sapi_client = self._get_storage_client()
 
         table = sapi_client.tables.detail(table_id)
         return [SelectElement(value=c, label=c) for c in table.get("columns", [])]
 
+    def _get_project_elements(self, kbc_project) -> List[SelectElement]:
+        """
+        Lists the projects of the current KBC project (``kbc-grpn-{id}-``) or all the other projects.
+        """
+        project_pattern = re.compile(rf'kbc-grpn-{self._get_kbc_project_id()}-')
+        with self._persistent_metadata_cache():
+            # the source project is the only KBC project, the listing can stop once it is found
+            projects = self._get_bigquery_client().list_projects(
+                stop_when=project_pattern.search if kbc_project else None
+            )
+
+        return [
+            SelectElement(
+                value=project_id, label=f"{project_id} ({friendly_name})"
+            )
+            for project_id, friendly_name in projects
+            if bool(project_pattern.search(project_id)) == kbc_project
+        ]
+
     @sync_action("get_source_projects")
     def get_source_projects(self) -> List[SelectElement]:
         """
@@ -243,20 +892,8 @@ class Component(ComponentBase):
         Returns:
 
         """
-        bq = BigqueryClient(credentials=self.get_bigquery_credentials())
-        projects = bq.client.list_projects()
-        kbc_project_id = self._get_kbc_project_id()
-
         # source project can be only the current KBC project
-        project_pattern = re.compile(rf'kbc-grpn-{kbc_project_id}-')
-
-        projects = [
-            SelectElement(
-                value=p.project_id, label=f"{p.project_id} ({p.friendly_name})"
-            )
-            for p in projects
-            if project_pattern.search(p.project_id)
-        ]
+        projects = self._get_project_elements(kbc_project=True)
         if len(projects) == 0:
             raise UserException(
                 "No projects found. You cannot have access to any project or list projects."
@@ -270,20 +907,8 @@ class Component(ComponentBase):
         Returns:
 
         """
-        bq = BigqueryClient(credentials=self.get_bigquery_credentials())
-        projects = bq.client.list_projects()
-        kbc_project_id = self._get_kbc_project_id()
         # destination project CAN'T be the current KBC project
-        project_pattern = re.compile(rf'kbc-grpn-{kbc_project_id}-')
-
-        projects = [
-            SelectElement(
-                value=p.project_id, label=f"{p.project_id} ({p.friendly_name})"
-            )
-            for p in projects
-            if not project_pattern.search(p.project_id)
-        ]
-        return projects
+        return self._get_project_elements(kbc_project=False)
 
     @sync_action("get_datasets")
     def get_datasets(self) -> List[SelectElement]:
@@ -295,12 +920,36 @@ class Component(ComponentBase):
         bq_project = self.configuration.parameters.get(KEY_DESTINATION_PROJECT_ID)
         if not bq_project:
             raise UserException("No project selected.")
-        bq = BigqueryClient(credentials=self.get_bigquery_credentials())
+        with self._persistent_metadata_cache():
+            datasets = self._get_bigquery_client().list_datasets(bq_project)
         return [
-            SelectElement(value=d.dataset_id, label=f"{d.dataset_id}")
-            for d in bq.client.list_datasets(bq_project)
+            SelectElement(value=dataset_id, label=f"{dataset_id}")
+            for dataset_id in datasets
         ]
 
+    @sync_action("plan")
+    def plan(self) -> dict:
+        """
+        Sync action returning the changes a run of the row would make, without changing anything
+        """
+        with self._persistent_metadata_cache():
+            change_set = self._plan_changes(ViewState(None))
+        return {"status": "success", "dry_run": True, "change_set": change_set.to_dict()}
+
+    @sync_action("reconcile_plan")
+    def reconcile_plan(self) -> dict:
+        """
+        Sync action returning the reconciliation plan without changing anything
+        """
+        return self._reconcile(dry_run=True)
+
+    @sync_action("reconcile")
+    def reconcile(self) -> dict:
+        """
+        Sync action deleting orphaned views and dangling access entries of the configuration
+        """
+        return self._reconcile(dry_run=False)
+
 
 """
         Main entrypoint
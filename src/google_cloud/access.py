@@ -0,0 +1,158 @@
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from google.cloud import bigquery
+
+
+def view_access_entry(view) -> bigquery.AccessEntry:
+    return view_reference_access_entry(view.reference)
+
+
+def view_reference_access_entry(reference) -> bigquery.AccessEntry:
+    return bigquery.AccessEntry(
+        role=None,
+        entity_type="view",
+        entity_id={
+            "projectId": reference.project,
+            "datasetId": reference.dataset_id,
+            "tableId": reference.table_id,
+        },
+    )
+
+
+def dataset_access_entry(dataset) -> bigquery.AccessEntry:
+    """
+    Authorizes all views of the dataset at once (an authorized dataset).
+    """
+    return bigquery.AccessEntry(
+        role=None,
+        entity_type="dataset",
+        entity_id={
+            "dataset": {"projectId": dataset.project, "datasetId": dataset.dataset_id},
+            "targetTypes": ["VIEWS"],
+        },
+    )
+
+
+def describe_access_entry(entry) -> str:
+    return ".".join(str(part) for part in access_entry_key(entry)[1:] if part)
+
+
+def access_entry_key(entry) -> tuple:
+    """
+    Identity of an access entry: the entity type with the project, dataset and table for the
+    view / routine / dataset entities, the role and the entity id for the others.
+    """
+    entity_id = entry.entity_id
+    if entry.entity_type == "dataset" and isinstance(entity_id, dict):
+        reference = entity_id.get("dataset", {})
+        return "dataset", reference.get("projectId"), reference.get("datasetId"), None
+    if isinstance(entity_id, dict):
+        return (
+            entry.entity_type,
+            entity_id.get("projectId"),
+            entity_id.get("datasetId"),
+            entity_id.get("tableId") or entity_id.get("routineId"),
+        )
+    return entry.entity_type, entry.role, entity_id, None
+
+
+class AccessEntryIndex:
+    """
+    Access entries of a dataset indexed by their identity (see ``access_entry_key``).
+
+    Membership checks are constant time and batches of entries are applied as a diff,
+    so maintaining thousands of authorized views does not rescan the whole access list per view.
+    """
+
+    def __init__(self, entries: Iterable[bigquery.AccessEntry] = ()):
+        self._entries = {}
+        for entry in entries:
+            self._entries.setdefault(access_entry_key(entry), entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry) -> bool:
+        return access_entry_key(entry) in self._entries
+
+    def has_view(self, view) -> bool:
+        reference = view.reference
+        return ("view", reference.project, reference.dataset_id, reference.table_id) in self._entries
+
+    def has_dataset(self, dataset) -> bool:
+        return ("dataset", dataset.project, dataset.dataset_id, None) in self._entries
+
+    def view_ids(self) -> List[str]:
+        """
+        Full ids (``project.dataset.view``) of all authorized views.
+        """
+        return [f"{key[1]}.{key[2]}.{key[3]}" for key in self._entries if key[0] == "view"]
+
+    def add(self, entries: Iterable[bigquery.AccessEntry]) -> List[bigquery.AccessEntry]:
+        """
+        Adds the entries not present yet and returns them.
+        """
+        added = []
+        for entry in entries:
+            key = access_entry_key(entry)
+            if key not in self._entries:
+                self._entries[key] = entry
+                added.append(entry)
+        return added
+
+    def remove(self, entries: Iterable[bigquery.AccessEntry]) -> List[bigquery.AccessEntry]:
+        """
+        Removes the present entries and returns them.
+        """
+        removed = []
+        for entry in entries:
+            existing = self._entries.pop(access_entry_key(entry), None)
+            if existing is not None:
+                removed.append(existing)
+        return removed
+
+    @property
+    def entries(self) -> List[bigquery.AccessEntry]:
+        return list(self._entries.values())
+
+
+class AccessGrantBatcher:
+    """
+    Collects views that have to be authorized on their source datasets and applies them
+    with a single access entries update per source dataset instead of one update per view.
+    """
+
+    def __init__(self, bigquery_client):
+        self._bigquery_client = bigquery_client
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, source_dataset, view):
+        key = (source_dataset.project, source_dataset.dataset_id)
+        with self._lock:
+            _, views = self._pending.setdefault(key, (source_dataset, []))
+            views.append(view)
+
+    def flush(self) -> Dict[str, Optional[Exception]]:
+        """
+        Grants all pending views, maps every full view id (``project.dataset.view``) to ``None``
+        on success or to the exception the update of its source dataset failed with.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        results = {}
+        for (project, dataset_id), (source_dataset, views) in pending.items():
+            logging.info(f"Granting access to {len(views)} views on the source dataset {project}.{dataset_id}")
+            error = None
+            try:
+                self._bigquery_client.grant_views_access(source_dataset, views)
+            except Exception as exc:
+                logging.error(f"Access to the source dataset {project}.{dataset_id} could not be granted: {exc}")
+                error = exc
+            for view in views:
+                reference = view.reference
+                results[f"{reference.project}.{reference.dataset_id}.{reference.table_id}"] = error
+        return results
@@ -1,9 +1,85 @@
+import hashlib
+import json
 import logging
+import random
+import re
+import threading
 import time
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional
 
 from google.cloud import bigquery
 from google.oauth2 import service_account
-from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.api_core.exceptions import BadRequest, NotFound, PreconditionFailed
+
+from google_cloud.access import (
+    AccessEntryIndex,
+    dataset_access_entry,
+    describe_access_entry,
+    view_access_entry,
+    view_reference_access_entry,
+)
+from google_cloud import materialized_view
+from google_cloud.metadata_cache import MetadataCache
+from google_cloud.planner import ChangePlanner, ChangeSet
+from google_cloud.query_cost import QueryCost, format_bytes
+from google_cloud.scheduler import MutationScheduler
+from google_cloud.view_definition import InvalidViewQuery
+from http_session import DEFAULT_POOL_SIZE, get_authorized_session
+from metrics import ApiMetrics
+
+# the source table reference in the queries composed by ``compose_view_query``
+VIEW_SOURCE_PATTERN = re.compile(r"FROM\s+`([^`]+)`\.`([^`]+)`\.`([^`]+)`", re.IGNORECASE)
+
+# date/time column types of the rolling time window filter and the expression of its start
+TIME_WINDOW_STARTS = {
+    "TIMESTAMP": "TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)",
+    "DATETIME": "DATETIME_SUB(CURRENT_DATETIME(), INTERVAL {days} DAY)",
+    "DATE": "DATE_SUB(CURRENT_DATE(), INTERVAL {days} DAY)",
+}
+# pseudo column of the ingestion time partitioned tables
+PARTITION_TIME_COLUMN = "_PARTITIONTIME"
+
+MUTATING_OPERATIONS = {"create_table", "update_table", "delete_table", "update_dataset"}
+
+# retry of the mutating calls: the library retries the transient errors, but not the rate limit errors
+# (HTTP 429, 403 ``rateLimitExceeded``), the mutation scheduler retries those with its own buckets and backoff
+MUTATION_RETRY = bigquery.DEFAULT_RETRY.with_predicate(
+    lambda exc: not MutationScheduler.is_rate_limit_error(exc) and bigquery.DEFAULT_RETRY._predicate(exc)
+)
+
+# label marking the views published by a configuration, only these are deleted by the reconciliation
+CONFIG_LABEL = "keboola_config_id"
+
+
+def config_labels(config_id) -> Dict[str, str]:
+    """
+    Labels of the views published by the configuration, none without a (saved) configuration.
+    Label values are lowercase letters, digits, underscores and dashes.
+    """
+    if not config_id:
+        return {}
+    return {CONFIG_LABEL: re.sub(r"[^a-z0-9_-]", "_", str(config_id).lower())[:63]}
+
+
+def dataset_cache_key(project_id, dataset_id) -> str:
+    return f"dataset:{project_id}.{dataset_id}"
+
+
+def dataset_summary(resource) -> dict:
+    """
+    Part of the dataset resource kept in the metadata cache between runs: the reference, the location
+    and the ETag, never the access entries.
+    """
+    return {key: resource[key] for key in ("datasetReference", "location", "etag") if key in resource}
+
+
+def has_access_entries(dataset) -> bool:
+    """
+    Whether the access entries of the dataset were read, a dataset from the cached summary has none.
+    """
+    return not isinstance(dataset, bigquery.Dataset) or "access" in dataset.to_api_repr()
 
 
 class BigqueryClient:
@@ -13,90 +89,258 @@ class BigqueryClient:
             service_account_info, scopes=scopes
         )
 
-    def __init__(self, credentials):
-        self.client = bigquery.Client(credentials=credentials)
-
-    def _grant_view_access(self, dataset, view):
-        access_entries = dataset.access_entries
-        logging.info(f"Access entries before update: {access_entries}")
-
-        new_access_entry = bigquery.AccessEntry(
-            role=None,
-            entity_type="view",
-            entity_id={
-                "projectId": view.reference.project,
-                "datasetId": view.reference.dataset_id,
-                "tableId": view.reference.table_id,
-            },
-        )
+    def __init__(
+        self,
+        credentials,
+        cache=None,
+        metrics=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        estimate_query_costs=False,
+        config_id=None,
+    ):
+        # the shared session keeps the connections alive and reuses the OAuth token of the service account
+        self.client = bigquery.Client(credentials=credentials, _http=get_authorized_session(credentials, pool_size))
+        self.cache = cache or MetadataCache()
+        self.metrics = metrics or ApiMetrics()
+        self.scheduler = MutationScheduler(metrics=self.metrics)
+        self.service_account_email = getattr(credentials, "service_account_email", None)
+        # the created and replaced views get their query cost estimated with dry-run queries
+        self.estimate_query_costs = estimate_query_costs
+        # the created and replaced views are labelled with the configuration publishing them
+        self.view_labels = config_labels(config_id)
+        # dataset resources with the access entries read in this run
+        self._datasets = {}
+        self._datasets_lock = threading.Lock()
+        self._access_indexes = {}
+        self._access_indexes_lock = threading.Lock()
 
-        if not any(
-            entry.entity_type == "view"
-            and entry.entity_id.get("projectId") == view.reference.project
-            and entry.entity_id.get("datasetId") == view.reference.dataset_id
-            and entry.entity_id.get("tableId") == view.reference.table_id
-            for entry in access_entries
-        ):
-            access_entries.append(new_access_entry)
-            dataset.access_entries = access_entries
+    def _call(self, operation, *args, **kwargs):
+        if operation in MUTATING_OPERATIONS:
+            # metadata updates go through the per-table/dataset rate limits
+            kwargs.setdefault("retry", MUTATION_RETRY)
+            return self.scheduler.call(
+                self._resource_key(args[0]), operation, self._tracked_call, operation, *args, **kwargs
+            )
+        return self._tracked_call(operation, *args, **kwargs)
+
+    def _tracked_call(self, operation, *args, **kwargs):
+        with self.metrics.track(operation):
+            return getattr(self.client, operation)(*args, **kwargs)
+
+    @staticmethod
+    def _resource_key(resource):
+        if hasattr(resource, "table_id"):
+            return f"table:{resource.project}.{resource.dataset_id}.{resource.table_id}"
+        return f"dataset:{resource.project}.{resource.dataset_id}"
+
+    def _apply_access_diff(self, dataset, add=(), remove=()):
+        """
+        Adds the missing and removes the present access entries of the dataset in one update,
+        returns the updated dataset.
+        """
+        index = AccessEntryIndex(dataset.access_entries)
+        added = index.add(add)
+        removed = index.remove(remove)
+        if not added and not removed:
+            logging.info(f"Access entries of the source dataset {dataset.dataset_id} are up to date, nothing to do.")
+            return dataset
+        logging.debug(f"Access entries before update: {dataset.access_entries}")
+        dataset.access_entries = index.entries
+
+        try:
+            updated_dataset = self._call("update_dataset", dataset, ["access_entries"])
+        except PreconditionFailed:
+            self.metrics.record_conflict("update_dataset")
+            # the cached dataset (and its ETag) is stale
+            self._invalidate_dataset(dataset.project, dataset.dataset_id)
+            raise
+        self._cache_dataset(updated_dataset)
+        if added:
             logging.info(
-                f"View {view.reference} has been granted access to the source dataset"
+                f"Granted access to the source dataset {dataset.dataset_id} to {len(added)} entities "
+                f"({len(add) - len(added)} already had it): "
+                f"{', '.join(describe_access_entry(entry) for entry in added)}"
             )
-        else:
+        if removed:
             logging.info(
-                f"View {view.reference} already has access to the source dataset"
+                f"Revoked access to the source dataset {dataset.dataset_id} from {len(removed)} entities: "
+                f"{', '.join(describe_access_entry(entry) for entry in removed)}"
             )
+        return updated_dataset
 
-        self.client.project = dataset.project
-        self.client.update_dataset(dataset, ["access_entries"])
-        logging.info(
-            f"Access entries have been updated: {dataset.access_entries}"
-        )
+    def access_index(self, dataset) -> AccessEntryIndex:
+        """
+        Index of the dataset access entries, reused for the same dataset version (ETag).
+        """
+        dataset = self._with_access_entries(dataset)
+        key = (dataset.project, dataset.dataset_id, dataset.etag)
+        with self._access_indexes_lock:
+            index = self._access_indexes.get(key)
+        if index is None:
+            index = AccessEntryIndex(dataset.access_entries)
+            if dataset.etag is not None:
+                with self._access_indexes_lock:
+                    self._access_indexes[key] = index
+        return index
+
+    def _update_access(self, source_dataset, *views):
+        return self.update_access_entries(source_dataset, add=[view_access_entry(view) for view in views])
 
-    def _update_access(self, source_dataset, view):
+    def update_access_entries(self, source_dataset, add=(), remove=()):
         # ``update_dataset`` sends the dataset's ETag as an ``If-Match`` header, so a
         # concurrent change to the source dataset's access entries (e.g. another view
         # writer granting access at the same time) makes it fail with HTTP 412
         # PreconditionFailed. Retry with a freshly fetched dataset (and thus a fresh
-        # ETag), re-merging the view access entry so any concurrent additions are kept.
+        # ETag), re-merging the access entries so any concurrent additions are kept.
         # A persistent conflict still fails loudly after the last attempt.
         attempts = 5
         delay = 2
+        source_dataset = self._with_access_entries(source_dataset)
         for attempt in range(1, attempts + 1):
             try:
-                self._grant_view_access(source_dataset, view)
-                return
+                return self._apply_access_diff(source_dataset, add, remove)
             except PreconditionFailed as exc:
                 if attempt == attempts:
                     raise
                 logging.warning(
                     "Source dataset access entries changed concurrently "
-                    "(HTTP 412: %s), retry %d/%d in %ds; re-fetching the dataset.",
+                    "(HTTP 412: %s), retry %d/%d in %.1fs; re-fetching the dataset.",
                     exc,
                     attempt,
                     attempts,
                     delay,
                 )
+                self.metrics.record_retry("update_dataset", delay)
                 time.sleep(delay)
-                delay = min(delay * 2, 30)
-                self.client.project = source_dataset.project
-                source_dataset = self.client.get_dataset(
-                    f"{source_dataset.project}.{source_dataset.dataset_id}"
+                # jitter keeps concurrent writers of the same dataset from retrying in lockstep
+                delay = min(delay * 2, 30) * random.uniform(0.75, 1.0)
+                source_dataset = self._call(
+                    "get_dataset", f"{source_dataset.project}.{source_dataset.dataset_id}"
                 )
+                self._cache_dataset(source_dataset)
+
+    def grant_views_access(self, source_dataset, views):
+        """
+        Authorizes all views on the source dataset with a single access entries update.
+        """
+        self._update_access(source_dataset, *views)
+
+    def grant_dataset_access(self, source_dataset, *destination_datasets):
+        """
+        Authorizes all views of the destination datasets on the source dataset (authorized datasets) with
+        a single access entries update, returns the source dataset with the grants. Existing grants are
+        detected without any update.
+        """
+        source_dataset = self._with_access_entries(source_dataset)
+        index = self.access_index(source_dataset)
+        missing = [dataset for dataset in destination_datasets if not index.has_dataset(dataset)]
+        if not missing:
+            logging.info(
+                f"Datasets {', '.join(f'{d.project}.{d.dataset_id}' for d in destination_datasets)} are already "
+                f"authorized on the source dataset {source_dataset.dataset_id}."
+            )
+            return source_dataset
+        return self.update_access_entries(source_dataset, add=[dataset_access_entry(dataset) for dataset in missing])
 
-    def find_dataset(self, project_id, dataset_id):
+    def revoke_views_access(self, source_dataset, view_ids):
+        """
+        Removes the access entries of the views (``project.dataset.view``) from the source dataset
+        with a single access entries update.
+        """
+        return self.update_access_entries(
+            source_dataset,
+            remove=[view_reference_access_entry(bigquery.TableReference.from_string(v)) for v in view_ids],
+        )
+
+    def _cache_dataset(self, dataset):
+        """
+        Keeps the dataset for this run and its summary (without the access entries) for the next runs.
+        """
+        if isinstance(dataset, bigquery.Dataset):
+            key = dataset_cache_key(dataset.project, dataset.dataset_id)
+            resource = dataset.to_api_repr()
+            with self._datasets_lock:
+                self._datasets[key] = resource
+            self.cache.set(key, dataset_summary(resource))
+
+    def _invalidate_dataset(self, project_id, dataset_id):
+        key = dataset_cache_key(project_id, dataset_id)
+        with self._datasets_lock:
+            self._datasets.pop(key, None)
+        self.cache.invalidate(key)
+
+    def find_dataset(self, project_id, dataset_id, refresh=False):
+        """
+        Returns the dataset read in this run, or the cached summary of a previous run (its location and ETag,
+        the access entries are read once per run when needed), or reads it.
+        """
         dataset_id_full = f"{project_id}.{dataset_id}"
+        key = dataset_cache_key(project_id, dataset_id)
+        if not refresh:
+            with self._datasets_lock:
+                resource = self._datasets.get(key)
+            if resource is not None:
+                return bigquery.Dataset.from_api_repr(resource)
+            cached = self.cache.get(key)
+            if cached is not None:
+                logging.info(f"Using cached metadata of dataset {dataset_id_full}")
+                # states of older versions cached the whole resource, its access entries are not trusted
+                return bigquery.Dataset.from_api_repr(dataset_summary(cached))
         try:
             logging.info(f"Getting dataset {dataset_id_full}")
-            self.client.project = project_id
-            return self.client.get_dataset(dataset_id_full)
+            dataset = self._call("get_dataset", dataset_id_full)
         except NotFound:
             raise Exception(f"Dataset {dataset_id_full} does not exist")
+        self._cache_dataset(dataset)
+        return dataset
+
+    def _with_access_entries(self, dataset):
+        """
+        The dataset with its access entries, a cached summary is read (once per run) before the entries are used.
+        """
+        if has_access_entries(dataset):
+            return dataset
+        with self._datasets_lock:
+            resource = self._datasets.get(dataset_cache_key(dataset.project, dataset.dataset_id))
+        if resource is not None:
+            return bigquery.Dataset.from_api_repr(resource)
+        return self.find_dataset(dataset.project, dataset.dataset_id, refresh=True)
+
+    def list_projects(self, stop_when=None):
+        """
+        Lists [project id, friendly name] of the projects visible to the service account, page by page.
+
+        The complete list is cached for the service account, so all project pickers are served from one fetch.
+        With ``stop_when`` the listing stops at the first project id matching it and the partial list
+        is returned (and not cached), unless the complete list is already cached.
+        """
+        key = f"projects:{self.service_account_email}"
+        projects = self.cache.get(key)
+        if projects is not None:
+            return projects
+
+        projects = []
+        with self.metrics.track("list_projects"):
+            for page in self.client.list_projects().pages:
+                for project in page:
+                    projects.append([project.project_id, project.friendly_name])
+                    if stop_when and stop_when(project.project_id):
+                        return projects
+        self.cache.set(key, projects)
+        return projects
+
+    def list_datasets(self, project_id):
+        key = f"datasets:{project_id}"
+        datasets = self.cache.get(key)
+        if datasets is None:
+            with self.metrics.track("list_datasets"):
+                datasets = [d.dataset_id for d in self.client.list_datasets(project_id)]
+            self.cache.set(key, datasets)
+        return datasets
 
     def _get_view(self, dataset, view_id) -> bigquery.Table:
         try:
-            self.client.project = dataset.project
-            return self.client.get_table(dataset.table(view_id))
+            return self._call("get_table", dataset.table(view_id))
         except NotFound:
             logging.info(
                 f"Table or view {view_id} is not found in dataset {dataset.dataset_id} ({dataset.project})"
@@ -104,23 +348,84 @@ class BigqueryClient:
             return bigquery.Table(dataset.table(view_id))
 
     @staticmethod
-    def _compose_view_query(
-        source_project, source_dataset, source_table_id, custom_columns
+    def compose_view_query(
+        source_project, source_dataset, source_table_id, custom_columns, conditions=None
     ):
+        where = ""
+        if conditions:
+            where = f"""
+                      WHERE
+                          {" AND ".join(f"({condition})" for condition in conditions)}"""
         if custom_columns:
             return f"""
                       SELECT
                           {", ".join([f"`{col}`" for col in custom_columns])}
                       FROM
-                          `{source_project}`.`{source_dataset.dataset_id}`.`{source_table_id}`
+                          `{source_project}`.`{source_dataset.dataset_id}`.`{source_table_id}`{where}
                   """
         return f"""
                   SELECT
                       *
                   FROM
-                      `{source_project}`.`{source_dataset.dataset_id}`.`{source_table_id}`
+                      `{source_project}`.`{source_dataset.dataset_id}`.`{source_table_id}`{where}
               """
 
+    @staticmethod
+    def _view_fingerprint(query, description, schema, access_granted, materialized=None):
+        """
+        Hash of the view state that matters to consumers, whitespace in the query is not significant.
+        """
+        state = {
+            "query": " ".join((query or "").split()),
+            "description": description or None,
+            "columns": [[f.name, f.description or None] for f in schema],
+            "access_granted": access_granted,
+            "materialized": asdict(materialized) if materialized else None,
+        }
+        return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _is_view_up_to_date(
+        self, view, source_dataset, query, description, view_schema, authorize_dataset=False,
+        materialized=None,
+    ):
+        """
+        Compares the fingerprint of the desired view with the existing view and the source dataset access entries.
+        With ``authorize_dataset`` the view is covered by the (already granted) authorized destination dataset.
+        """
+        return self.view_matches(
+            view,
+            query,
+            description,
+            view_schema,
+            authorize_dataset or self.access_index(source_dataset).has_view(view),
+            materialized,
+            self.view_labels,
+        )
+
+    @classmethod
+    def view_matches(cls, view, query, description, view_schema, access_granted, materialized=None, labels=None):
+        """
+        Compares the fingerprint of the desired view (materialized with the options) with the existing view.
+        The columns and their descriptions are compared with the desired schema from ``build_view_schema``,
+        a ``SELECT *`` view keeps the columns it was created with when the source table gets new ones.
+        Without the desired schema (columns missing in the source table) the view never matches,
+        a view missing one of the ``labels`` neither.
+        """
+        if view_schema is None:
+            return False
+        if any((view.labels or {}).get(key) != value for key, value in (labels or {}).items()):
+            return False
+        desired = cls._view_fingerprint(query, description, view_schema, True, materialized)
+        is_materialized = materialized_view.is_materialized_view(view)
+        actual = cls._view_fingerprint(
+            view.mview_query if is_materialized else view.view_query,
+            view.description,
+            view.schema,
+            access_granted,
+            materialized_view.read_options(view) if is_materialized else None,
+        )
+        return desired == actual
+
     def create_view(
         self,
         destination_dataset,
@@ -130,44 +435,400 @@ class BigqueryClient:
         custom_columns,
         view_name,
         table_description,
+        authorize_dataset=False,
+        row_filter=None,
+        materialized=None,
     ):
-        self.client.project = destination_dataset.project
+        if authorize_dataset:
+            source_dataset = self.grant_dataset_access(source_dataset, destination_dataset)
 
         view_ref = self._get_view(destination_dataset, view_name)
 
-        if view_ref.created:
-            self.client.delete_table(view_ref, not_found_ok=True)
-            logging.info(f"Deleting view {view_ref.reference.to_api_repr()}")
+        source = self._get_source_table(source_dataset, source_table)
+        conditions = self.compose_filter_conditions(source, row_filter) if row_filter else []
+
+        query = self.compose_view_query(
+            source_dataset.project, source_dataset, source_table, custom_columns, conditions
+        )
+        view_schema = self.build_view_schema(source, custom_columns, source_table_columns_descriptions)
 
-        query = self._compose_view_query(
-            source_dataset.project, source_dataset, source_table, custom_columns
+        if view_ref.created and self._is_view_up_to_date(
+            view_ref,
+            source_dataset,
+            query,
+            table_description,
+            view_schema,
+            authorize_dataset,
+            materialized,
+        ):
+            logging.info(f"View {view_ref.reference.to_api_repr()} is up to date, nothing to change.")
+            return view_ref
+
+        if conditions:
+            self.validate_view_query(view_ref, query, source_dataset.location)
+        if self.estimate_query_costs:
+            self.estimate_query_cost(view_ref, source_dataset, source_table, custom_columns, conditions)
+
+        if materialized:
+            materialized_view.check_eligibility(source, custom_columns, row_filter, materialized)
+        created_view = self.save_view(
+            view_ref, query, table_description, view_schema, source_table_columns_descriptions, materialized, source
         )
-        view = bigquery.Table(view_ref)
+
+        if not authorize_dataset:
+            # the authorized destination dataset covers the view, no per-view access entry otherwise
+            self._update_access(source_dataset, created_view)
+        return created_view
+
+    def save_view(
+        self,
+        view_ref,
+        query,
+        table_description,
+        view_schema,
+        source_table_columns_descriptions,
+        materialized=None,
+        source=None,
+    ):
+        """
+        Creates the view or replaces the existing one, a materialized view (of the ``source`` table)
+        with the ``materialized`` options.
+        """
+        if materialized:
+            return self._save_materialized_view(
+                view_ref, query, table_description, materialized, source, source_table_columns_descriptions
+            )
+        save = self._replace_view if view_ref.created else self._create_view
+        return save(view_ref, query, table_description, view_schema, source_table_columns_descriptions)
+
+    def _get_source_table(self, source_dataset, source_table):
+        return self._call("get_table", source_dataset.table(source_table))
+
+    @staticmethod
+    def compose_filter_conditions(source, row_filter):
+        """
+        SQL conditions of the row filter, the time window column must be a TIMESTAMP, DATETIME or DATE column
+        (or the partitioning of the source table with ``partition_filter``).
+        """
+        conditions = []
+        if row_filter.predicate:
+            conditions.append(row_filter.predicate)
+        if not row_filter.time_window_days:
+            return conditions
+
+        column_types = {f.name: f.field_type for f in source.schema}
+        if row_filter.partition_filter:
+            partitioning = source.time_partitioning
+            if partitioning is None:
+                raise InvalidViewQuery(f"Source table {source.table_id} is not partitioned by time.")
+            column = partitioning.field or PARTITION_TIME_COLUMN
+            column_type = column_types.get(column, "TIMESTAMP")
+        else:
+            column = row_filter.time_window_column
+            if column not in column_types:
+                raise InvalidViewQuery(f"Time window column {column} does not exist in table {source.table_id}.")
+            column_type = column_types[column]
+        if column_type not in TIME_WINDOW_STARTS:
+            raise InvalidViewQuery(
+                f"Time window column {column} must be one of {', '.join(TIME_WINDOW_STARTS)}, it is {column_type}."
+            )
+        # the partition time pseudo column cannot be quoted
+        column_sql = column if column == PARTITION_TIME_COLUMN else f"`{column}`"
+        window_start = TIME_WINDOW_STARTS[column_type].format(days=int(row_filter.time_window_days))
+        conditions.append(f"{column_sql} >= {window_start}")
+        return conditions
+
+    def _dry_run_query(self, query, location, project):
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        with self.metrics.track("dry_run_query"):
+            return self.client.query(query, job_config=job_config, location=location, project=project)
+
+    def validate_view_query(self, view_ref, query, location):
+        """
+        Checks the view query with a (free) dry-run query job before the view is published.
+        """
+        try:
+            self._dry_run_query(query, location, view_ref.project)
+        except BadRequest as exc:
+            raise InvalidViewQuery(
+                f"Row filter of view {view_ref.reference.to_api_repr()} is not valid: {exc.message}"
+            ) from exc
+
+    def estimate_query_cost(
+        self, view_ref, source_dataset, source_table, custom_columns, conditions=None
+    ) -> Optional[QueryCost]:
+        """
+        Estimates the bytes processed by ``SELECT *`` through the view with (free) dry-run queries of the view
+        query with all columns of the source table and with the selected columns, records it in the metrics.
+        Returns ``None`` when it cannot be estimated, the estimate never fails publishing of the view.
+        """
+        view_id = f"{view_ref.project}.{view_ref.dataset_id}.{view_ref.table_id}"
+        queries = [
+            self.compose_view_query(source_dataset.project, source_dataset, source_table, columns, conditions)
+            for columns in ([None, custom_columns] if custom_columns else [None])
+        ]
+        try:
+            processed = [
+                self._dry_run_query(query, source_dataset.location, view_ref.project).total_bytes_processed or 0
+                for query in queries
+            ]
+        except Exception as exc:
+            logging.warning(f"Query cost of view {view_id} could not be estimated: {exc}")
+            return None
+        return self.record_query_cost(view_id, QueryCost(processed[0], processed[-1]), self.metrics)
+
+    @staticmethod
+    def record_query_cost(view_id, cost, metrics) -> QueryCost:
+        metrics.record_query_cost(view_id, cost.full_bytes, cost.selected_bytes)
+        logging.info(
+            f"Query of view {view_id} processes {format_bytes(cost.selected_bytes)}, "
+            f"{format_bytes(cost.full_bytes)} with all source table columns."
+        )
+        return cost
+
+    @classmethod
+    def build_view_schema(cls, source, custom_columns, source_table_columns_descriptions):
+        """
+        Schema of the view of the source table (the custom columns or all of them) with the column descriptions,
+        ``None`` when a custom column is not in the source table.
+        """
+        source_schema = {f.name: f for f in source.schema}
+        columns = custom_columns or list(source_schema)
+        if any(column not in source_schema for column in columns):
+            return None
+        return cls._describe_schema(
+            [source_schema[column] for column in columns], source_table_columns_descriptions or {}
+        )
+
+    def _label_view(self, view):
+        """
+        Adds the configuration labels to the view, keeps its other labels.
+        """
+        if self.view_labels:
+            view.labels = dict(view.labels or {}, **self.view_labels)
+        return view
+
+    def is_published_view(self, view) -> bool:
+        """
+        Whether the view carries the label of this configuration, never without a configuration.
+        """
+        labels = view.labels or {}
+        return bool(self.view_labels) and all(labels.get(k) == v for k, v in self.view_labels.items())
+
+    def _create_view(self, view_ref, query, table_description, view_schema, source_table_columns_descriptions):
+        view = self._label_view(bigquery.Table(view_ref))
         view.view_query = query
         view.description = table_description
+        if view_schema:
+            view.schema = view_schema
 
         logging.info(
             f"Creating view {view.reference.to_api_repr()} with query {' '.join(query.split())}"
         )
-        created_view = self.client.create_table(view)
-        logging.info(f"View {created_view.reference.to_api_repr()} has been created.")
-
-        if source_table_columns_descriptions:
+        try:
+            created_view = self._call("create_table", view)
+        except BadRequest as exc:
+            if not view_schema:
+                raise
+            logging.warning(
+                f"View {view.reference.to_api_repr()} cannot be created with the column descriptions ({exc}), "
+                f"they will be applied after the creation."
+            )
+            view = self._label_view(bigquery.Table(view_ref))
+            view.view_query = query
+            view.description = table_description
+            created_view = self._call("create_table", view)
             # Apply column descriptions to the view
             self._update_columns_description(
                 created_view, source_table_columns_descriptions
             )
+        logging.info(f"View {created_view.reference.to_api_repr()} has been created.")
+        return created_view
+
+    def _replace_view(self, view, query, table_description, view_schema, source_table_columns_descriptions):
+        """
+        Patches the existing view in place, so it keeps its identity (and its access to the source dataset)
+        and never disappears for the consumers.
+        """
+        if materialized_view.is_materialized_view(view):
+            # a materialized view cannot be patched into a logical view
+            logging.info(f"Dropping materialized view {view.reference.to_api_repr()} to create it as a view.")
+            self._call("delete_table", view, not_found_ok=True)
+            return self._create_view(
+                view.reference, query, table_description, view_schema, source_table_columns_descriptions
+            )
+        view.view_query = query
+        view.description = table_description
+        fields = ["view_query", "description"]
+        if self.view_labels:
+            self._label_view(view)
+            fields.append("labels")
+
+        logging.info(
+            f"Replacing view {view.reference.to_api_repr()} with query {' '.join(query.split())}"
+        )
+        try:
+            if view_schema:
+                view.schema = view_schema
+                replaced_view = self._call("update_table", view, fields + ["schema"])
+            else:
+                replaced_view = self._call("update_table", view, fields)
+                # Apply column descriptions to the view
+                self._update_columns_description(
+                    replaced_view, source_table_columns_descriptions
+                )
+        except BadRequest as exc:
+            if not view_schema:
+                raise
+            logging.warning(
+                f"View {view.reference.to_api_repr()} cannot be replaced with the column descriptions ({exc}), "
+                f"they will be applied after the replacement."
+            )
+            replaced_view = self._call("update_table", view, fields)
+            self._update_columns_description(
+                replaced_view, source_table_columns_descriptions
+            )
+        logging.info(f"View {replaced_view.reference.to_api_repr()} has been replaced.")
+        return replaced_view
+
+    def _save_materialized_view(
+        self, view_ref, query, table_description, options, source, source_table_columns_descriptions
+    ):
+        """
+        Creates the materialized view, or updates the refresh options and the description of the existing one
+        in place. A changed query, clustering or partitioning (or an existing logical view) cannot be updated,
+        the view is dropped and created again.
+        """
+        view = materialized_view.build_materialized_view(view_ref.reference, query, table_description, options, source)
+        self._label_view(view)
+        view_id = view.reference.to_api_repr()
+        if view_ref.created and materialized_view.can_update_in_place(view_ref, view):
+            logging.info(f"Updating refresh options of materialized view {view_id}")
+            existing = materialized_view.update_refresh_options(view_ref, view)
+            fields = list(materialized_view.REFRESH_FIELDS)
+            if self.view_labels:
+                self._label_view(existing)
+                fields.append("labels")
+            saved = self._call("update_table", existing, fields)
+        else:
+            if view_ref.created:
+                logging.info(f"Dropping {view_id} to create it as a materialized view with the new definition.")
+                self._call("delete_table", view_ref, not_found_ok=True)
+            logging.info(f"Creating materialized view {view_id} with query {' '.join(query.split())}")
+            saved = self._call("create_table", view)
+
+        # the schema of a materialized view is derived from its query, the descriptions are applied afterwards
+        descriptions = {k: v for k, v in (source_table_columns_descriptions or {}).items() if v}
+        if any(field.description != descriptions.get(field.name) for field in saved.schema):
+            saved.schema = self._describe_schema(saved.schema, descriptions)
+            saved = self._call("update_table", saved, ["schema"])
+        logging.info(f"Materialized view {view_id} has been saved.")
+        return saved
+
+    def plan_changes(self, groups, max_workers, deletions=()) -> ChangeSet:
+        """
+        Plans publishing of the (source dataset, [(destination dataset, definition)], authorize dataset)
+        groups and deleting of the (project, dataset, view name) views without changing anything.
+        """
+        return ChangePlanner(self, max_workers).plan(groups, deletions)
 
-        self._update_access(source_dataset, created_view)
+    def apply_changes(self, change_set, max_workers) -> Dict[str, Optional[Exception]]:
+        return ChangePlanner(self, max_workers).apply(change_set)
+
+    def publish_views(
+        self, source_dataset, targets, max_workers, authorize_dataset=False
+    ) -> Dict[str, Optional[Exception]]:
+        """
+        Creates views of the (destination dataset, definition) targets reading from one source dataset:
+        the existing views and the source tables are read concurrently first, then only the changed
+        views are created or replaced through a bounded thread pool sharing this client.
+
+        A failure of one view does not abort the others, the result maps every full view id
+        to ``None`` on success or to the exception it failed with. The views are authorized
+        on the source dataset at the end with one access entries update, with ``authorize_dataset``
+        the destination datasets are authorized once upfront instead.
+        """
+        change_set = self.plan_changes([(source_dataset, targets, authorize_dataset)], max_workers)
+        logging.info(f"Planned changes: {change_set.summary()}")
+        return self.apply_changes(change_set, max_workers)
 
     def delete_view(self, destination_dataset, view_name):
         view_ref = self._get_view(destination_dataset, view_name)
         if view_ref.created:
-            self.client.delete_table(view_ref, not_found_ok=True)
+            self._call("delete_table", view_ref, not_found_ok=True)
             logging.info(f"Deleting view {view_ref.reference.to_api_repr()}")
+            self._revoke_deleted_view_access(view_ref)
         else:
             logging.info(f"View {view_ref.reference.to_api_repr()} does not exist.")
 
+    def _revoke_deleted_view_access(self, view):
+        source = self.get_view_source(view)
+        if source is None:
+            return
+        view_id = f"{view.project}.{view.dataset_id}.{view.table_id}"
+        try:
+            self.revoke_views_access(self.find_dataset(source[0], source[1]), [view_id])
+        except Exception as exc:
+            logging.warning(f"Access of the deleted view {view_id} to its source dataset could not be revoked: {exc}")
+
+    @staticmethod
+    def get_view_source(view):
+        """
+        Returns (project, dataset, table) the view reads from, ``None`` if the query is not a view of this writer.
+        """
+        query = view.mview_query if materialized_view.is_materialized_view(view) else view.view_query
+        match = VIEW_SOURCE_PATTERN.search(query or "")
+        return match.groups() if match else None
+
+    def list_views(self, dataset):
+        """
+        Full ids (``project.dataset.view``) of all views of the dataset, the materialized views included.
+        """
+        with self.metrics.track("list_tables"):
+            return [
+                f"{table.project}.{table.dataset_id}.{table.table_id}"
+                for table in self.client.list_tables(dataset)
+                if table.table_type in ("VIEW", materialized_view.MATERIALIZED_VIEW)
+            ]
+
+    def get_authorized_views(self, dataset):
+        """
+        Full ids of the views authorized on the dataset.
+        """
+        return self.access_index(dataset).view_ids()
+
+    @staticmethod
+    def run_concurrently(func, items, max_workers) -> dict:
+        """
+        Calls ``func`` for every item in a bounded thread pool, maps every item to its result or exception.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(func, item): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as exc:
+                    results[futures[future]] = exc
+        return results
+
+    def get_tables(self, table_ids, max_workers) -> dict:
+        """
+        Fetches the tables and views concurrently, maps every id to the table or to the exception it failed with.
+        """
+        return self.run_concurrently(lambda table_id: self._call("get_table", table_id), table_ids, max_workers)
+
+    def delete_views(self, view_ids, max_workers) -> Dict[str, Optional[Exception]]:
+        """
+        Deletes the views concurrently, maps every view id to ``None`` on success or to the exception.
+        """
+
+        def delete(view_id):
+            self._call("delete_table", bigquery.TableReference.from_string(view_id), not_found_ok=True)
+            logging.info(f"View {view_id} has been deleted.")
+
+        return self.run_concurrently(delete, view_ids, max_workers)
+
     def _update_columns_description(self, view, source_table_columns_descriptions):
         if not source_table_columns_descriptions:
             logging.info(
@@ -178,13 +839,21 @@ class BigqueryClient:
         logging.info(
             f"Updating view {view.reference.to_api_repr()} with column descriptions."
         )
+        view.schema = self._describe_schema(view.schema, source_table_columns_descriptions)
+        self._call("update_table", view, ["schema"])
+        logging.info(
+            f"View {view.reference.to_api_repr()} has been updated with column descriptions."
+        )
+
+    @staticmethod
+    def _describe_schema(schema, source_table_columns_descriptions):
         new_schema = []
 
-        for field in view.schema:
+        for field in schema:
             description = None
             if field.name in source_table_columns_descriptions:
                 description = source_table_columns_descriptions[field.name]
-                logging.info(
+                logging.debug(
                     f"Updating column {field.name} description to: {description}"
                 )
 
@@ -193,11 +862,7 @@ class BigqueryClient:
                 field_type=field.field_type,
                 mode=field.mode,
                 description=description,
+                fields=field.fields,
             )
             new_schema.append(new_field)
-
-        view.schema = new_schema
-        self.client.update_table(view, ["schema"])
-        logging.info(
-            f"View {view.reference.to_api_repr()} has been updated with column descriptions."
-        )
+        return new_schema
@@ -0,0 +1,143 @@
+import datetime
+import re
+from typing import Optional
+
+from google.cloud import bigquery
+
+from google_cloud.view_definition import InvalidViewQuery, MaterializedViewOptions
+
+MATERIALIZED_VIEW = "MATERIALIZED_VIEW"
+
+# BigQuery limits of the materialized views
+MIN_REFRESH_INTERVAL_MINUTES = 1
+MAX_REFRESH_INTERVAL_MINUTES = 7 * 24 * 60
+MAX_CLUSTERING_FIELDS = 4
+
+# properties of an existing materialized view updated in place
+REFRESH_FIELDS = ["mview_enable_refresh", "mview_refresh_interval", "max_staleness", "description"]
+
+# canonical format of the SQL INTERVAL values in the API, e.g. "0-0 1 2:30:0"
+_INTERVAL = re.compile(r"^(\d+)-(\d+) (\d+) (\d+):(\d+):(\d+)")
+
+
+def is_materialized_view(table) -> bool:
+    return getattr(table, "table_type", None) == MATERIALIZED_VIEW
+
+
+def staleness_interval(minutes) -> Optional[str]:
+    if minutes is None:
+        return None
+    days, minutes = divmod(int(minutes), 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"0-0 {days} {hours}:{minutes}:0"
+
+
+def staleness_minutes(interval) -> Optional[int]:
+    match = _INTERVAL.match(interval or "")
+    if match is None:
+        return None
+    _, _, days, hours, minutes, _ = (int(part) for part in match.groups())
+    return (days * 24 + hours) * 60 + minutes
+
+
+def check_eligibility(source, columns, row_filter, options):
+    """
+    Checks that a materialized view of the columns (all without custom columns) of the source table
+    can be created, raises ``InvalidViewQuery`` with the reason when it cannot.
+    """
+    if source.table_type != "TABLE":
+        raise InvalidViewQuery(
+            f"Materialized view can only read a table, source {source.table_id} is {source.table_type}."
+        )
+    if row_filter and row_filter.time_window_days:
+        raise InvalidViewQuery(
+            "Materialized view cannot have the rolling time window, the current time is not deterministic."
+        )
+    interval = options.refresh_interval_minutes
+    if interval is not None and not MIN_REFRESH_INTERVAL_MINUTES <= interval <= MAX_REFRESH_INTERVAL_MINUTES:
+        raise InvalidViewQuery(
+            f"Refresh interval must be between {MIN_REFRESH_INTERVAL_MINUTES} and "
+            f"{MAX_REFRESH_INTERVAL_MINUTES} minutes, got {interval}."
+        )
+
+    view_columns = set(columns or [f.name for f in source.schema])
+    clustering_fields = options.clustering_fields or []
+    if len(clustering_fields) > MAX_CLUSTERING_FIELDS:
+        raise InvalidViewQuery(f"Materialized view can be clustered by up to {MAX_CLUSTERING_FIELDS} columns.")
+    missing = [column for column in clustering_fields if column not in view_columns]
+    if missing:
+        raise InvalidViewQuery(f"Clustering columns {missing} are not columns of the view of {source.table_id}.")
+
+    if options.partition_field:
+        partitioning = source.time_partitioning
+        if partitioning is None or partitioning.field != options.partition_field:
+            raise InvalidViewQuery(
+                f"Partitioning column {options.partition_field} must be the time partitioning column "
+                f"of the source table {source.table_id}."
+            )
+        if options.partition_field not in view_columns:
+            raise InvalidViewQuery(f"Partitioning column {options.partition_field} is not a column of the view.")
+
+
+def _apply_refresh_options(view, options):
+    view.mview_enable_refresh = options.refresh_interval_minutes is not None
+    view.mview_refresh_interval = (
+        datetime.timedelta(minutes=options.refresh_interval_minutes)
+        if options.refresh_interval_minutes is not None
+        else None
+    )
+    view.max_staleness = staleness_interval(options.max_staleness_minutes)
+
+
+def build_materialized_view(reference, query, description, options, source) -> bigquery.Table:
+    view = bigquery.Table(reference)
+    view.mview_query = query
+    view.description = description
+    _apply_refresh_options(view, options)
+    if options.clustering_fields:
+        view.clustering_fields = list(options.clustering_fields)
+    if options.partition_field:
+        view.time_partitioning = bigquery.TimePartitioning(
+            type_=source.time_partitioning.type_, field=options.partition_field
+        )
+    return view
+
+
+def read_options(view) -> MaterializedViewOptions:
+    """
+    Options of an existing materialized view, to be compared with the configured ones.
+    """
+    refresh_interval = view.mview_refresh_interval if view.mview_enable_refresh else None
+    return MaterializedViewOptions(
+        refresh_interval_minutes=int(refresh_interval.total_seconds() // 60) if refresh_interval else None,
+        max_staleness_minutes=staleness_minutes(view.max_staleness),
+        clustering_fields=list(view.clustering_fields) if view.clustering_fields else None,
+        partition_field=view.time_partitioning.field if view.time_partitioning else None,
+    )
+
+
+def can_update_in_place(existing, view) -> bool:
+    """
+    Only the refresh options and the description of a materialized view can be changed, a changed query,
+    clustering or partitioning needs a new materialized view.
+    """
+    if not is_materialized_view(existing):
+        return False
+    current = read_options(existing)
+    desired = read_options(view)
+    return (
+        " ".join((existing.mview_query or "").split()) == " ".join(view.mview_query.split())
+        and current.clustering_fields == desired.clustering_fields
+        and current.partition_field == desired.partition_field
+    )
+
+
+def update_refresh_options(existing, view):
+    """
+    Copies the refresh options and the description of the desired view to the existing one for an update.
+    """
+    existing.description = view.description
+    existing.mview_enable_refresh = view.mview_enable_refresh
+    existing.mview_refresh_interval = view.mview_refresh_interval
+    existing.max_staleness = view.max_staleness
+    return existing
@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+import threading
+import time
+
+DEFAULT_TTL = 3600
+
+
+class MetadataCache:
+    """
+    Thread-safe TTL cache of JSON serializable BigQuery metadata (dataset resources, project lists).
+
+    It lives in memory for a single run and can be persisted between invocations,
+    either as a dict (e.g. in the component state) or in a local JSON file.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, entries=None):
+        self.ttl = ttl
+        self._entries = dict(entries or {})
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[key]
+                return None
+            return entry["value"]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = {"value": value, "expires_at": time.time() + self.ttl}
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {key: entry for key, entry in self._entries.items() if entry["expires_at"] > now}
+
+    @classmethod
+    def from_dict(cls, entries, ttl=DEFAULT_TTL):
+        return cls(ttl, entries)
+
+    @classmethod
+    def load(cls, path, ttl=DEFAULT_TTL):
+        """
+        Loads the cache from a local file, a missing or broken file means an empty cache.
+        """
+        try:
+            with open(path) as cache_file:
+                return cls(ttl, json.load(cache_file))
+        except (OSError, ValueError):
+            return cls(ttl)
+
+    def save(self, path):
+        try:
+            with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache_file:
+                json.dump(self.to_dict(), cache_file)
+        except (OSError, TypeError) as err:
+            logging.debug(f"Metadata cache could not be saved to {path}: {err}")
@@ -0,0 +1,316 @@
+import logging
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from google_cloud import materialized_view
+from google_cloud.access import AccessGrantBatcher
+from google_cloud.query_cost import QueryCost
+
+# actions of the planned changes
+CREATE = "create"
+REPLACE = "replace"
+NOOP = "noop"
+DELETE = "delete"
+GRANT = "grant"
+REVOKE = "revoke"
+ACTIONS = (CREATE, REPLACE, NOOP, DELETE, GRANT, REVOKE)
+
+
+@dataclass(eq=False)
+class Change:
+    """One planned change of a view or of an access entry of a source dataset."""
+
+    action: str
+    # full id of the view (``project.dataset.view``), or of the destination dataset for a dataset grant
+    target: str
+    source_dataset_id: Optional[str] = None
+    query: Optional[str] = None
+    # estimated bytes processed by the view, with the query costs estimation of the client
+    cost: Optional[QueryCost] = None
+    # what the executor needs, not part of the JSON output
+    view: Optional[bigquery.Table] = field(default=None, repr=False, compare=False)
+    source_dataset: Optional[bigquery.Dataset] = field(default=None, repr=False, compare=False)
+    definition: Optional[object] = field(default=None, repr=False, compare=False)
+    schema: Optional[list] = field(default=None, repr=False, compare=False)
+    conditions: Optional[list] = field(default=None, repr=False, compare=False)
+    source: Optional[bigquery.Table] = field(default=None, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        change = {"action": self.action, "target": self.target}
+        if self.source_dataset_id:
+            change["source_dataset_id"] = self.source_dataset_id
+        if self.query:
+            change["query"] = " ".join(self.query.split())
+        if self.definition is not None and self.definition.materialized:
+            change["materialized"] = asdict(self.definition.materialized)
+        if self.cost:
+            change["query_cost"] = self.cost.to_dict()
+        return change
+
+
+@dataclass
+class ChangeSet:
+    """Typed changes computed from one read of the current state, applied by ``ChangePlanner.apply``."""
+
+    changes: List[Change] = field(default_factory=list)
+    # full view id => why the view cannot be published (e.g. a rejected row filter)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def of(self, *actions) -> List[Change]:
+        return [change for change in self.changes if change.action in actions]
+
+    def is_empty(self) -> bool:
+        return not any(change.action != NOOP for change in self.changes)
+
+    def estimated_api_calls(self) -> int:
+        """
+        Mutating API calls the executor makes: one per view created, replaced or deleted and per
+        source dataset one access entries update each for the dataset grants, the view grants and
+        the revokes.
+        """
+        access_updates = {
+            (c.action, c.view is None, c.source_dataset_id) for c in self.changes if c.action in (GRANT, REVOKE)
+        }
+        return len(self.of(CREATE, REPLACE, DELETE)) + len(access_updates)
+
+    def summary(self) -> Dict[str, int]:
+        counts = Counter(change.action for change in self.changes)
+        return {action: counts.get(action, 0) for action in ACTIONS}
+
+    def to_dict(self) -> dict:
+        return {
+            "summary": self.summary(),
+            "estimated_api_calls": self.estimated_api_calls(),
+            "changes": [change.to_dict() for change in self.changes if change.action != NOOP],
+            "unchanged_views": [change.target for change in self.of(NOOP)],
+            "errors": self.errors,
+        }
+
+
+class ChangePlanner:
+    """
+    Splits publishing of views into a read-only planning stage and an executor applying only the diff.
+
+    The planning reads the existing views and the source tables concurrently, compares them with the
+    definitions and the access entries of the source datasets and returns a ``ChangeSet``. Nothing is
+    changed until ``apply`` is called with it.
+    """
+
+    def __init__(self, bigquery_client, max_workers):
+        self._bigquery_client = bigquery_client
+        self._max_workers = max_workers
+
+    def plan(self, groups, deletions=()) -> ChangeSet:
+        """
+        Plans the (source dataset, [(destination dataset, definition)], authorize dataset) groups and
+        the deletion of the (project, dataset, view name) views.
+        """
+        bq = self._bigquery_client
+        change_set = ChangeSet()
+
+        view_ids = {f"{project}.{dataset}.{view_name}" for project, dataset, view_name in deletions}
+        source_ids = set()
+        for source, targets, _ in groups:
+            for destination, definition in targets:
+                view_ids.add(f"{destination.project}.{destination.dataset_id}.{definition.view_name}")
+                source_ids.add(f"{source.project}.{source.dataset_id}.{definition.source_table}")
+        views = bq.get_tables(sorted(view_ids), self._max_workers)
+        # the columns of a view follow its source table, so it is read even for an unchanged view query
+        sources = bq.get_tables(sorted(source_ids), self._max_workers)
+
+        for source_dataset, targets, authorize_dataset in groups:
+            self._plan_group(change_set, source_dataset, targets, authorize_dataset, views, sources)
+        self._validate_changes(change_set)
+        self._plan_deletions(change_set, deletions, views)
+        return change_set
+
+    def _plan_group(self, change_set, source_dataset, targets, authorize_dataset, views, sources):
+        bq = self._bigquery_client
+        source_id = f"{source_dataset.project}.{source_dataset.dataset_id}"
+        index = bq.access_index(source_dataset)
+
+        if authorize_dataset:
+            destinations = {(d.project, d.dataset_id): d for d, _ in targets}
+            for (project, dataset_id), destination in sorted(destinations.items()):
+                if not index.has_dataset(destination):
+                    change_set.changes.append(
+                        Change(GRANT, f"{project}.{dataset_id}", source_id, source_dataset=source_dataset)
+                    )
+
+        for destination, definition in targets:
+            view_id = f"{destination.project}.{destination.dataset_id}.{definition.view_name}"
+            existing = views[view_id]
+            if isinstance(existing, NotFound):
+                existing = None
+            elif isinstance(existing, Exception):
+                change_set.errors[view_id] = str(existing)
+                continue
+            source = sources[f"{source_id}.{definition.source_table}"]
+            try:
+                if isinstance(source, Exception):
+                    raise source
+                conditions = []
+                if definition.row_filter:
+                    conditions = bq.compose_filter_conditions(source, definition.row_filter)
+            except Exception as exc:
+                change_set.errors[view_id] = str(exc)
+                continue
+            query = bq.compose_view_query(
+                source_dataset.project, source_dataset, definition.source_table, definition.custom_columns, conditions
+            )
+            schema = bq.build_view_schema(source, definition.custom_columns, definition.columns_descriptions)
+
+            view = existing if existing is not None else bigquery.Table(destination.table(definition.view_name))
+            access_granted = authorize_dataset or index.has_view(view)
+            if existing is not None and bq.view_matches(
+                existing,
+                query,
+                definition.description,
+                schema,
+                access_granted,
+                definition.materialized,
+                bq.view_labels,
+            ):
+                change_set.changes.append(Change(NOOP, view_id, source_id, view=existing))
+                continue
+            change_set.changes.append(
+                Change(
+                    REPLACE if existing is not None else CREATE,
+                    view_id,
+                    source_id,
+                    query,
+                    view=view,
+                    source_dataset=source_dataset,
+                    definition=definition,
+                    schema=schema,
+                    conditions=conditions,
+                    source=source,
+                )
+            )
+            if not access_granted:
+                change_set.changes.append(Change(GRANT, view_id, source_id, view=view, source_dataset=source_dataset))
+
+    def _validate_changes(self, change_set):
+        """
+        Checks the changed materialized views are eligible and validates the filtered queries with dry runs
+        (estimating the query costs when enabled) concurrently, all are reads.
+        """
+        bq = self._bigquery_client
+        changed = change_set.of(CREATE, REPLACE)
+
+        def prepare(change):
+            definition = change.definition
+            if definition.row_filter:
+                bq.validate_view_query(change.view, change.query, change.source_dataset.location)
+            if definition.materialized:
+                materialized_view.check_eligibility(
+                    change.source, definition.custom_columns, definition.row_filter, definition.materialized
+                )
+            if bq.estimate_query_costs:
+                change.cost = bq.estimate_query_cost(
+                    change.view,
+                    change.source_dataset,
+                    definition.source_table,
+                    definition.custom_columns,
+                    change.conditions,
+                )
+
+        failed = {}
+        for change, error in bq.run_concurrently(prepare, changed, self._max_workers).items():
+            if error is not None:
+                failed[change.target] = str(error)
+        if failed:
+            change_set.errors.update(failed)
+            change_set.changes = [c for c in change_set.changes if c.target not in failed]
+
+    def _plan_deletions(self, change_set, deletions, views):
+        bq = self._bigquery_client
+        for project, dataset_id, view_name in deletions:
+            view_id = f"{project}.{dataset_id}.{view_name}"
+            view = views[view_id]
+            if isinstance(view, NotFound):
+                logging.info(f"View {view_id} does not exist, nothing to delete.")
+                continue
+            if isinstance(view, Exception):
+                change_set.errors[view_id] = str(view)
+                continue
+            source = bq.get_view_source(view)
+            source_dataset = bq.find_dataset(source[0], source[1]) if source else None
+            source_id = f"{source[0]}.{source[1]}" if source else None
+            change_set.changes.append(Change(DELETE, view_id, source_id, view=view, source_dataset=source_dataset))
+            if source_dataset is not None and bq.access_index(source_dataset).has_view(view):
+                change_set.changes.append(Change(REVOKE, view_id, source_id, view=view, source_dataset=source_dataset))
+
+    def apply(self, change_set: ChangeSet) -> Dict[str, Optional[Exception]]:
+        """
+        Applies the change set: the destination dataset grants first (the views of a source dataset
+        whose grant failed are skipped), then the views are created and replaced concurrently and
+        authorized with one access entries update per source dataset, then the views are deleted and
+        their access entries revoked the same way. Maps every full view id to ``None`` on success or
+        to the exception it failed with (planning errors included).
+        """
+        bq = self._bigquery_client
+        results = {view_id: ValueError(error) for view_id, error in change_set.errors.items()}
+
+        dataset_grants = {}
+        for change in change_set.of(GRANT):
+            if change.view is None:
+                dataset_grants.setdefault(change.source_dataset_id, (change.source_dataset, []))[1].append(
+                    bigquery.DatasetReference.from_string(change.target)
+                )
+        failed_grants = {}
+        for source_id, (source_dataset, destinations) in dataset_grants.items():
+            try:
+                bq.grant_dataset_access(source_dataset, *destinations)
+            except Exception as exc:
+                logging.error(f"Access to the source dataset {source_id} could not be granted: {exc}")
+                failed_grants[source_id] = exc
+        for change in change_set.of(CREATE, REPLACE, NOOP, GRANT):
+            if change.view is not None and change.source_dataset_id in failed_grants:
+                results[change.target] = failed_grants[change.source_dataset_id]
+
+        def save(change):
+            definition = change.definition
+            return bq.save_view(
+                change.view,
+                change.query,
+                definition.description,
+                change.schema,
+                definition.columns_descriptions,
+                definition.materialized,
+                change.source,
+            )
+
+        changed = [c for c in change_set.of(CREATE, REPLACE) if c.source_dataset_id not in failed_grants]
+        saved = bq.run_concurrently(save, changed, self._max_workers)
+        for change, view in saved.items():
+            if isinstance(view, Exception):
+                logging.error(f"View {change.target} could not be created: {view}")
+            results[change.target] = view if isinstance(view, Exception) else None
+        for change in change_set.of(NOOP):
+            results.setdefault(change.target, None)
+
+        grant_batcher = AccessGrantBatcher(bq)
+        for change in change_set.of(GRANT):
+            if change.view is not None and results.get(change.target) is None:
+                grant_batcher.add(change.source_dataset, change.view)
+        for view_id, error in grant_batcher.flush().items():
+            if error is not None:
+                results[view_id] = error
+
+        deleted = bq.delete_views([change.target for change in change_set.of(DELETE)], self._max_workers)
+        results.update(deleted)
+        revokes = {}
+        for change in change_set.of(REVOKE):
+            if deleted.get(change.target) is None:
+                revokes.setdefault(change.source_dataset_id, (change.source_dataset, []))[1].append(change.target)
+        for source_id, (source_dataset, view_ids) in revokes.items():
+            try:
+                bq.revoke_views_access(source_dataset, view_ids)
+            except Exception as exc:
+                logging.warning(f"Access of the deleted views to {source_id} could not be revoked: {exc}")
+        return results
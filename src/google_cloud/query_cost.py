@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+# the warning threshold is configured in GB
+BYTES_PER_GB = 10 ** 9
+
+
+@dataclass
+class QueryCost:
+    """
+    Bytes processed by ``SELECT *`` through a view as estimated by dry-run queries: with all columns
+    of the source table and with the columns selected by the view (the same without custom columns).
+    """
+
+    full_bytes: int
+    selected_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.full_bytes - self.selected_bytes
+
+    def to_dict(self) -> dict:
+        return {"full_bytes": self.full_bytes, "selected_bytes": self.selected_bytes, "saved_bytes": self.saved_bytes}
+
+
+def format_bytes(value) -> str:
+    return f"{value / BYTES_PER_GB:.2f} GB"
@@ -0,0 +1,108 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+
+@dataclass
+class ReconcilePlan:
+    """Changes bringing the destination datasets and the source dataset access entries in line with the config."""
+
+    delete_views: List[str] = field(default_factory=list)
+    # source dataset id => ids of the views whose access entries are removed from it
+    revoke_access: Dict[str, List[str]] = field(default_factory=dict)
+    kept_views: int = 0
+
+    def is_empty(self) -> bool:
+        return not self.delete_views and not self.revoke_access
+
+    def to_dict(self) -> dict:
+        return {
+            "delete_views": self.delete_views,
+            "revoke_access": self.revoke_access,
+            "kept_views": self.kept_views,
+        }
+
+
+class Reconciler:
+    """
+    Garbage collection of the views the configuration does not publish anymore.
+
+    A view of a destination dataset is orphaned when no config row publishes it and it carries the label
+    of this configuration (set on every view the configuration creates or replaces), views of other
+    configurations and hand-written views are never touched. A view access entry of a source dataset
+    is dangling when it points to a destination dataset of the configuration, no config row publishes
+    the view and the view is orphaned or does not exist anymore.
+    """
+
+    def __init__(self, bigquery_client, max_workers):
+        self._bigquery_client = bigquery_client
+        self._max_workers = max_workers
+
+    def plan(self, expected_views: Dict[str, Set[str]], source_datasets: Set[str]):
+        """
+        Builds the plan from the view names expected in every destination dataset (``project.dataset``)
+        and the source datasets (``project.dataset``) of the config rows.
+        """
+        bq = self._bigquery_client
+        plan = ReconcilePlan()
+        source_datasets = set(source_datasets)
+
+        candidates, existing = [], set()
+        for destination_id, view_names in sorted(expected_views.items()):
+            for view_id in bq.list_views(bq.find_dataset(*destination_id.rsplit(".", 1))):
+                existing.add(view_id)
+                if view_id.rsplit(".", 1)[-1] in view_names:
+                    plan.kept_views += 1
+                else:
+                    candidates.append(view_id)
+
+        for view_id, view in sorted(bq.get_tables(candidates, self._max_workers).items()):
+            if isinstance(view, Exception):
+                logging.warning(f"View {view_id} could not be inspected, it is kept: {view}")
+                continue
+            if not bq.is_published_view(view):
+                logging.info(f"View {view_id} is not labelled by this configuration, it is kept.")
+                continue
+            plan.delete_views.append(view_id)
+            source = bq.get_view_source(view)
+            if source is not None:
+                source_datasets.add(f"{source[0]}.{source[1]}")
+
+        deleted = set(plan.delete_views)
+        for source_id in sorted(source_datasets):
+            try:
+                # the access entries must be current, not the cached ones
+                source_dataset = bq.find_dataset(*source_id.rsplit(".", 1), refresh=True)
+            except Exception as exc:
+                logging.warning(f"Access entries of the source dataset {source_id} cannot be checked: {exc}")
+                continue
+            dangling = []
+            for view_id in bq.get_authorized_views(source_dataset):
+                destination_id, view_name = view_id.rsplit(".", 1)
+                if destination_id not in expected_views or view_name in expected_views[destination_id]:
+                    continue
+                # the existing views not labelled by this configuration keep their access
+                if view_id in deleted or view_id not in existing:
+                    dangling.append(view_id)
+            if dangling:
+                plan.revoke_access[source_id] = dangling
+        return plan
+
+    def apply(self, plan: ReconcilePlan) -> Dict[str, Optional[Exception]]:
+        """
+        Deletes the orphaned views concurrently, then removes the dangling access entries with one update
+        per source dataset, the datasets updated concurrently. Maps every view and source dataset id
+        to ``None`` on success or to the exception it failed with.
+        """
+        bq = self._bigquery_client
+        results = dict(bq.delete_views(plan.delete_views, self._max_workers))
+
+        def revoke(source_id):
+            bq.revoke_views_access(bq.find_dataset(*source_id.rsplit(".", 1)), plan.revoke_access[source_id])
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {source_id: executor.submit(revoke, source_id) for source_id in plan.revoke_access}
+        for source_id, future in futures.items():
+            results[source_id] = future.exception()
+        return results
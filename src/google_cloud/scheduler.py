@@ -0,0 +1,144 @@
+import logging
+import random
+import threading
+import time
+
+from google.api_core.exceptions import Forbidden, TooManyRequests
+
+from metrics import ApiMetrics
+
+# BigQuery allows 5 metadata update operations per 10 seconds for a single table or dataset, one token
+# every 2 seconds without a burst keeps any 10 seconds window at 5 operations (a full bucket of 5 would
+# allow 9 operations in the first 10 seconds)
+DEFAULT_RATE = 0.5
+DEFAULT_BURST = 1
+DEFAULT_MAX_ATTEMPTS = 6
+MAX_BACKOFF = 60
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "quotaExceeded"}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, ``acquire`` blocks the calling thread until a token is available.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes one token if available and returns 0, otherwise returns how long to wait for the next one.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """
+        Takes one token and returns how long the caller waited for it.
+        """
+        waited = 0.0
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return waited
+            self._sleep(wait)
+            waited += wait
+
+    def drain(self):
+        """
+        Empties the bucket after the API reported the rate limit, the next token comes only after a refill.
+        """
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = self._clock()
+
+
+class MutationScheduler:
+    """
+    Sends mutating metadata calls through per-resource token buckets.
+
+    Calls on one table or dataset are throttled to the BigQuery metadata update rate, calls on unrelated
+    resources only wait for their own bucket and run concurrently. Rate limit errors (HTTP 429 or 403 with
+    the ``rateLimitExceeded`` reason) are retried after the ``Retry-After`` delay or an exponential backoff
+    with jitter.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        metrics=None,
+        sleep=time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.metrics = metrics or ApiMetrics()
+        self._sleep = sleep
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, resource) -> TokenBucket:
+        with self._lock:
+            if resource not in self._buckets:
+                self._buckets[resource] = TokenBucket(self.rate, self.burst, sleep=self._sleep)
+            return self._buckets[resource]
+
+    @staticmethod
+    def is_rate_limit_error(exc) -> bool:
+        if isinstance(exc, TooManyRequests):
+            return True
+        return isinstance(exc, Forbidden) and any(
+            error.get("reason") in RATE_LIMIT_REASONS for error in (exc.errors or []) if isinstance(error, dict)
+        )
+
+    @staticmethod
+    def _retry_after(exc):
+        response = getattr(exc, "response", None)
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _retry_delay(self, bucket, resource, operation, exc, attempt):
+        """
+        Returns the delay before the next attempt of a rate limited call, ``None`` when the error is final.
+        """
+        if not self.is_rate_limit_error(exc) or attempt == self.max_attempts:
+            return None
+        bucket.drain()
+        delay = self._retry_after(exc)
+        if delay is None:
+            delay = min(2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+        logging.warning(
+            f"Rate limit of {operation} on {resource} exceeded ({exc}), "
+            f"retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s."
+        )
+        self.metrics.record_retry(operation, delay)
+        return delay
+
+    def call(self, resource, operation, func, *args, **kwargs):
+        bucket = self._bucket(resource)
+        for attempt in range(1, self.max_attempts + 1):
+            bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except (TooManyRequests, Forbidden) as exc:
+                delay = self._retry_delay(bucket, resource, operation, exc, attempt)
+                if delay is None:
+                    raise
+                self._sleep(delay)
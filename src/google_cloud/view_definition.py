@@ -0,0 +1,44 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+class InvalidViewQuery(ValueError):
+    """The view query with the configured row filter is rejected by BigQuery."""
+
+
+@dataclass
+class RowFilter:
+    """Rows a view exposes: a WHERE predicate and/or a rolling time window on a column or the partitioning."""
+
+    predicate: Optional[str] = None
+    time_window_column: Optional[str] = None
+    time_window_days: Optional[int] = None
+    # the time window is applied to the partitioning column of the source table
+    partition_filter: bool = False
+
+
+@dataclass
+class MaterializedViewOptions:
+    """
+    A view published as a BigQuery materialized view: its automatic refresh (none disables it) and the max
+    staleness of the served data in minutes, the clustering columns and the partitioning column.
+    """
+
+    refresh_interval_minutes: Optional[int] = 30
+    max_staleness_minutes: Optional[int] = None
+    clustering_fields: Optional[List[str]] = None
+    # must be the time partitioning column of the source table
+    partition_field: Optional[str] = None
+
+
+@dataclass
+class ViewDefinition:
+    """Everything needed to publish a single view of a Keboola table."""
+
+    view_name: str
+    source_table: str
+    columns_descriptions: Dict[str, str] = field(default_factory=dict)
+    custom_columns: Optional[List[str]] = None
+    description: Optional[str] = None
+    row_filter: Optional[RowFilter] = None
+    materialized: Optional[MaterializedViewOptions] = None
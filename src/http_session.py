@@ -0,0 +1,59 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# connections kept alive per host, the requests default
+DEFAULT_POOL_SIZE = 10
+# connections on top of the workers, for the calls made outside the worker pool
+POOL_HEADROOM = 2
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def pool_size_for(workers) -> int:
+    """
+    Pool size letting all workers (and the main thread) hold a connection at the same time.
+    """
+    return max(DEFAULT_POOL_SIZE, workers + POOL_HEADROOM)
+
+
+def _mount_pool(session, pool_size):
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.pool_size = pool_size
+
+
+def get_session(key, pool_size=DEFAULT_POOL_SIZE, factory=requests.Session) -> requests.Session:
+    """
+    Returns the process-wide session of the key with keep-alive connections, created by ``factory``
+    on the first use. The connection pool grows when a caller needs more connections than it has.
+    """
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = factory()
+            _mount_pool(session, pool_size)
+        elif session.pool_size < pool_size:
+            _mount_pool(session, pool_size)
+        return session
+
+
+def get_authorized_session(credentials, pool_size=DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Process-wide Google API session of the service account. The session refreshes the OAuth token
+    only when it expires, so all clients of the service account share one token and one connection pool.
+    """
+    from google.auth.transport.requests import AuthorizedSession
+
+    key = f"google:{getattr(credentials, 'service_account_email', None) or id(credentials)}"
+    return get_session(key, pool_size, factory=lambda: AuthorizedSession(credentials))
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
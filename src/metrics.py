@@ -0,0 +1,109 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def _percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percentile / 100 * len(ordered)) - 1, 0)]
+
+
+class ApiMetrics:
+    """
+    Thread-safe latency and counter registry of the remote API calls made during a run.
+    """
+
+    def __init__(self):
+        self._latencies = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._retries = defaultdict(int)
+        self._conflicts = defaultdict(int)
+        self._backoff_seconds = defaultdict(float)
+        self._query_costs = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self._errors[operation] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._latencies[operation].append(elapsed)
+
+    def record_retry(self, operation, backoff_seconds=0.0):
+        with self._lock:
+            self._retries[operation] += 1
+            self._backoff_seconds[operation] += backoff_seconds
+
+    def record_conflict(self, operation):
+        with self._lock:
+            self._conflicts[operation] += 1
+
+    def record_query_cost(self, view_id, full_bytes, selected_bytes):
+        with self._lock:
+            self._query_costs[view_id] = {"full_bytes": full_bytes, "selected_bytes": selected_bytes}
+
+    def query_costs(self) -> dict:
+        """
+        Estimated bytes processed by the views published in the run, by full view id.
+        """
+        with self._lock:
+            return {view_id: dict(cost) for view_id, cost in self._query_costs.items()}
+
+    def report(self) -> dict:
+        with self._lock:
+            operations = {}
+            for operation in sorted(set(self._latencies) | set(self._retries) | set(self._conflicts)):
+                latencies = self._latencies.get(operation, [])
+                operations[operation] = {
+                    "calls": len(latencies),
+                    "errors": self._errors.get(operation, 0),
+                    "retries": self._retries.get(operation, 0),
+                    "conflicts": self._conflicts.get(operation, 0),
+                    "backoff_seconds": round(self._backoff_seconds.get(operation, 0.0), 3),
+                    "total_seconds": round(sum(latencies), 3),
+                    "p50_ms": round(_percentile(latencies, 50) * 1000, 1) if latencies else None,
+                    "p99_ms": round(_percentile(latencies, 99) * 1000, 1) if latencies else None,
+                    "max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+                }
+        return {
+            "calls": sum(o["calls"] for o in operations.values()),
+            "errors": sum(o["errors"] for o in operations.values()),
+            "retries": sum(o["retries"] for o in operations.values()),
+            "conflicts": sum(o["conflicts"] for o in operations.values()),
+            "backoff_seconds": round(sum(o["backoff_seconds"] for o in operations.values()), 3),
+            "api_seconds": round(sum(o["total_seconds"] for o in operations.values()), 3),
+            "operations": operations,
+            "query_costs": dict(sorted(self.query_costs().items())),
+        }
+
+    def summary(self) -> str:
+        report = self.report()
+        calls = ", ".join(f"{name} {o['calls']}" for name, o in report["operations"].items())
+        summary = (
+            f"API calls: {report['calls']} in {report['api_seconds']} s ({calls}), errors {report['errors']}, "
+            f"retries {report['retries']}, conflicts {report['conflicts']}, backoff {report['backoff_seconds']} s"
+        )
+        if report["query_costs"]:
+            selected = sum(cost["selected_bytes"] for cost in report["query_costs"].values())
+            full = sum(cost["full_bytes"] for cost in report["query_costs"].values())
+            summary += (
+                f", query costs of {len(report['query_costs'])} views: {selected} bytes processed "
+                f"({full} bytes with all columns)"
+            )
+        return summary
+
+    def save(self, path):
+        with open(path, "w") as metrics_file:
+            json.dump(self.report(), metrics_file, indent=2)
+        logging.info(self.summary())
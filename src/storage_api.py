@@ -0,0 +1,63 @@
+from kbcstorage.base import Endpoint
+from kbcstorage.buckets import Buckets
+from kbcstorage.retry_requests import MAX_RETRIES_DEFAULT, RetryRequests
+
+
+class SessionRequests(RetryRequests):
+    """
+    ``RetryRequests`` sending the calls through a shared keep-alive session instead of a new connection per call.
+    """
+
+    def __init__(self, session, max_requests_retries=MAX_RETRIES_DEFAULT):
+        super().__init__(max_requests_retries)
+        self._session = session
+
+    def get(self, url, *args, **kwargs):
+        return self._retry_request(self._session.get, url, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        return self._retry_request(self._session.post, url, *args, **kwargs)
+
+    def put(self, url, *args, **kwargs):
+        return self._retry_request(self._session.put, url, *args, **kwargs)
+
+    def delete(self, url, *args, **kwargs):
+        return self._retry_request(self._session.delete, url, *args, **kwargs)
+
+
+class Tables(Endpoint):
+    """
+    Table detail endpoint, ``kbcstorage.tables`` would load all the file storage libraries for the table imports.
+    """
+
+    def __init__(self, root_url, token):
+        super().__init__(root_url, "tables", token)
+
+    def detail(self, table_id):
+        return self._get(f"{self.base_url}/{table_id}")
+
+
+class Configurations(Endpoint):
+    """
+    Configuration detail endpoint of a development branch (``default`` is the main branch).
+    """
+
+    def __init__(self, root_url, token, branch_id="default"):
+        super().__init__(root_url, f"branch/{branch_id}/components", token)
+
+    def detail(self, component_id, configuration_id):
+        return self._get(f"{self.base_url}/{component_id}/configs/{configuration_id}")
+
+
+class StorageClient:
+    """
+    Storage API client with only the endpoints used by the component.
+    """
+
+    def __init__(self, root_url, token, branch_id=None, session=None):
+        self.buckets = Buckets(root_url, token)
+        self.tables = Tables(root_url, token)
+        self.configurations = Configurations(root_url, token, branch_id or "default")
+        if session is not None:
+            for endpoint in (self.buckets, self.tables, self.configurations):
+                endpoint.requests = SessionRequests(session)
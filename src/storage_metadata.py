@@ -0,0 +1,51 @@
+import logging
+import threading
+
+from metrics import ApiMetrics
+
+# properties of the table listing needed to describe the views
+TABLE_INCLUDE = ["columns", "metadata", "columnMetadata"]
+
+
+class TableMetadataLoader:
+    """
+    Serves Storage API table details (columns, metadata and column metadata) indexed by the table id.
+
+    Tables of a loaded bucket are fetched with one bucket listing call instead of one detail call per table,
+    tables of the other buckets fall back to the table detail.
+    """
+
+    def __init__(self, sapi_client, metrics=None):
+        self._sapi_client = sapi_client
+        self._metrics = metrics or ApiMetrics()
+        self._tables = {}
+        self._loaded_buckets = set()
+        self._lock = threading.Lock()
+
+    def load_bucket(self, bucket_id):
+        """
+        Fetches all tables of the bucket with their metadata and returns them.
+        """
+        with self._lock:
+            if bucket_id in self._loaded_buckets:
+                return [t for t in self._tables.values() if t.get("bucket", {}).get("id") == bucket_id]
+
+        logging.info(f"Loading tables metadata of bucket {bucket_id}")
+        with self._metrics.track("sapi_list_tables"):
+            tables = self._sapi_client.buckets.list_tables(bucket_id, include=TABLE_INCLUDE)
+        with self._lock:
+            for table in tables:
+                table.setdefault("bucket", {"id": bucket_id})
+                self._tables[table["id"]] = table
+            self._loaded_buckets.add(bucket_id)
+        return tables
+
+    def get_table(self, table_id):
+        with self._lock:
+            table = self._tables.get(table_id)
+        if table is None:
+            with self._metrics.track("sapi_tables_detail"):
+                table = self._sapi_client.tables.detail(table_id)
+            with self._lock:
+                self._tables[table_id] = table
+        return table
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+
+# key of the views state in the component state file
+KEY_STATE_VIEWS = "views"
+# key of the estimated query cost in the state entry of a view, it is not part of the comparison
+KEY_QUERY_COST = "query_cost"
+# key of the last change date of the source table when the view was published, it changes with every
+# import of the table data and the view does not depend on the data, so it is kept for information only
+KEY_LAST_CHANGE_DATE = "last_change_date"
+# keys of the state entry not compared by ``is_unchanged``
+_IGNORED_KEYS = (KEY_QUERY_COST, KEY_LAST_CHANGE_DATE)
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ViewState:
+    """
+    Per-view state persisted in the component state file between runs.
+
+    Every published view is stored under its full id (``project.dataset.view``) together with what it was
+    built from: the source table columns, a hash of its SAPI metadata, the last change date of the table,
+    a fingerprint of the view definition and whether the view was authorized on the source dataset.
+    A view whose entry is unchanged on the next run does not have to be touched at all, a new import
+    of the table data (a new last change date) alone does not change it. The entry may also carry
+    the last estimated query cost of the view.
+    """
+
+    def __init__(self, views=None):
+        self._views = dict(views or {})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_entry(table_detail, definition) -> dict:
+        """
+        Builds the state entry of a view from the SAPI table detail and the (JSON serializable)
+        definition of the view, e.g. the source project, selected columns and descriptions.
+        """
+        return {
+            "source_table_id": table_detail.get("id"),
+            "source_columns": table_detail.get("columns", []),
+            "metadata_hash": _hash(
+                {
+                    "metadata": table_detail.get("metadata", []),
+                    "columnMetadata": table_detail.get("columnMetadata", {}),
+                }
+            ),
+            KEY_LAST_CHANGE_DATE: table_detail.get("lastChangeDate"),
+            "fingerprint": _hash(definition),
+            "acl_granted": True,
+        }
+
+    def is_unchanged(self, view_id, entry) -> bool:
+        with self._lock:
+            stored = self._views.get(view_id)
+        if stored is None or not stored.get("acl_granted"):
+            return False
+        return {k: v for k, v in stored.items() if k not in _IGNORED_KEYS} == {
+            k: v for k, v in entry.items() if k not in _IGNORED_KEYS
+        }
+
+    def update(self, view_id, entry):
+        with self._lock:
+            stored = self._views.get(view_id) or {}
+            if KEY_QUERY_COST in stored and stored.get("fingerprint") == entry.get("fingerprint"):
+                # the same view definition has the same query, its estimated cost still applies
+                entry = dict(entry, **{KEY_QUERY_COST: stored[KEY_QUERY_COST]})
+            self._views[view_id] = entry
+
+    def set_query_cost(self, view_id, cost):
+        with self._lock:
+            if view_id in self._views:
+                self._views[view_id] = dict(self._views[view_id], **{KEY_QUERY_COST: cost})
+
+    def remove(self, view_id):
+        with self._lock:
+            self._views.pop(view_id, None)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return dict(self._views)
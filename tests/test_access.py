@@ -0,0 +1,79 @@
+import unittest
+import mock
+
+from google.cloud import bigquery
+
+from google_cloud.access import AccessEntryIndex, AccessGrantBatcher, view_access_entry
+
+
+def _make_view(table_id):
+    view = mock.MagicMock()
+    view.reference.project = "view-project"
+    view.reference.dataset_id = "views"
+    view.reference.table_id = table_id
+    return view
+
+
+def _make_dataset(dataset_id):
+    dataset = mock.MagicMock()
+    dataset.project = "src-project"
+    dataset.dataset_id = dataset_id
+    return dataset
+
+
+class TestAccessGrantBatcher(unittest.TestCase):
+    def test_flush_grants_views_once_per_source_dataset(self):
+        bigquery_client = mock.MagicMock()
+        batcher = AccessGrantBatcher(bigquery_client)
+        first, second = _make_dataset("in_c_first"), _make_dataset("in_c_second")
+
+        batcher.add(first, _make_view("a"))
+        batcher.add(first, _make_view("b"))
+        batcher.add(second, _make_view("c"))
+        results = batcher.flush()
+
+        self.assertEqual(bigquery_client.grant_views_access.call_count, 2)
+        granted = {
+            call.args[0].dataset_id: [v.reference.table_id for v in call.args[1]]
+            for call in bigquery_client.grant_views_access.call_args_list
+        }
+        self.assertEqual(granted, {"in_c_first": ["a", "b"], "in_c_second": ["c"]})
+        self.assertEqual(results, {"view-project.views.a": None, "view-project.views.b": None, "view-project.views.c": None})
+
+    def test_failed_update_is_reported_for_all_views_of_the_dataset(self):
+        bigquery_client = mock.MagicMock()
+        failure = RuntimeError("403")
+        bigquery_client.grant_views_access.side_effect = failure
+        batcher = AccessGrantBatcher(bigquery_client)
+        dataset = _make_dataset("in_c_first")
+        batcher.add(dataset, _make_view("a"))
+        batcher.add(dataset, _make_view("b"))
+
+        self.assertEqual(batcher.flush(), {"view-project.views.a": failure, "view-project.views.b": failure})
+        # nothing is left pending after the flush
+        self.assertEqual(batcher.flush(), {})
+
+
+class TestAccessEntryIndex(unittest.TestCase):
+    def setUp(self):
+        self.owner = bigquery.AccessEntry("OWNER", "specialGroup", "projectOwners")
+        self.reader = bigquery.AccessEntry("READER", "userByEmail", "reader@example.com")
+        self.index = AccessEntryIndex([self.owner, self.reader, view_access_entry(_make_view("a"))])
+
+    def test_membership_by_identity(self):
+        self.assertTrue(self.index.has_view(_make_view("a")))
+        self.assertFalse(self.index.has_view(_make_view("b")))
+        self.assertIn(bigquery.AccessEntry("READER", "userByEmail", "reader@example.com"), self.index)
+        self.assertNotIn(bigquery.AccessEntry("WRITER", "userByEmail", "reader@example.com"), self.index)
+
+    def test_add_and_remove_apply_only_the_difference(self):
+        added = self.index.add([view_access_entry(_make_view("a")), view_access_entry(_make_view("b"))])
+        removed = self.index.remove([view_access_entry(_make_view("a")), view_access_entry(_make_view("c"))])
+
+        self.assertEqual([e.entity_id["tableId"] for e in added], ["b"])
+        self.assertEqual([e.entity_id["tableId"] for e in removed], ["a"])
+        self.assertEqual(self.index.entries, [self.owner, self.reader, view_access_entry(_make_view("b"))])
+
+
+if __name__ == "__main__":
+    unittest.main()
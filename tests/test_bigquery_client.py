@@ -5,12 +5,28 @@ Regression tests for the defensive retry added to
 entries) with a freshly fetched dataset, and re-raise after the last attempt.
 """
 
+import threading
 import unittest
 import mock
 
-from google.api_core.exceptions import PreconditionFailed
+from google.api_core.exceptions import (
+    BadRequest,
+    Forbidden,
+    InternalServerError,
+    NotFound,
+    PreconditionFailed,
+    ServiceUnavailable,
+    TooManyRequests,
+)
+from google.cloud import bigquery
 
-from google_cloud.bigquery_client import BigqueryClient
+from google_cloud.access import dataset_access_entry, view_access_entry
+from google_cloud.bigquery_client import CONFIG_LABEL, MUTATION_RETRY, BigqueryClient, config_labels
+from google_cloud.metadata_cache import MetadataCache
+from google_cloud.planner import Change, ChangeSet
+from google_cloud.scheduler import MutationScheduler
+from google_cloud.view_definition import InvalidViewQuery, MaterializedViewOptions, RowFilter, ViewDefinition
+from metrics import ApiMetrics
 
 
 def _make_view():
@@ -33,6 +49,16 @@ def _client_without_credentials():
     # Bypass __init__ (which builds a real bigquery.Client) and inject a mock.
     client = BigqueryClient.__new__(BigqueryClient)
     client.client = mock.MagicMock()
+    client.cache = MetadataCache()
+    client.metrics = ApiMetrics()
+    client.scheduler = MutationScheduler(rate=1000, burst=1000, metrics=client.metrics)
+    client.estimate_query_costs = False
+    client.view_labels = {}
+    client._datasets = {}
+    client._datasets_lock = threading.Lock()
+    client.service_account_email = "writer@project.iam.gserviceaccount.com"
+    client._access_indexes = {}
+    client._access_indexes_lock = threading.Lock()
     return client
 
 
@@ -81,7 +107,8 @@ class TestUpdateAccessRetry(unittest.TestCase):
         """A persistent 412 must still fail loudly after the last attempt."""
         client = _client_without_credentials()
         view = _make_view()
-        client.client.get_dataset.return_value = _make_dataset()
+        # every re-fetch returns the dataset as stored in BigQuery, i.e. without the failed grant
+        client.client.get_dataset.side_effect = lambda *_: _make_dataset()
         client.client.update_dataset.side_effect = PreconditionFailed("412")
 
         with self.assertRaises(PreconditionFailed):
@@ -91,6 +118,854 @@ class TestUpdateAccessRetry(unittest.TestCase):
         self.assertEqual(client.client.update_dataset.call_count, 5)
         self.assertEqual(client.client.get_dataset.call_count, 4)
 
+    def test_multiple_views_are_granted_with_one_update(self):
+        client = _client_without_credentials()
+        source_dataset = _make_dataset()
+        first, second = _make_view(), _make_view()
+        second.reference.table_id = "other_view_table"
+
+        client._update_access(source_dataset, first, second)
+
+        self.assertEqual(client.client.update_dataset.call_count, 1)
+        self.assertEqual(
+            [e.entity_id["tableId"] for e in source_dataset.access_entries],
+            ["view_table", "other_view_table"],
+        )
+
+    def test_no_update_when_view_already_has_access(self):
+        client = _client_without_credentials()
+        view = _make_view()
+        existing = mock.MagicMock()
+        existing.entity_type = "view"
+        existing.entity_id = {"projectId": "view-project", "datasetId": "view_dataset", "tableId": "view_table"}
+
+        client._update_access(_make_dataset(access_entries=[existing]), view)
+
+        client.client.update_dataset.assert_not_called()
+
+
+class TestDatasetCache(unittest.TestCase):
+    def test_dataset_is_fetched_once(self):
+        client = _client_without_credentials()
+        client.client.get_dataset.return_value = bigquery.Dataset("src-project.src_dataset")
+
+        first = client.find_dataset("src-project", "src_dataset")
+        second = client.find_dataset("src-project", "src_dataset")
+
+        client.client.get_dataset.assert_called_once_with("src-project.src_dataset")
+        self.assertEqual(first.reference, second.reference)
+
+    def test_access_entries_are_not_kept_between_runs(self):
+        client = _client_without_credentials()
+        resource = {
+            "datasetReference": {"projectId": "src-project", "datasetId": "src_dataset"},
+            "location": "EU",
+            "etag": "old",
+            "access": [{"role": "READER", "view": {"projectId": "p", "datasetId": "d", "tableId": "revoked"}}],
+        }
+        # the whole resource cached by an older version
+        client.cache.set("dataset:src-project.src_dataset", resource)
+        fresh = bigquery.Dataset.from_api_repr(dict(resource, etag="new", access=[]))
+        client.client.get_dataset.return_value = fresh
+
+        dataset = client.find_dataset("src-project", "src_dataset")
+        self.assertEqual(dataset.location, "EU")
+        client.client.get_dataset.assert_not_called()
+
+        # the access entries are read once per run before they are used
+        self.assertEqual(client.get_authorized_views(dataset), [])
+        self.assertEqual(client.get_authorized_views(dataset), [])
+        client.client.get_dataset.assert_called_once_with("src-project.src_dataset")
+        self.assertEqual(client.find_dataset("src-project", "src_dataset").etag, "new")
+        self.assertEqual(
+            client.cache.get("dataset:src-project.src_dataset"),
+            {"datasetReference": resource["datasetReference"], "location": "EU", "etag": "new"},
+        )
+
+    @mock.patch("google_cloud.bigquery_client.time.sleep", return_value=None)
+    def test_precondition_failed_invalidates_cached_dataset(self, _sleep):
+        client = _client_without_credentials()
+        client.cache.set("dataset:src-project.src_dataset", {"stale": True})
+        client.client.get_dataset.side_effect = lambda *_: _make_dataset()
+        client.client.update_dataset.side_effect = PreconditionFailed("412")
+
+        with self.assertRaises(PreconditionFailed):
+            client._update_access(_make_dataset(), _make_view())
+
+        self.assertIsNone(client.cache.get("dataset:src-project.src_dataset"))
+
+
+class TestMutationRateLimits(unittest.TestCase):
+    def test_rate_limit_errors_of_the_client_are_retried_by_the_scheduler(self):
+        client = _client_without_credentials()
+        sleep = mock.MagicMock()
+        client.scheduler = MutationScheduler(rate=1000, burst=1000, metrics=client.metrics, sleep=sleep)
+        response = mock.MagicMock()
+        response.headers = {"Retry-After": "7"}
+        view = bigquery.Table("view-project.view_dataset.view_table")
+        client.client.update_table.side_effect = [
+            TooManyRequests("429", response=response),
+            Forbidden("quota", errors=[{"reason": "rateLimitExceeded"}]),
+            view,
+        ]
+
+        self.assertIs(client._call("update_table", view, ["description"]), view)
+
+        self.assertEqual(client.client.update_table.call_count, 3)
+        self.assertIs(client.client.update_table.call_args.kwargs["retry"], MUTATION_RETRY)
+        self.assertEqual(sleep.call_args_list[0], mock.call(7.0))
+        self.assertEqual(client.metrics.report()["retries"], 2)
+
+    def test_library_retry_skips_only_the_rate_limit_errors(self):
+        predicate = MUTATION_RETRY._predicate
+        self.assertFalse(predicate(TooManyRequests("429")))
+        self.assertFalse(predicate(Forbidden("quota", errors=[{"reason": "rateLimitExceeded"}])))
+        self.assertTrue(predicate(ServiceUnavailable("503")))
+        self.assertTrue(predicate(InternalServerError("500", errors=[{"reason": "backendError"}])))
+
+
+def _make_project(project_id):
+    project = mock.MagicMock()
+    project.project_id = project_id
+    project.friendly_name = project_id.upper()
+    return project
+
+
+class TestListProjects(unittest.TestCase):
+    def test_complete_list_is_cached_for_the_service_account(self):
+        client = _client_without_credentials()
+        client.client.list_projects.return_value.pages = [[_make_project("a"), _make_project("b")], [_make_project("c")]]
+
+        projects = client.list_projects()
+        self.assertEqual(client.list_projects(), projects)
+
+        self.assertEqual(projects, [["a", "A"], ["b", "B"], ["c", "C"]])
+        client.client.list_projects.assert_called_once()
+        self.assertEqual(client.cache.get("projects:writer@project.iam.gserviceaccount.com"), projects)
+
+    def test_listing_stops_at_the_wanted_project(self):
+        client = _client_without_credentials()
+        second_page = mock.MagicMock()
+        second_page.__iter__.side_effect = AssertionError("second page must not be fetched")
+        client.client.list_projects.return_value.pages = iter([[_make_project("a"), _make_project("kbc")], second_page])
+
+        projects = client.list_projects(stop_when=lambda project_id: project_id == "kbc")
+
+        self.assertEqual(projects, [["a", "A"], ["kbc", "KBC"]])
+        # a partial list is not cached
+        self.assertIsNone(client.cache.get("projects:writer@project.iam.gserviceaccount.com"))
+
+
+def _make_existing_view(query, description=None, schema=()):
+    view = _make_view()
+    view.created = True
+    view.view_query = query
+    view.description = description
+    view.schema = list(schema)
+    return view
+
+
+def _make_field(name, description=None):
+    schema_field = mock.MagicMock()
+    schema_field.name = name
+    schema_field.description = description
+    return schema_field
+
+
+class TestCreateViewNoOp(unittest.TestCase):
+    def _granted_dataset(self):
+        entry = mock.MagicMock()
+        entry.entity_type = "view"
+        entry.entity_id = {"projectId": "view-project", "datasetId": "view_dataset", "tableId": "view_table"}
+        return _make_dataset(access_entries=[entry])
+
+    def test_up_to_date_view_makes_no_mutating_calls(self):
+        client = _client_without_credentials()
+        source_dataset = self._granted_dataset()
+        query = BigqueryClient.compose_view_query("src-project", source_dataset, "table", None)
+        existing = _make_existing_view(
+            " ".join(query.split()), "Orders", [_make_field("id", "Identifier"), _make_field("name")]
+        )
+        client.client.get_table.side_effect = [existing, _make_source_table("id", "name")]
+
+        result = client.create_view(
+            mock.MagicMock(), source_dataset, "table", {"id": "Identifier", "gone": "x"}, None, "view", "Orders"
+        )
+
+        self.assertIs(result, existing)
+        client.client.delete_table.assert_not_called()
+        client.client.create_table.assert_not_called()
+        client.client.update_table.assert_not_called()
+        client.client.update_dataset.assert_not_called()
+
+    def test_changed_description_replaces_view_in_one_call(self):
+        client = _client_without_credentials()
+        source_dataset = self._granted_dataset()
+        query = BigqueryClient.compose_view_query("src-project", source_dataset, "table", None)
+        existing = _make_existing_view(query, "Old description")
+        client.client.get_table.side_effect = [existing, _make_source_table("id", "name")]
+        client.client.update_table.return_value = existing
+
+        client.create_view(mock.MagicMock(), source_dataset, "table", {}, None, "view", "New description")
+
+        client.client.delete_table.assert_not_called()
+        client.client.create_table.assert_not_called()
+        client.client.update_table.assert_called_once_with(existing, ["view_query", "description", "schema"], retry=MUTATION_RETRY)
+        self.assertEqual(existing.description, "New description")
+        client.client.update_dataset.assert_not_called()
+
+    def test_new_source_column_replaces_the_view(self):
+        client = _client_without_credentials()
+        source_dataset = self._granted_dataset()
+        query = BigqueryClient.compose_view_query("src-project", source_dataset, "table", None)
+        existing = _make_existing_view(query, "Orders", [_make_field("id", "Identifier")])
+        client.client.get_table.side_effect = [existing, _make_source_table("id", "name")]
+        client.client.update_table.return_value = existing
+
+        client.create_view(
+            mock.MagicMock(), source_dataset, "table", {"id": "Identifier", "name": "Name"}, None, "view", "Orders"
+        )
+
+        client.client.update_table.assert_called_once_with(existing, ["view_query", "description", "schema"], retry=MUTATION_RETRY)
+        self.assertEqual(
+            [(f.name, f.description) for f in existing.schema], [("id", "Identifier"), ("name", "Name")]
+        )
+
+    def test_unlabelled_view_is_labelled_with_the_configuration(self):
+        client = _client_without_credentials()
+        client.view_labels = config_labels("123")
+        source_dataset = self._granted_dataset()
+        query = BigqueryClient.compose_view_query("src-project", source_dataset, "table", None)
+        existing = _make_existing_view(query, "Orders", [_make_field("id"), _make_field("name")])
+        existing.labels = {"owner": "sales"}
+        client.client.get_table.side_effect = [existing, _make_source_table("id", "name")]
+        client.client.update_table.return_value = existing
+
+        client.create_view(mock.MagicMock(), source_dataset, "table", {}, None, "view", "Orders")
+
+        client.client.update_table.assert_called_once_with(
+            existing, ["view_query", "description", "labels", "schema"], retry=MUTATION_RETRY
+        )
+        self.assertEqual(existing.labels, {"owner": "sales", CONFIG_LABEL: "123"})
+        self.assertTrue(client.is_published_view(existing))
+
+    def test_view_matches_the_desired_columns(self):
+        query = "SELECT * FROM `src-project`.`src_dataset`.`table`"
+        existing = _make_existing_view(query, None, [_make_field("id", "Identifier")])
+        source = _make_source_table("id", "name")
+
+        for descriptions in ({"id": "Identifier"}, {"id": "Identifier", "name": "Name"}):
+            schema = BigqueryClient.build_view_schema(source, None, descriptions)
+            self.assertFalse(BigqueryClient.view_matches(existing, query, None, schema, True))
+        schema = BigqueryClient.build_view_schema(source, ["id"], {"id": "Identifier"})
+        self.assertTrue(BigqueryClient.view_matches(existing, query, None, schema, True))
+        self.assertFalse(BigqueryClient.view_matches(existing, query, None, None, True))
+
+    def test_changed_query_is_replaced_with_described_columns_in_one_call(self):
+        client = _client_without_credentials()
+        source_dataset = self._granted_dataset()
+        existing = _make_existing_view("SELECT * FROM `src-project`.`src_dataset`.`table`")
+        client.client.get_table.side_effect = [existing, _make_source_table("id", "name")]
+        client.client.update_table.return_value = existing
+
+        client.create_view(mock.MagicMock(), source_dataset, "table", {"id": "Identifier"}, ["id"], "view", None)
+
+        client.client.update_table.assert_called_once_with(existing, ["view_query", "description", "schema"], retry=MUTATION_RETRY)
+        self.assertIn("`id`", existing.view_query)
+        self.assertEqual([(f.name, f.description) for f in existing.schema], [("id", "Identifier")])
+
+
+def _make_source_table(*columns):
+    source_table = mock.MagicMock()
+    source_table.schema = [bigquery.SchemaField(column, "STRING") for column in columns]
+    return source_table
+
+
+class TestCreateViewWithSchema(unittest.TestCase):
+    @mock.patch("google_cloud.bigquery_client.bigquery.Table")
+    def test_view_is_created_with_column_descriptions_in_one_request(self, table_cls):
+        client = _client_without_credentials()
+        destination_dataset = mock.MagicMock()
+        client.client.get_table.side_effect = [NotFound("view"), _make_source_table("id", "name")]
+        view = table_cls.return_value
+        view.created = None
+
+        client.create_view(
+            destination_dataset, _make_dataset(), "table", {"name": "Full name"}, None, "view", "Orders"
+        )
+
+        client.client.create_table.assert_called_once()
+        self.assertEqual(
+            [(f.name, f.description) for f in view.schema], [("id", None), ("name", "Full name")]
+        )
+        client.client.update_table.assert_not_called()
+
+    @mock.patch("google_cloud.bigquery_client.bigquery.Table")
+    def test_descriptions_are_applied_after_creation_when_schema_is_rejected(self, table_cls):
+        client = _client_without_credentials()
+        client.client.get_table.side_effect = [NotFound("view"), _make_source_table("id")]
+        table_cls.return_value.created = None
+        created_view = _make_view()
+        created_view.schema = [bigquery.SchemaField("id", "STRING")]
+        client.client.create_table.side_effect = [BadRequest("schema mismatch"), created_view]
+
+        client.create_view(mock.MagicMock(), _make_dataset(), "table", {"id": "Identifier"}, None, "view", None)
+
+        self.assertEqual(client.client.create_table.call_count, 2)
+        client.client.update_table.assert_called_once_with(created_view, ["schema"], retry=MUTATION_RETRY)
+        self.assertEqual(created_view.schema[0].description, "Identifier")
+
+
+def _make_partitioned_table(field=None, **columns):
+    source_table = mock.MagicMock()
+    source_table.table_id = "orders"
+    source_table.schema = [bigquery.SchemaField(name, field_type) for name, field_type in columns.items()]
+    source_table.time_partitioning = bigquery.TimePartitioning(field=field)
+    return source_table
+
+
+class TestRowFilter(unittest.TestCase):
+    def test_conditions_are_added_to_the_view_query(self):
+        client = _client_without_credentials()
+        query = client.compose_view_query(
+            "src-project", _make_dataset(), "orders", ["id"], ["country = 'CZ'", "`id` > 10"]
+        )
+
+        self.assertTrue(" ".join(query.split()).endswith("WHERE (country = 'CZ') AND (`id` > 10)"))
+
+    def test_time_window_on_a_column(self):
+        source = _make_partitioned_table(id="STRING", created="DATE")
+
+        conditions = BigqueryClient.compose_filter_conditions(
+            source, RowFilter(predicate="id IS NOT NULL", time_window_column="created", time_window_days=7)
+        )
+
+        self.assertEqual(
+            conditions, ["id IS NOT NULL", "`created` >= DATE_SUB(CURRENT_DATE(), INTERVAL 7 DAY)"]
+        )
+
+    def test_partition_filter_uses_the_partitioning_column(self):
+        source = _make_partitioned_table(field="updated_at", id="STRING", updated_at="TIMESTAMP")
+
+        conditions = BigqueryClient.compose_filter_conditions(
+            source, RowFilter(time_window_days=30, partition_filter=True)
+        )
+
+        self.assertEqual(len(conditions), 1)
+        self.assertTrue(conditions[0].startswith("`updated_at` >= TIMESTAMP_SUB(CURRENT_TIMESTAMP()"))
+
+    def test_partition_filter_of_ingestion_time_partitioning(self):
+        source = _make_partitioned_table(id="STRING")
+
+        conditions = BigqueryClient.compose_filter_conditions(
+            source, RowFilter(time_window_days=1, partition_filter=True)
+        )
+
+        self.assertTrue(conditions[0].startswith("_PARTITIONTIME >= "))
+
+    def test_time_window_column_must_be_a_time_column(self):
+        source = _make_partitioned_table(id="STRING")
+
+        with self.assertRaises(InvalidViewQuery):
+            BigqueryClient.compose_filter_conditions(
+                source, RowFilter(time_window_column="id", time_window_days=1)
+            )
+
+    @mock.patch("google_cloud.bigquery_client.bigquery.Table")
+    def test_rejected_dry_run_does_not_create_the_view(self, table_cls):
+        client = _client_without_credentials()
+        client.client.get_table.side_effect = [NotFound("view"), _make_source_table("id")]
+        table_cls.return_value.created = None
+        client.client.query.side_effect = BadRequest("Unrecognized name: country")
+
+        with self.assertRaises(InvalidViewQuery):
+            client.create_view(
+                _make_destination_dataset(), _make_dataset(), "table", {}, None, "view", None,
+                row_filter=RowFilter(predicate="country = 'CZ'"),
+            )
+
+        self.assertTrue(client.client.query.call_args.kwargs["job_config"].dry_run)
+        client.client.create_table.assert_not_called()
+        client.client.update_dataset.assert_not_called()
+
+
+class TestAccessIndex(unittest.TestCase):
+    def test_index_is_reused_for_the_same_dataset_version(self):
+        client = _client_without_credentials()
+        dataset = _make_dataset()
+        dataset.etag = "etag-1"
+
+        index = client.access_index(dataset)
+        self.assertIs(client.access_index(dataset), index)
+
+        dataset.etag = "etag-2"
+        self.assertIsNot(client.access_index(dataset), index)
+
+    def test_only_the_granted_views_are_logged(self):
+        client = _client_without_credentials()
+        view = _make_view()
+        existing = _make_view()
+        existing.reference.table_id = "existing_view"
+        dataset = _make_dataset(access_entries=[view_access_entry(existing)])
+
+        with self.assertLogs(level="INFO") as logs:
+            client._apply_access_diff(dataset, add=[view_access_entry(view), view_access_entry(existing)])
+
+        self.assertEqual(len(dataset.access_entries), 2)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("to 1 entities (1 already had it): view-project.view_dataset.view_table", logs.output[0])
+
+
+def _make_destination_dataset():
+    dataset = mock.MagicMock()
+    dataset.project = "view-project"
+    dataset.dataset_id = "view_dataset"
+    return dataset
+
+
+class TestAuthorizedDataset(unittest.TestCase):
+    def test_destination_dataset_is_authorized_once(self):
+        client = _client_without_credentials()
+        source_dataset = _make_dataset()
+        client.client.update_dataset.side_effect = lambda dataset, fields, **_: dataset
+
+        client.grant_dataset_access(source_dataset, _make_destination_dataset())
+
+        client.client.update_dataset.assert_called_once()
+        self.assertEqual(
+            [e.to_api_repr() for e in source_dataset.access_entries],
+            [
+                {
+                    "role": None,
+                    "dataset": {
+                        "dataset": {"projectId": "view-project", "datasetId": "view_dataset"},
+                        "targetTypes": ["VIEWS"],
+                    },
+                }
+            ],
+        )
+
+    def test_existing_grant_is_not_written_again(self):
+        client = _client_without_credentials()
+        destination_dataset = _make_destination_dataset()
+        source_dataset = _make_dataset(access_entries=[dataset_access_entry(destination_dataset)])
+
+        self.assertIs(client.grant_dataset_access(source_dataset, destination_dataset), source_dataset)
+        client.client.update_dataset.assert_not_called()
+
+    def test_views_do_not_get_own_access_entries(self):
+        client = _client_without_credentials()
+        destination_dataset = bigquery.Dataset("view-project.view_dataset")
+        source_dataset = _make_source_dataset(access_entries=[dataset_access_entry(destination_dataset)])
+        _serve_tables(client, {"src-project.src_dataset.orders": _make_source_table("id")})
+        targets = [(destination_dataset, ViewDefinition(view_name="v_orders", source_table="orders"))]
+
+        results = client.publish_views(source_dataset, targets, 1, authorize_dataset=True)
+
+        self.assertEqual(results, {"view-project.view_dataset.v_orders": None})
+        client.client.create_table.assert_called_once()
+        client.client.update_dataset.assert_not_called()
+        self.assertEqual(len(source_dataset.access_entries), 1)
+
+
+class TestDeleteView(unittest.TestCase):
+    def test_access_entry_of_the_deleted_view_is_revoked(self):
+        client = _client_without_credentials()
+        view = bigquery.Table("view-project.view_dataset.view_table")
+        view._properties["creationTime"] = "1700000000000"
+        view.view_query = "SELECT * FROM `src-project`.`src_dataset`.`orders`"
+        client.client.get_table.return_value = view
+        stale = view_access_entry(_make_view())
+        source_dataset = _make_dataset(access_entries=[stale, bigquery.AccessEntry("OWNER", "userByEmail", "a@b.c")])
+        client.client.get_dataset.return_value = source_dataset
+
+        client.delete_view(_make_destination_dataset(), "view_table")
+
+        client.client.delete_table.assert_called_once()
+        client.client.get_dataset.assert_called_once_with("src-project.src_dataset")
+        self.assertNotIn(stale, source_dataset.access_entries)
+        self.assertEqual(len(source_dataset.access_entries), 1)
+
+
+def _serve_tables(client, tables):
+    """get_table of the full table ids returns the given tables, the others are not found."""
+
+    def get_table(table_id):
+        # full table id or a table reference
+        if str(table_id) in tables:
+            return tables[str(table_id)]
+        raise NotFound(table_id)
+
+    client.client.get_table.side_effect = get_table
+
+
+def _make_source_dataset(access_entries=()):
+    dataset = bigquery.Dataset("src-project.src_dataset")
+    dataset.access_entries = list(access_entries)
+    return dataset
+
+
+class TestPublishViews(unittest.TestCase):
+    def test_failure_of_one_view_does_not_abort_the_batch(self):
+        client = _client_without_credentials()
+        failure = RuntimeError("boom")
+        _serve_tables(client, {f"src-project.src_dataset.{name}": _make_source_table("id") for name in "abc"})
+
+        def create_table(view, **_):
+            if view.table_id == "v_b":
+                raise failure
+            return view
+
+        client.client.create_table.side_effect = create_table
+        destination_dataset = bigquery.Dataset("view-project.view_dataset")
+        targets = [(destination_dataset, ViewDefinition(view_name=f"v_{name}", source_table=name)) for name in "abc"]
+
+        results = client.publish_views(_make_source_dataset(), targets, max_workers=2)
+
+        self.assertEqual(client.client.create_table.call_count, 3)
+        self.assertEqual(
+            results,
+            {
+                "view-project.view_dataset.v_a": None,
+                "view-project.view_dataset.v_b": failure,
+                "view-project.view_dataset.v_c": None,
+            },
+        )
+
+    def test_grants_are_applied_once_for_the_batch(self):
+        client = _client_without_credentials()
+        source_dataset = _make_source_dataset()
+        _serve_tables(client, {f"src-project.src_dataset.{name}": _make_source_table("id") for name in "abc"})
+        destination_dataset = bigquery.Dataset("view-project.view_dataset")
+        targets = [(destination_dataset, ViewDefinition(view_name=f"v_{name}", source_table=name)) for name in "abc"]
+
+        results = client.publish_views(source_dataset, targets, max_workers=3)
+
+        self.assertEqual(client.client.update_dataset.call_count, 1)
+        self.assertEqual(len(source_dataset.access_entries), 3)
+        self.assertEqual(results, {f"view-project.view_dataset.v_{name}": None for name in "abc"})
+
+    def test_views_of_all_destinations_are_authorized_with_one_update(self):
+        client = _client_without_credentials()
+        source_dataset = _make_source_dataset()
+        _serve_tables(client, {"src-project.src_dataset.orders": _make_source_table("id")})
+        first = bigquery.Dataset("view-project.view_dataset")
+        second = bigquery.Dataset("view-project.other_dataset")
+        definition = ViewDefinition(view_name="view_table", source_table="orders")
+
+        results = client.publish_views(source_dataset, [(first, definition), (second, definition)], max_workers=2)
+
+        self.assertEqual(
+            results, {"view-project.view_dataset.view_table": None, "view-project.other_dataset.view_table": None}
+        )
+        client.client.update_dataset.assert_called_once()
+        self.assertEqual(len(source_dataset.access_entries), 2)
+
+
+class TestChangePlanner(unittest.TestCase):
+    def _existing_view(self, client, source_dataset, name):
+        view = bigquery.Table(f"view-project.view_dataset.v_{name}")
+        view._properties["creationTime"] = "1700000000000"
+        view.view_query = client.compose_view_query("src-project", source_dataset, name, None)
+        view.schema = [bigquery.SchemaField("id", "STRING")]
+        return view
+
+    def test_estimated_api_calls_count_each_access_update_of_a_dataset(self):
+        view = bigquery.Table("view-project.view_dataset.v_a")
+        change_set = ChangeSet(
+            [
+                Change("grant", "view-project.view_dataset", "src-project.src_dataset"),
+                Change("grant", "view-project.view_dataset.v_a", "src-project.src_dataset", view=view),
+                Change("grant", "view-project.view_dataset.v_b", "src-project.src_dataset", view=view),
+                Change("revoke", "view-project.view_dataset.v_c", "src-project.src_dataset", view=view),
+                Change("grant", "view-project.view_dataset.v_d", "src-project.other_dataset", view=view),
+            ]
+        )
+
+        # dataset grants, view grants and revokes of src_dataset and the view grants of other_dataset
+        self.assertEqual(change_set.estimated_api_calls(), 4)
+
+    def test_plan_reads_the_state_without_changing_anything(self):
+        client = _client_without_credentials()
+        source_dataset = _make_source_dataset()
+        unchanged = self._existing_view(client, source_dataset, "a")
+        outdated = self._existing_view(client, source_dataset, "b")
+        outdated.description = "Old description"
+        deleted = self._existing_view(client, source_dataset, "gone")
+        source_dataset.access_entries = [view_access_entry(v) for v in (unchanged, outdated, deleted)]
+        _serve_tables(
+            client,
+            {
+                "view-project.view_dataset.v_a": unchanged,
+                "view-project.view_dataset.v_b": outdated,
+                "view-project.view_dataset.v_gone": deleted,
+                **{f"src-project.src_dataset.{name}": _make_source_table("id") for name in "abc"},
+            },
+        )
+        client.client.get_dataset.return_value = source_dataset
+        destination = bigquery.Dataset("view-project.view_dataset")
+        targets = [(destination, ViewDefinition(view_name=f"v_{name}", source_table=name)) for name in "abc"]
+
+        change_set = client.plan_changes(
+            [(source_dataset, targets, False)], 4, deletions=[("view-project", "view_dataset", "v_gone")]
+        )
+
+        self.assertEqual(
+            [(c.action, c.target) for c in change_set.changes],
+            [
+                ("noop", "view-project.view_dataset.v_a"),
+                ("replace", "view-project.view_dataset.v_b"),
+                ("create", "view-project.view_dataset.v_c"),
+                ("grant", "view-project.view_dataset.v_c"),
+                ("delete", "view-project.view_dataset.v_gone"),
+                ("revoke", "view-project.view_dataset.v_gone"),
+            ],
+        )
+        self.assertEqual(change_set.estimated_api_calls(), 5)
+        self.assertEqual(change_set.to_dict()["unchanged_views"], ["view-project.view_dataset.v_a"])
+        client.client.create_table.assert_not_called()
+        client.client.update_table.assert_not_called()
+        client.client.delete_table.assert_not_called()
+        client.client.update_dataset.assert_not_called()
+
+        results = client.apply_changes(change_set, 4)
+
+        self.assertTrue(all(error is None for error in results.values()))
+        client.client.create_table.assert_called_once()
+        client.client.update_table.assert_called_once()
+        client.client.delete_table.assert_called_once()
+        # one update granting v_c, one revoking v_gone
+        self.assertEqual(client.client.update_dataset.call_count, 2)
+
+    def test_invalid_row_filter_is_reported_by_the_plan(self):
+        client = _client_without_credentials()
+        _serve_tables(client, {"src-project.src_dataset.orders": _make_source_table("id")})
+        definition = ViewDefinition(
+            view_name="v_orders", source_table="orders", row_filter=RowFilter(predicate="country = 'CZ'")
+        )
+        client.client.query.side_effect = BadRequest("Unrecognized name: country")
+
+        change_set = client.plan_changes(
+            [(_make_source_dataset(), [(bigquery.Dataset("view-project.view_dataset"), definition)], False)], 1
+        )
+
+        self.assertEqual(change_set.changes, [])
+        self.assertIn("Unrecognized name: country", change_set.errors["view-project.view_dataset.v_orders"])
+        results = client.apply_changes(change_set, 1)
+        self.assertIsInstance(results["view-project.view_dataset.v_orders"], ValueError)
+        client.client.create_table.assert_not_called()
+
+    def test_failed_dataset_grant_is_reported_for_the_views_of_the_dataset(self):
+        client = _client_without_credentials()
+        source_dataset = _make_source_dataset()
+        _serve_tables(client, {f"src-project.src_dataset.{name}": _make_source_table("id") for name in "ab"})
+        client.client.get_dataset.return_value = source_dataset
+        denied = Forbidden("Access Denied")
+        client.client.update_dataset.side_effect = denied
+        destination = bigquery.Dataset("view-project.view_dataset")
+        targets = [(destination, ViewDefinition(view_name=f"v_{name}", source_table=name)) for name in "ab"]
+        change_set = client.plan_changes([(source_dataset, targets, True)], 2)
+
+        results = client.apply_changes(change_set, 2)
+
+        self.assertEqual(results, {"view-project.view_dataset.v_a": denied, "view-project.view_dataset.v_b": denied})
+        client.client.create_table.assert_not_called()
+
+
+
+def _dry_run_job(total_bytes_processed):
+    job = mock.MagicMock()
+    job.total_bytes_processed = total_bytes_processed
+    return job
+
+
+class TestQueryCost(unittest.TestCase):
+    def test_full_and_selected_columns_are_estimated(self):
+        client = _client_without_credentials()
+        client.client.query.side_effect = [_dry_run_job(5000), _dry_run_job(1000)]
+        view = bigquery.Table("view-project.view_dataset.v_orders")
+
+        cost = client.estimate_query_cost(view, _make_source_dataset(), "orders", ["id"], ["`id` > 0"])
+
+        self.assertEqual((cost.full_bytes, cost.selected_bytes, cost.saved_bytes), (5000, 1000, 4000))
+        full_query, selected_query = [" ".join(c.args[0].split()) for c in client.client.query.call_args_list]
+        self.assertTrue(full_query.startswith("SELECT * FROM"))
+        self.assertTrue(selected_query.startswith("SELECT `id` FROM"))
+        self.assertTrue(all(q.endswith("WHERE (`id` > 0)") for q in (full_query, selected_query)))
+        self.assertTrue(all(c.kwargs["job_config"].dry_run for c in client.client.query.call_args_list))
+        self.assertEqual(
+            client.metrics.query_costs(),
+            {"view-project.view_dataset.v_orders": {"full_bytes": 5000, "selected_bytes": 1000}},
+        )
+
+    def test_view_without_custom_columns_needs_one_dry_run(self):
+        client = _client_without_credentials()
+        client.client.query.return_value = _dry_run_job(5000)
+
+        cost = client.estimate_query_cost(bigquery.Table("p.d.v"), _make_source_dataset(), "orders", None)
+
+        self.assertEqual((cost.full_bytes, cost.selected_bytes), (5000, 5000))
+        client.client.query.assert_called_once()
+
+    def test_failed_estimate_does_not_fail_the_view(self):
+        client = _client_without_credentials()
+        client.client.query.side_effect = BadRequest("Access Denied")
+
+        self.assertIsNone(client.estimate_query_cost(bigquery.Table("p.d.v"), _make_source_dataset(), "orders", None))
+        self.assertEqual(client.metrics.query_costs(), {})
+
+    def test_changed_views_are_estimated_by_the_plan(self):
+        client = _client_without_credentials()
+        client.estimate_query_costs = True
+        _serve_tables(client, {"src-project.src_dataset.orders": _make_source_table("id", "name")})
+        client.client.query.side_effect = [_dry_run_job(5000), _dry_run_job(1000)]
+        definition = ViewDefinition(view_name="v_orders", source_table="orders", custom_columns=["id"])
+
+        change_set = client.plan_changes(
+            [(_make_source_dataset(), [(bigquery.Dataset("view-project.view_dataset"), definition)], False)], 1
+        )
+
+        create = change_set.of("create")[0]
+        self.assertEqual(
+            create.to_dict()["query_cost"], {"full_bytes": 5000, "selected_bytes": 1000, "saved_bytes": 4000}
+        )
+        client.client.create_table.assert_not_called()
+
+
+
+def _make_base_table():
+    table = bigquery.Table(
+        "src-project.src_dataset.orders",
+        schema=[bigquery.SchemaField("id", "STRING"), bigquery.SchemaField("day", "DATE")],
+    )
+    table._properties["type"] = "TABLE"
+    table.time_partitioning = bigquery.TimePartitioning(field="day")
+    return table
+
+
+def _saved(table, **_):
+    # the API derives the schema of the materialized view from its query
+    table.schema = [bigquery.SchemaField("id", "STRING"), bigquery.SchemaField("day", "DATE")]
+    table._properties.update(type="MATERIALIZED_VIEW", creationTime="1700000000000")
+    return table
+
+
+class TestMaterializedView(unittest.TestCase):
+    def _publish(self, client, existing=None, authorized=False, **options):
+        tables = {"src-project.src_dataset.orders": _make_base_table()}
+        if existing is not None:
+            tables["view-project.view_dataset.v_orders"] = existing
+        _serve_tables(client, tables)
+        client.client.create_table.side_effect = _saved
+        client.client.update_table.side_effect = lambda table, fields, **_: table
+        definition = ViewDefinition(
+            view_name="v_orders",
+            source_table="orders",
+            columns_descriptions={"id": "Identifier"},
+            materialized=MaterializedViewOptions(**options),
+        )
+        source_dataset = _make_source_dataset([view_access_entry(existing)] if authorized else ())
+        change_set = client.plan_changes(
+            [(source_dataset, [(bigquery.Dataset("view-project.view_dataset"), definition)], False)], 1
+        )
+        return change_set, client.apply_changes(change_set, 1)
+
+    def test_materialized_view_is_created_with_descriptions_and_authorized(self):
+        client = _client_without_credentials()
+
+        change_set, results = self._publish(client, clustering_fields=["id"], partition_field="day")
+
+        self.assertEqual(results, {"view-project.view_dataset.v_orders": None})
+        self.assertEqual([c.action for c in change_set.changes], ["create", "grant"])
+        self.assertEqual(change_set.changes[0].to_dict()["materialized"]["clustering_fields"], ["id"])
+        created = client.client.create_table.call_args.args[0]
+        self.assertEqual(" ".join(created.mview_query.split()), "SELECT * FROM `src-project`.`src_dataset`.`orders`")
+        self.assertIsNone(created.view_query)
+        self.assertEqual((created.clustering_fields, created.time_partitioning.field), (["id"], "day"))
+        described = client.client.update_table.call_args.args[0]
+        self.assertEqual(described.schema[0].description, "Identifier")
+        client.client.update_dataset.assert_called_once()
+
+    def test_unchanged_materialized_view_is_noop(self):
+        client = _client_without_credentials()
+        self._publish(client)
+        existing = client.client.update_table.call_args.args[0]
+        client.client.reset_mock()
+
+        change_set, results = self._publish(client, existing, authorized=True)
+
+        self.assertEqual([c.action for c in change_set.changes], ["noop"])
+        self.assertEqual(results, {"view-project.view_dataset.v_orders": None})
+        client.client.create_table.assert_not_called()
+        client.client.update_table.assert_not_called()
+
+    def test_refresh_options_are_updated_in_place(self):
+        client = _client_without_credentials()
+        self._publish(client)
+        existing = client.client.update_table.call_args.args[0]
+        client.client.reset_mock()
+
+        self._publish(client, existing, refresh_interval_minutes=5)
+
+        client.client.delete_table.assert_not_called()
+        client.client.create_table.assert_not_called()
+        updated, fields = client.client.update_table.call_args.args
+        self.assertIn("mview_refresh_interval", fields)
+        self.assertEqual(updated.mview_refresh_interval.total_seconds(), 300)
+
+    def test_changed_clustering_recreates_the_view(self):
+        client = _client_without_credentials()
+        self._publish(client)
+        existing = client.client.update_table.call_args.args[0]
+        client.client.reset_mock()
+
+        self._publish(client, existing, clustering_fields=["id"])
+
+        client.client.delete_table.assert_called_once()
+        client.client.create_table.assert_called_once()
+
+    def test_logical_view_is_replaced_by_a_materialized_view(self):
+        client = _client_without_credentials()
+        logical = bigquery.Table("view-project.view_dataset.v_orders")
+        logical.view_query = "SELECT * FROM `src-project`.`src_dataset`.`orders`"
+        logical._properties.update(type="VIEW", creationTime="1700000000000")
+
+        self._publish(client, logical)
+
+        client.client.delete_table.assert_called_once()
+        self.assertIsNotNone(client.client.create_table.call_args.args[0].mview_query)
+
+    def test_ineligible_view_is_reported_by_the_plan(self):
+        client = _client_without_credentials()
+
+        change_set, results = self._publish(client, clustering_fields=["missing"])
+
+        self.assertIn("missing", change_set.errors["view-project.view_dataset.v_orders"])
+        self.assertIsInstance(results["view-project.view_dataset.v_orders"], ValueError)
+        client.client.create_table.assert_not_called()
+
+    def test_create_view_checks_the_eligibility(self):
+        client = _client_without_credentials()
+        source = _make_base_table()
+        source._properties["type"] = "EXTERNAL"
+        _serve_tables(client, {"src-project.src_dataset.orders": source})
+
+        with self.assertRaises(InvalidViewQuery):
+            client.create_view(
+                bigquery.Dataset("view-project.view_dataset"), _make_source_dataset(), "orders", {}, None, "v_orders",
+                None, materialized=MaterializedViewOptions(),
+            )
+        client.client.create_table.assert_not_called()
+
+    def test_materialized_view_is_replaced_by_a_logical_view(self):
+        client = _client_without_credentials()
+        existing = _saved(bigquery.Table("view-project.view_dataset.v_orders"))
+
+        client._replace_view(existing, "SELECT * FROM `p`.`d`.`t`", None, None, {})
+
+        client.client.delete_table.assert_called_once()
+        self.assertEqual(client.client.create_table.call_args.args[0].view_query, "SELECT * FROM `p`.`d`.`t`")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -4,12 +4,59 @@ Created on 12. 11. 2018
 @author: esner
 """
 
+import json
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
+
 import mock
-import os
 from freezegun import freeze_time
 
 from component import Component
+from keboola.component.exceptions import UserException
+
+KBC_PROJECT_ID = "1234"
+
+
+def _make_component(parameters, state=None):
+    data_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(data_dir, "in"))
+    os.makedirs(os.path.join(data_dir, "out"))
+    with open(os.path.join(data_dir, "config.json"), "w") as config_file:
+        json.dump({"parameters": parameters}, config_file)
+    if state is not None:
+        with open(os.path.join(data_dir, "in", "state.json"), "w") as state_file:
+            json.dump(state, state_file)
+    with mock.patch.dict(os.environ, {"KBC_DATADIR": data_dir, "KBC_PROJECTID": KBC_PROJECT_ID}):
+        return Component()
+
+
+def _read_state(component):
+    with open(os.path.join(component.data_folder_path, "out", "state.json")) as state_file:
+        return json.load(state_file)
+
+
+def _row_parameters(**parameters):
+    return {
+        "#service_account": "{}",
+        "source_project_id": f"kbc-grpn-{KBC_PROJECT_ID}-abcd",
+        "destination_project_id": "dest-project",
+        "destination_dataset_id": "dest_dataset",
+        "destination_view_name": "orders_view",
+        **parameters,
+    }
+
+
+TABLE_DETAIL = {
+    "id": "in.c-test.orders",
+    "name": "orders",
+    "columns": ["id", "name"],
+    "lastChangeDate": "2024-01-01T00:00:00+0100",
+    "metadata": [{"key": "KBC.description", "value": "Orders"}],
+    "columnMetadata": {"id": [{"key": "KBC.description", "value": "Identifier"}]},
+}
 
 
 class TestComponent(unittest.TestCase):
@@ -22,6 +69,437 @@ class TestComponent(unittest.TestCase):
             comp = Component()
             comp.run()
 
+    def test_expand_table_id(self):
+        self.assertEqual(Component.expand_table_id("in.c-test.Account"), ("in_c_test", "Account"))
+        self.assertEqual(Component.expand_bucket_id("out.c-my-bucket"), "out_c_my_bucket")
+
+    def test_filter_tables_by_include_and_exclude_patterns(self):
+        tables = [{"name": n} for n in ("orders", "orders_tmp", "customers", "log")]
+
+        self.assertEqual(Component._filter_tables(tables, None, None), tables)
+        self.assertEqual(
+            [t["name"] for t in Component._filter_tables(tables, ["orders*", "customers"], ["*_tmp"])],
+            ["orders", "customers"],
+        )
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_component_import_does_not_load_api_clients(self):
+        src_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src")
+        heavy_modules = ["google.cloud.bigquery", "google.oauth2.service_account", "kbcstorage.base"]
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import sys, component; print([m for m in {heavy_modules} if m in sys.modules])",
+            ],
+            env=dict(os.environ, PYTHONPATH=src_dir),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(output.stdout.strip(), "[]")
+
+
+@mock.patch("storage_api.StorageClient")
+class TestIncrementalState(unittest.TestCase):
+    def test_unchanged_view_makes_no_bigquery_calls(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        first = _make_component(_row_parameters(source_table_id="in.c-test.orders"))
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            first.run()
+        get_bigquery_client.return_value.create_view.assert_called_once()
+        state = _read_state(first)
+        self.assertIn("dest-project.dest_dataset.orders_view", state["views"])
+
+        second = _make_component(_row_parameters(source_table_id="in.c-test.orders"), state)
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            second.run()
+        get_bigquery_client.assert_not_called()
+        self.assertEqual(_read_state(second), state)
+        with open(os.path.join(second.data_folder_path, "run_metrics.json")) as metrics_file:
+            self.assertEqual(json.load(metrics_file)["operations"]["sapi_tables_detail"]["calls"], 1)
+
+    def test_full_refresh_ignores_the_state(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        first = _make_component(_row_parameters(source_table_id="in.c-test.orders"))
+        with mock.patch.object(Component, "_get_bigquery_client"):
+            first.run()
+
+        second = _make_component(
+            _row_parameters(source_table_id="in.c-test.orders", full_refresh=True), _read_state(first)
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            second.run()
+        get_bigquery_client.return_value.create_view.assert_called_once()
+
+
+@mock.patch("storage_api.StorageClient")
+class TestBulkMode(unittest.TestCase):
+    def test_tables_metadata_is_fetched_with_one_listing(self, sapi_client_cls):
+        sapi_client = sapi_client_cls.return_value
+        sapi_client.buckets.list_tables.return_value = [
+            dict(TABLE_DETAIL, columnMetadata=[]),
+            dict(TABLE_DETAIL, id="in.c-test.customers", name="customers"),
+        ]
+        component = _make_component(
+            _row_parameters(bulk_mode=True, source_bucket="in.c-test", destination_view_name="v_{table_name}")
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            get_bigquery_client.return_value.publish_views.return_value = {
+                "dest-project.dest_dataset.v_orders": None,
+                "dest-project.dest_dataset.v_customers": None,
+            }
+            component.run()
+
+        sapi_client.tables.detail.assert_not_called()
+        targets = get_bigquery_client.return_value.publish_views.call_args.args[1]
+        self.assertEqual(
+            [(d.view_name, d.columns_descriptions) for _, d in targets],
+            [("v_orders", {}), ("v_customers", {"id": "Identifier"})],
+        )
+        self.assertEqual(len(_read_state(component)["views"]), 2)
+
+    def test_dataset_authorization_is_passed_to_the_client(self, sapi_client_cls):
+        sapi_client_cls.return_value.buckets.list_tables.return_value = [TABLE_DETAIL]
+        component = _make_component(
+            _row_parameters(
+                bulk_mode=True,
+                source_bucket="in.c-test",
+                destination_view_name="v_{table_name}",
+                authorization="dataset",
+            )
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            get_bigquery_client.return_value.publish_views.return_value = {"dest-project.dest_dataset.v_orders": None}
+            component.run()
+
+        self.assertTrue(get_bigquery_client.return_value.publish_views.call_args.args[3])
+
+    def test_unknown_authorization_fails(self, sapi_client_cls):
+        sapi_client_cls.return_value.buckets.list_tables.return_value = [TABLE_DETAIL]
+        component = _make_component(
+            _row_parameters(
+                bulk_mode=True, source_bucket="in.c-test", destination_view_name="v_{table_name}", authorization="x"
+            )
+        )
+        with mock.patch.object(Component, "_get_bigquery_client"):
+            with self.assertRaises(UserException):
+                component.run()
+
+
+@mock.patch("storage_api.StorageClient")
+class TestDryRun(unittest.TestCase):
+    def test_dry_run_writes_the_change_set_without_publishing(self, sapi_client_cls):
+        from google_cloud.planner import Change, ChangeSet
+
+        sapi_client_cls.return_value.buckets.list_tables.return_value = [TABLE_DETAIL]
+        component = _make_component(
+            _row_parameters(
+                bulk_mode=True, source_bucket="in.c-test", destination_view_name="v_{table_name}", dry_run=True
+            )
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            bq = get_bigquery_client.return_value
+            bq.plan_changes.return_value = ChangeSet(
+                [Change("create", "dest-project.dest_dataset.v_orders"), Change("grant", "dest-project.dest_dataset.v_orders")]
+            )
+            component.run()
+
+        groups = bq.plan_changes.call_args.args[0]
+        self.assertEqual([d.view_name for _, targets, _ in groups for _, d in targets], ["v_orders"])
+        bq.publish_views.assert_not_called()
+        with open(os.path.join(component.files_out_path, "change_set.json")) as change_set_file:
+            change_set = json.load(change_set_file)
+        with open(os.path.join(component.files_out_path, "change_set.json.manifest")) as manifest_file:
+            self.assertEqual(json.load(manifest_file)["tags"], ["bigquery-views-change-set"])
+        self.assertEqual(change_set["summary"]["create"], 1)
+        self.assertEqual(change_set["estimated_api_calls"], 2)
+        self.assertEqual(_read_state(component)["views"], {})
+
+
+@mock.patch("storage_api.StorageClient")
+class TestRowFilter(unittest.TestCase):
+    def test_changed_row_filter_rebuilds_the_view(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        first = _make_component(_row_parameters(source_table_id="in.c-test.orders"))
+        with mock.patch.object(Component, "_get_bigquery_client"):
+            first.run()
+
+        component = _make_component(
+            _row_parameters(
+                source_table_id="in.c-test.orders", row_filter=" country = 'CZ' ", time_window_days=7,
+                partition_filter=True,
+            ),
+            _read_state(first),
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            component.run()
+
+        row_filter = get_bigquery_client.return_value.create_view.call_args.kwargs["row_filter"]
+        self.assertEqual(
+            (row_filter.predicate, row_filter.time_window_days, row_filter.partition_filter), ("country = 'CZ'", 7, True)
+        )
+        self.assertNotEqual(_read_state(component), _read_state(first))
+
+    def test_time_window_without_column_fails(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        component = _make_component(_row_parameters(source_table_id="in.c-test.orders", time_window_days=7))
+        with mock.patch.object(Component, "_get_bigquery_client"):
+            with self.assertRaises(UserException):
+                component.run()
+
+
+@mock.patch("storage_api.StorageClient")
+class TestQueryCosts(unittest.TestCase):
+    def test_costs_are_stored_in_state_and_expensive_views_warned_about(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        parameters = _row_parameters(source_table_id="in.c-test.orders", query_cost_warning_gb=1)
+        component = _make_component(parameters)
+
+        def create_view(*args, **kwargs):
+            component._metrics.record_query_cost("dest-project.dest_dataset.orders_view", 5 * 10 ** 9, 2 * 10 ** 9)
+
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            get_bigquery_client.return_value.create_view.side_effect = create_view
+            with self.assertLogs(level="WARNING") as logs:
+                component.run()
+
+        self.assertTrue(component._estimate_query_costs())
+        self.assertIn("2.00 GB (5.00 GB with all source table columns)", "\n".join(logs.output))
+        state = _read_state(component)
+        self.assertEqual(
+            state["views"]["dest-project.dest_dataset.orders_view"]["query_cost"],
+            {"full_bytes": 5 * 10 ** 9, "selected_bytes": 2 * 10 ** 9},
+        )
+        with open(os.path.join(component.data_folder_path, "run_metrics.json")) as metrics_file:
+            self.assertEqual(len(json.load(metrics_file)["query_costs"]), 1)
+
+        # the stored cost does not make the view look changed
+        second = _make_component(parameters, state)
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            second.run()
+        get_bigquery_client.assert_not_called()
+        self.assertEqual(_read_state(second), state)
+
+    def test_invalid_warning_threshold_fails(self, sapi_client_cls):
+        component = _make_component(_row_parameters(source_table_id="in.c-test.orders", query_cost_warning_gb=-1))
+        with self.assertRaises(UserException):
+            component.run()
+
+
+@mock.patch("storage_api.StorageClient")
+class TestMaterializedView(unittest.TestCase):
+    def test_options_are_passed_to_the_client_and_stored(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        first = _make_component(_row_parameters(source_table_id="in.c-test.orders"))
+        with mock.patch.object(Component, "_get_bigquery_client"):
+            first.run()
+
+        component = _make_component(
+            _row_parameters(
+                source_table_id="in.c-test.orders",
+                materialized_view=True,
+                refresh_interval_minutes=0,
+                max_staleness_minutes="60",
+                clustering_fields=["id", ""],
+            ),
+            _read_state(first),
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            component.run()
+
+        materialized = get_bigquery_client.return_value.create_view.call_args.kwargs["materialized"]
+        self.assertEqual(
+            (materialized.refresh_interval_minutes, materialized.max_staleness_minutes, materialized.clustering_fields),
+            (None, 60, ["id"]),
+        )
+        self.assertNotEqual(_read_state(component), _read_state(first))
+
+    def test_default_refresh_interval(self, sapi_client_cls):
+        options = Component._get_materialized_view_options({"materialized_view": True, "refresh_interval_minutes": ""})
+        self.assertEqual(options.refresh_interval_minutes, 30)
+        self.assertIsNone(Component._get_materialized_view_options({"refresh_interval_minutes": 5}))
+        with self.assertRaises(UserException):
+            Component._get_materialized_view_options({"materialized_view": True, "max_staleness_minutes": "-1"})
+
+
+@mock.patch("storage_api.StorageClient")
+class TestAdditionalDestinations(unittest.TestCase):
+    def test_source_is_resolved_once_for_all_destinations(self, sapi_client_cls):
+        sapi_client_cls.return_value.tables.detail.return_value = TABLE_DETAIL
+        component = _make_component(
+            _row_parameters(
+                source_table_id="in.c-test.orders",
+                additional_destinations=[
+                    {"destination_project_id": "other-project", "destination_dataset_id": "shared"},
+                    {
+                        "destination_project_id": "dest-project",
+                        "destination_dataset_id": "dest_dataset",
+                        "destination_view_name": "orders_copy",
+                    },
+                ],
+            )
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            bq = get_bigquery_client.return_value
+            bq.publish_views.return_value = {
+                "dest-project.dest_dataset.orders_view": None,
+                "other-project.shared.orders_view": None,
+                "dest-project.dest_dataset.orders_copy": RuntimeError("403"),
+            }
+            with self.assertRaises(UserException):
+                component.run()
+
+        sapi_client_cls.return_value.tables.detail.assert_called_once()
+        bq.create_view.assert_not_called()
+        bq.publish_views.assert_called_once()
+        targets = bq.publish_views.call_args.args[1]
+        self.assertEqual([d.view_name for _, d in targets], ["orders_view", "orders_view", "orders_copy"])
+        self.assertEqual(
+            [c.args for c in bq.find_dataset.call_args_list],
+            [
+                (f"kbc-grpn-{KBC_PROJECT_ID}-abcd", "in_c_test"),
+                ("dest-project", "dest_dataset"),
+                ("other-project", "shared"),
+            ],
+        )
+        self.assertEqual(
+            sorted(_read_state(component)["views"]),
+            ["dest-project.dest_dataset.orders_view", "other-project.shared.orders_view"],
+        )
+
+    def test_destination_without_dataset_fails(self, sapi_client_cls):
+        component = _make_component(
+            _row_parameters(
+                source_table_id="in.c-test.orders",
+                additional_destinations=[{"destination_project_id": "other-project"}],
+            )
+        )
+        with self.assertRaises(UserException):
+            component.run()
+
+
+def _config_row(**parameters):
+    return {"configuration": {"parameters": parameters}}
+
+
+@mock.patch("storage_api.StorageClient")
+class TestRunAllRows(unittest.TestCase):
+    def _make_runner(self, sapi_client, rows, state=None):
+        sapi_client.configurations.detail.return_value = {
+            "configuration": {"parameters": _row_parameters()},
+            "rows": [_config_row(run_all_rows=True)] + rows,
+        }
+        component = _make_component({"#service_account": "{}", "run_all_rows": True}, state)
+        component.environment_variables.component_id = "keboola.wr-bigquery-byodb-view"
+        component.environment_variables.config_id = "123"
+        return component
+
+    def test_rows_share_the_lookups_and_publish_per_source_dataset(self, sapi_client_cls):
+        sapi_client = sapi_client_cls.return_value
+        sapi_client.buckets.list_tables.side_effect = lambda bucket_id, include=None: {
+            "in.c-test": [TABLE_DETAIL, dict(TABLE_DETAIL, id="in.c-test.customers", name="customers")],
+            "in.c-crm": [dict(TABLE_DETAIL, id="in.c-crm.leads", name="leads")],
+        }[bucket_id]
+        component = self._make_runner(
+            sapi_client,
+            [
+                _config_row(source_table_id="in.c-test.orders"),
+                _config_row(source_table_id="in.c-test.customers", destination_view_name="customers_view"),
+                _config_row(bulk_mode=True, source_bucket="in.c-crm", destination_view_name="crm_{table_name}"),
+            ],
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            bq = get_bigquery_client.return_value
+            bq.publish_views.side_effect = lambda source, targets, *args: {
+                f"dest-project.dest_dataset.{d.view_name}": None for _, d in targets
+            }
+            component.run()
+
+        sapi_client.tables.detail.assert_not_called()
+        self.assertEqual(sapi_client.buckets.list_tables.call_count, 2)
+        self.assertEqual(
+            [[d.view_name for _, d in c.args[1]] for c in bq.publish_views.call_args_list],
+            [["orders_view", "customers_view"], ["crm_leads"]],
+        )
+        self.assertEqual(
+            sorted(_read_state(component)["views"]),
+            [
+                "dest-project.dest_dataset.crm_leads",
+                "dest-project.dest_dataset.customers_view",
+                "dest-project.dest_dataset.orders_view",
+            ],
+        )
+
+        rerun = self._make_runner(
+            sapi_client,
+            [
+                _config_row(source_table_id="in.c-test.orders"),
+                _config_row(source_table_id="in.c-test.customers", destination_view_name="customers_view"),
+                _config_row(bulk_mode=True, source_bucket="in.c-crm", destination_view_name="crm_{table_name}"),
+            ],
+            _read_state(component),
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            rerun.run()
+        get_bigquery_client.assert_not_called()
+
+    def test_view_published_by_two_rows_fails(self, sapi_client_cls):
+        sapi_client = sapi_client_cls.return_value
+        sapi_client.tables.detail.return_value = TABLE_DETAIL
+        component = self._make_runner(
+            sapi_client,
+            [_config_row(source_table_id="in.c-test.orders"), _config_row(source_table_id="in.c-test.customers")],
+        )
+        with mock.patch.object(Component, "_get_bigquery_client") as get_bigquery_client:
+            with self.assertRaises(UserException):
+                component.run()
+        get_bigquery_client.return_value.publish_views.assert_not_called()
+
+
+@mock.patch("storage_api.StorageClient")
+class TestReconcile(unittest.TestCase):
+    def test_expected_views_of_all_config_rows(self, sapi_client_cls):
+        sapi_client = sapi_client_cls.return_value
+        sapi_client.configurations.detail.return_value = {
+            "configuration": {"parameters": {"#service_account": "{}"}},
+            "rows": [
+                {"configuration": {"parameters": _row_parameters(source_table_id="in.c-test.orders")}},
+                {
+                    "configuration": {
+                        "parameters": _row_parameters(
+                            bulk_mode=True,
+                            source_bucket="in.c-crm",
+                            destination_view_name="crm_{table_name}",
+                            table_exclude=["tmp_*"],
+                        )
+                    }
+                },
+                # a row without a source table publishes nothing
+                {"configuration": {"parameters": _row_parameters(destination_view_name="dropped")}},
+            ],
+        }
+        sapi_client.buckets.list_tables.return_value = [
+            dict(TABLE_DETAIL, id="in.c-crm.customers", name="customers"),
+            dict(TABLE_DETAIL, id="in.c-crm.tmp_load", name="tmp_load"),
+        ]
+        component = _make_component(_row_parameters())
+        component.environment_variables.component_id = "keboola.wr-bigquery-byodb-view"
+        component.environment_variables.config_id = "123"
+
+        expected_views, source_datasets = component._get_expected_views(component._get_configured_rows())
+
+        sapi_client.configurations.detail.assert_called_once_with("keboola.wr-bigquery-byodb-view", "123")
+        self.assertEqual(expected_views, {"dest-project.dest_dataset": {"orders_view", "crm_customers"}})
+        source_project = f"kbc-grpn-{KBC_PROJECT_ID}-abcd"
+        self.assertEqual(source_datasets, {f"{source_project}.in_c_test", f"{source_project}.in_c_crm"})
+
+    def test_unsaved_configuration_cannot_be_reconciled(self, sapi_client_cls):
+        component = _make_component(_row_parameters())
+        with self.assertRaises(UserException):
+            component._get_configured_rows()
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
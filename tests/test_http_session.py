@@ -0,0 +1,45 @@
+import unittest
+import mock
+
+import http_session
+from http_session import get_authorized_session, get_session, pool_size_for
+from storage_api import StorageClient
+
+
+class TestSessions(unittest.TestCase):
+    def tearDown(self):
+        http_session.close_sessions()
+
+    def test_session_is_shared_and_its_pool_grows(self):
+        session = get_session("storage")
+        self.assertEqual(session.get_adapter("https://connection.keboola.com")._pool_maxsize, 10)
+
+        self.assertIs(get_session("storage", pool_size_for(32)), session)
+        self.assertEqual(session.get_adapter("https://connection.keboola.com")._pool_maxsize, 34)
+        # a smaller pool request keeps the bigger pool
+        get_session("storage", 10)
+        self.assertEqual(session.get_adapter("https://connection.keboola.com")._pool_maxsize, 34)
+
+    def test_authorized_session_is_shared_by_the_service_account(self):
+        credentials = mock.MagicMock(service_account_email="writer@project.iam.gserviceaccount.com")
+        session = get_authorized_session(credentials)
+
+        self.assertIs(session.credentials, credentials)
+        other = mock.MagicMock(service_account_email="writer@project.iam.gserviceaccount.com")
+        self.assertIs(get_authorized_session(other), session)
+
+    def test_storage_endpoints_use_the_session(self):
+        session = mock.MagicMock()
+        session.get.return_value.status_code = 200
+        client = StorageClient("https://connection.keboola.com", "token", session=session)
+
+        client.tables.detail("in.c-test.orders")
+
+        session.get.assert_called_once()
+        self.assertEqual(
+            session.get.call_args.args[0], "https://connection.keboola.com/v2/storage/tables/in.c-test.orders"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
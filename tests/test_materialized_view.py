@@ -0,0 +1,87 @@
+import datetime
+import unittest
+
+from google.cloud import bigquery
+
+from google_cloud import materialized_view
+from google_cloud.view_definition import InvalidViewQuery, MaterializedViewOptions, RowFilter
+
+
+def _make_table(table_type="TABLE", partition_field="day"):
+    table = bigquery.Table(
+        "src-project.src_dataset.orders",
+        schema=[bigquery.SchemaField("id", "STRING"), bigquery.SchemaField("day", "DATE")],
+    )
+    table._properties["type"] = table_type
+    if partition_field:
+        table.time_partitioning = bigquery.TimePartitioning(field=partition_field)
+    return table
+
+
+def _make_materialized_view(options, query="SELECT `id`, `day` FROM `p`.`d`.`orders`"):
+    view = materialized_view.build_materialized_view(
+        bigquery.TableReference.from_string("view-project.views.orders"), query, None, options, _make_table()
+    )
+    view._properties["type"] = materialized_view.MATERIALIZED_VIEW
+    return view
+
+
+class TestEligibility(unittest.TestCase):
+    def test_eligible_view(self):
+        options = MaterializedViewOptions(clustering_fields=["id"], partition_field="day")
+        materialized_view.check_eligibility(_make_table(), None, RowFilter(predicate="id > 0"), options)
+
+    def test_ineligible_views(self):
+        for table, columns, row_filter, options in (
+            (_make_table("VIEW"), None, None, MaterializedViewOptions()),
+            (_make_table(), None, RowFilter(time_window_column="day", time_window_days=7), MaterializedViewOptions()),
+            (_make_table(), None, None, MaterializedViewOptions(refresh_interval_minutes=20000)),
+            (_make_table(), ["id"], None, MaterializedViewOptions(clustering_fields=["day"])),
+            (_make_table(), None, None, MaterializedViewOptions(clustering_fields=["id", "day"] * 3)),
+            (_make_table(partition_field=None), None, None, MaterializedViewOptions(partition_field="day")),
+            (_make_table(), ["id"], None, MaterializedViewOptions(partition_field="day")),
+        ):
+            with self.assertRaises(InvalidViewQuery):
+                materialized_view.check_eligibility(table, columns, row_filter, options)
+
+
+class TestOptions(unittest.TestCase):
+    def test_staleness_interval_round_trip(self):
+        self.assertEqual(materialized_view.staleness_interval(1530), "0-0 1 1:30:0")
+        self.assertEqual(materialized_view.staleness_minutes("0-0 1 1:30:0"), 1530)
+        self.assertIsNone(materialized_view.staleness_interval(None))
+        self.assertIsNone(materialized_view.staleness_minutes(None))
+
+    def test_options_are_read_back_from_the_view(self):
+        options = MaterializedViewOptions(
+            refresh_interval_minutes=60, max_staleness_minutes=90, clustering_fields=["id"], partition_field="day"
+        )
+        view = _make_materialized_view(options)
+
+        self.assertEqual(view.mview_refresh_interval, datetime.timedelta(hours=1))
+        self.assertEqual(view.time_partitioning.field, "day")
+        self.assertEqual(materialized_view.read_options(view), options)
+
+    def test_disabled_refresh(self):
+        view = _make_materialized_view(MaterializedViewOptions(refresh_interval_minutes=None))
+
+        self.assertFalse(view.mview_enable_refresh)
+        self.assertIsNone(materialized_view.read_options(view).refresh_interval_minutes)
+
+    def test_only_refresh_options_are_updated_in_place(self):
+        existing = _make_materialized_view(MaterializedViewOptions(clustering_fields=["id"]))
+
+        refreshed = _make_materialized_view(MaterializedViewOptions(refresh_interval_minutes=5, clustering_fields=["id"]))
+        self.assertTrue(materialized_view.can_update_in_place(existing, refreshed))
+        for view in (
+            _make_materialized_view(MaterializedViewOptions()),
+            _make_materialized_view(MaterializedViewOptions(clustering_fields=["id"]), query="SELECT `id` FROM x"),
+        ):
+            self.assertFalse(materialized_view.can_update_in_place(existing, view))
+        logical = bigquery.Table("view-project.views.orders")
+        logical._properties["type"] = "VIEW"
+        self.assertFalse(materialized_view.can_update_in_place(logical, refreshed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+import mock
+
+from google_cloud.metadata_cache import MetadataCache
+
+
+class TestMetadataCache(unittest.TestCase):
+    @mock.patch("google_cloud.metadata_cache.time.time")
+    def test_entries_expire_after_ttl(self, now):
+        now.return_value = 1000
+        cache = MetadataCache(ttl=60)
+        cache.set("projects", [["p", "Project"]])
+
+        now.return_value = 1059
+        self.assertEqual(cache.get("projects"), [["p", "Project"]])
+        now.return_value = 1060
+        self.assertIsNone(cache.get("projects"))
+
+    def test_invalidate(self):
+        cache = MetadataCache()
+        cache.set("dataset:p.d", {"location": "US"})
+        cache.invalidate("dataset:p.d")
+        self.assertIsNone(cache.get("dataset:p.d"))
+
+    def test_persisted_in_state_and_file(self):
+        cache = MetadataCache()
+        cache.set("dataset:p.d", {"location": "US"})
+
+        self.assertEqual(MetadataCache.from_dict(cache.to_dict()).get("dataset:p.d"), {"location": "US"})
+
+        path = os.path.join(tempfile.mkdtemp(), "cache.json")
+        cache.save(path)
+        self.assertEqual(MetadataCache.load(path).get("dataset:p.d"), {"location": "US"})
+        self.assertIsNone(MetadataCache.load(path + ".missing").get("dataset:p.d"))
+
+
+if __name__ == "__main__":
+    unittest.main()
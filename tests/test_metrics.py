@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+
+from metrics import ApiMetrics
+
+
+class TestApiMetrics(unittest.TestCase):
+    def test_report_counts_calls_errors_retries_and_conflicts(self):
+        metrics = ApiMetrics()
+        with metrics.track("get_dataset"):
+            pass
+        with self.assertRaises(RuntimeError):
+            with metrics.track("update_dataset"):
+                raise RuntimeError("412")
+        metrics.record_conflict("update_dataset")
+        metrics.record_retry("update_dataset", 2)
+        with metrics.track("update_dataset"):
+            pass
+
+        report = metrics.report()
+
+        self.assertEqual(report["calls"], 3)
+        self.assertEqual(report["errors"], 1)
+        self.assertEqual(report["retries"], 1)
+        self.assertEqual(report["conflicts"], 1)
+        self.assertEqual(report["backoff_seconds"], 2)
+        self.assertEqual(report["operations"]["update_dataset"]["calls"], 2)
+        self.assertIsNotNone(report["operations"]["get_dataset"]["p99_ms"])
+        self.assertIn("API calls: 3", metrics.summary())
+
+    def test_query_costs_are_reported(self):
+        metrics = ApiMetrics()
+        metrics.record_query_cost("p.d.orders", 1000, 200)
+        metrics.record_query_cost("p.d.customers", 500, 500)
+
+        report = metrics.report()
+
+        self.assertEqual(list(report["query_costs"]), ["p.d.customers", "p.d.orders"])
+        self.assertEqual(report["query_costs"]["p.d.orders"], {"full_bytes": 1000, "selected_bytes": 200})
+        self.assertIn("query costs of 2 views: 700 bytes processed (1500 bytes with all columns)", metrics.summary())
+
+    def test_save_writes_json_report(self):
+        metrics = ApiMetrics()
+        with metrics.track("get_table"):
+            pass
+        path = os.path.join(tempfile.mkdtemp(), "run_metrics.json")
+
+        metrics.save(path)
+
+        with open(path) as metrics_file:
+            self.assertEqual(json.load(metrics_file)["operations"]["get_table"]["calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import mock
+
+from google_cloud.reconcile import ReconcilePlan, Reconciler
+
+SOURCE_PROJECT = "kbc-grpn-1234-abcd"
+
+
+def _make_view(query, config_id=None):
+    view = mock.MagicMock()
+    view.view_query = query
+    view.labels = {"keboola_config_id": config_id} if config_id else {}
+    return view
+
+
+def _make_bigquery_client():
+    bq = mock.MagicMock()
+    bq.list_views.return_value = [
+        "dest.views.v_orders", "dest.views.v_deleted", "dest.views.manual", "dest.views.v_other_config"
+    ]
+    bq.get_tables.return_value = {
+        "dest.views.v_deleted": _make_view(f"SELECT * FROM `{SOURCE_PROJECT}`.`in_c_old`.`deleted`", "123"),
+        "dest.views.manual": _make_view(f"SELECT * FROM `{SOURCE_PROJECT}`.`in_c_test`.`orders`"),
+        "dest.views.v_other_config": _make_view(f"SELECT * FROM `{SOURCE_PROJECT}`.`in_c_test`.`items`", "456"),
+    }
+    bq.is_published_view.side_effect = lambda view: view.labels.get("keboola_config_id") == "123"
+    bq.get_view_source.side_effect = lambda view: tuple(
+        part.strip("`") for part in view.view_query.split("FROM ")[1].split(".")
+    )
+    bq.get_authorized_views.side_effect = lambda dataset: {
+        "in_c_test": ["dest.views.v_orders", "dest.views.manual", "dest.views.v_removed", "other.views.foreign"],
+        "in_c_old": ["dest.views.v_deleted"],
+    }[dataset.dataset_id]
+
+    def find_dataset(project, dataset_id, refresh=False):
+        dataset = mock.MagicMock()
+        dataset.dataset_id = dataset_id
+        return dataset
+
+    bq.find_dataset.side_effect = find_dataset
+    return bq
+
+
+class TestReconciler(unittest.TestCase):
+    def test_plan_deletes_only_the_labelled_orphaned_views(self):
+        bq = _make_bigquery_client()
+
+        plan = Reconciler(bq, 4).plan({"dest.views": {"v_orders"}}, {f"{SOURCE_PROJECT}.in_c_test"})
+
+        # the hand-written view and the view of another configuration read the same project, but are kept
+        self.assertEqual(plan.delete_views, ["dest.views.v_deleted"])
+        # the entries of the deleted view and of the view that no longer exists are revoked,
+        # the kept views and the views of other destination datasets keep theirs
+        self.assertEqual(
+            plan.revoke_access,
+            {
+                f"{SOURCE_PROJECT}.in_c_old": ["dest.views.v_deleted"],
+                f"{SOURCE_PROJECT}.in_c_test": ["dest.views.v_removed"],
+            },
+        )
+        self.assertEqual(plan.kept_views, 1)
+        bq.get_tables.assert_called_once_with(
+            ["dest.views.v_deleted", "dest.views.manual", "dest.views.v_other_config"], 4
+        )
+
+    def test_unlabelled_views_are_not_deleted(self):
+        bq = _make_bigquery_client()
+        bq.is_published_view.side_effect = None
+        bq.is_published_view.return_value = False
+
+        plan = Reconciler(bq, 4).plan({"dest.views": {"v_orders"}}, {f"{SOURCE_PROJECT}.in_c_test"})
+
+        self.assertEqual(plan.delete_views, [])
+        self.assertEqual(plan.revoke_access, {f"{SOURCE_PROJECT}.in_c_test": ["dest.views.v_removed"]})
+
+    def test_apply_deletes_views_then_updates_every_source_dataset_once(self):
+        bq = _make_bigquery_client()
+        failure = RuntimeError("403")
+        bq.delete_views.return_value = {"dest.views.v_deleted": None}
+
+        def revoke_views_access(dataset, view_ids):
+            if dataset.dataset_id == "in_c_old":
+                raise failure
+            return dataset
+
+        bq.revoke_views_access.side_effect = revoke_views_access
+        plan = ReconcilePlan(
+            delete_views=["dest.views.v_deleted"],
+            revoke_access={
+                f"{SOURCE_PROJECT}.in_c_old": ["dest.views.v_deleted"],
+                f"{SOURCE_PROJECT}.in_c_test": ["dest.views.v_removed"],
+            },
+        )
+
+        results = Reconciler(bq, 4).apply(plan)
+
+        bq.delete_views.assert_called_once_with(["dest.views.v_deleted"], 4)
+        self.assertEqual(bq.revoke_views_access.call_count, 2)
+        self.assertEqual(
+            results,
+            {
+                "dest.views.v_deleted": None,
+                f"{SOURCE_PROJECT}.in_c_old": failure,
+                f"{SOURCE_PROJECT}.in_c_test": None,
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
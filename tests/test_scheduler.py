@@ -0,0 +1,100 @@
+import threading
+import unittest
+
+import mock
+from google.api_core.exceptions import BadRequest, Forbidden, TooManyRequests
+
+from google_cloud.scheduler import DEFAULT_BURST, DEFAULT_RATE, MutationScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_throttled_to_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=0.5, capacity=5, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(7)]
+
+        self.assertEqual(waits[:5], [0.0] * 5)
+        self.assertAlmostEqual(waits[5], 2.0)
+        self.assertAlmostEqual(waits[6], 2.0)
+        self.assertAlmostEqual(clock.now, 4.0)
+
+    def test_default_bucket_keeps_the_metadata_update_limit(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=DEFAULT_RATE, capacity=DEFAULT_BURST, clock=clock, sleep=clock.sleep)
+
+        times = []
+        for _ in range(12):
+            bucket.acquire()
+            times.append(clock.now)
+
+        # no 10 seconds window has more than 5 operations
+        for first, sixth in zip(times, times[5:]):
+            self.assertGreaterEqual(sixth - first, 10.0)
+
+
+def _rate_limit_error():
+    return Forbidden("Exceeded rate limits", errors=[{"reason": "rateLimitExceeded"}])
+
+
+class TestMutationScheduler(unittest.TestCase):
+    def test_rate_limit_errors_are_retried(self):
+        sleep = mock.MagicMock()
+        scheduler = MutationScheduler(rate=1000, burst=1000, sleep=sleep)
+        func = mock.MagicMock(side_effect=[_rate_limit_error(), TooManyRequests("429"), "updated"])
+
+        self.assertEqual(scheduler.call("table:p.d.t", "update_table", func, "view"), "updated")
+
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(scheduler.metrics.report()["retries"], 2)
+
+    def test_retry_after_header_is_respected(self):
+        sleep = mock.MagicMock()
+        scheduler = MutationScheduler(rate=1000, burst=1000, sleep=sleep)
+        error = TooManyRequests("429", response=mock.MagicMock(headers={"Retry-After": "7"}))
+        func = mock.MagicMock(side_effect=[error, "updated"])
+
+        scheduler.call("dataset:p.d", "update_dataset", func)
+
+        sleep.assert_any_call(7.0)
+        self.assertEqual(scheduler.metrics.report()["backoff_seconds"], 7.0)
+
+    def test_other_errors_are_not_retried(self):
+        scheduler = MutationScheduler(rate=1000, burst=1000, sleep=mock.MagicMock())
+        for error in (Forbidden("Access denied", errors=[{"reason": "accessDenied"}]), BadRequest("invalid")):
+            func = mock.MagicMock(side_effect=error)
+            with self.assertRaises(type(error)):
+                scheduler.call("table:p.d.t", "update_table", func)
+            func.assert_called_once()
+
+    def test_persistent_rate_limit_fails_after_last_attempt(self):
+        scheduler = MutationScheduler(rate=1000, burst=1000, max_attempts=3, sleep=mock.MagicMock())
+        func = mock.MagicMock(side_effect=_rate_limit_error())
+
+        with self.assertRaises(Forbidden):
+            scheduler.call("table:p.d.t", "update_table", func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_unrelated_resources_do_not_wait_for_each_other(self):
+        blocked = threading.Event()
+        scheduler = MutationScheduler(rate=0.001, burst=1, sleep=lambda _: blocked.wait(5))
+        scheduler.call("table:p.d.a", "update_table", lambda: None)
+
+        # the bucket of table a is empty now, table b still has its own token
+        self.assertEqual(scheduler.call("table:p.d.b", "update_table", lambda: "b"), "b")
+        self.assertFalse(blocked.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import mock
+
+from storage_metadata import TableMetadataLoader
+
+
+class TestTableMetadataLoader(unittest.TestCase):
+    def test_bucket_tables_are_served_from_one_listing(self):
+        sapi_client = mock.MagicMock()
+        sapi_client.buckets.list_tables.return_value = [
+            {"id": "in.c-test.orders", "name": "orders", "metadata": []},
+            {"id": "in.c-test.customers", "name": "customers", "metadata": []},
+        ]
+        loader = TableMetadataLoader(sapi_client)
+
+        self.assertEqual(len(loader.load_bucket("in.c-test")), 2)
+        self.assertEqual(len(loader.load_bucket("in.c-test")), 2)
+        self.assertEqual(loader.get_table("in.c-test.customers")["name"], "customers")
+
+        sapi_client.buckets.list_tables.assert_called_once_with(
+            "in.c-test", include=["columns", "metadata", "columnMetadata"]
+        )
+        sapi_client.tables.detail.assert_not_called()
+
+    def test_table_outside_of_loaded_buckets_falls_back_to_detail(self):
+        sapi_client = mock.MagicMock()
+        sapi_client.tables.detail.return_value = {"id": "in.c-other.orders"}
+        loader = TableMetadataLoader(sapi_client)
+
+        loader.get_table("in.c-other.orders")
+        loader.get_table("in.c-other.orders")
+
+        sapi_client.tables.detail.assert_called_once_with("in.c-other.orders")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from view_state import ViewState
+
+
+def _table_detail(last_change_date="2024-01-01T00:00:00+0100", description="Orders"):
+    return {
+        "id": "in.c-test.orders",
+        "columns": ["id", "name"],
+        "lastChangeDate": last_change_date,
+        "metadata": [{"key": "KBC.description", "value": description}],
+        "columnMetadata": {},
+    }
+
+
+class TestViewState(unittest.TestCase):
+    def test_unchanged_entry_is_detected(self):
+        state = ViewState()
+        entry = ViewState.build_entry(_table_detail(), {"view": "orders"})
+        self.assertFalse(state.is_unchanged("p.d.orders", entry))
+
+        state.update("p.d.orders", entry)
+        restored = ViewState(state.to_dict())
+
+        self.assertTrue(restored.is_unchanged("p.d.orders", ViewState.build_entry(_table_detail(), {"view": "orders"})))
+
+    def test_changes_upstream_or_in_definition_are_detected(self):
+        state = ViewState({"p.d.orders": ViewState.build_entry(_table_detail(), {"view": "orders"})})
+
+        for entry in (
+            ViewState.build_entry(_table_detail(description="Changed"), {"view": "orders"}),
+            ViewState.build_entry(_table_detail(), {"view": "orders", "custom_columns": ["id"]}),
+        ):
+            self.assertFalse(state.is_unchanged("p.d.orders", entry))
+
+    def test_new_data_import_does_not_change_the_entry(self):
+        state = ViewState({"p.d.orders": ViewState.build_entry(_table_detail(), {"view": "orders"})})
+        entry = ViewState.build_entry(_table_detail(last_change_date="2024-02-01T00:00:00+0100"), {"view": "orders"})
+
+        self.assertTrue(state.is_unchanged("p.d.orders", entry))
+        state.update("p.d.orders", entry)
+        self.assertEqual(state.to_dict()["p.d.orders"]["last_change_date"], "2024-02-01T00:00:00+0100")
+
+    def test_query_cost_is_kept_for_the_same_definition(self):
+        state = ViewState()
+        entry = ViewState.build_entry(_table_detail(), {"view": "orders"})
+        state.update("p.d.orders", entry)
+        state.set_query_cost("p.d.orders", {"full_bytes": 10, "selected_bytes": 5})
+        self.assertTrue(state.is_unchanged("p.d.orders", entry))
+
+        state.update("p.d.orders", ViewState.build_entry(_table_detail(description="Changed"), {"view": "orders"}))
+        self.assertEqual(state.to_dict()["p.d.orders"]["query_cost"]["selected_bytes"], 5)
+
+        state.update("p.d.orders", ViewState.build_entry(_table_detail(), {"view": "orders", "custom_columns": ["id"]}))
+        self.assertNotIn("query_cost", state.to_dict()["p.d.orders"])
+
+    def test_query_cost_of_unknown_view_is_ignored(self):
+        state = ViewState()
+        state.set_query_cost("p.d.orders", {"full_bytes": 10, "selected_bytes": 5})
+        self.assertEqual(state.to_dict(), {})
+
+    def test_entry_without_granted_access_is_not_unchanged(self):
+        entry = ViewState.build_entry(_table_detail(), {})
+        entry["acl_granted"] = False
+        self.assertFalse(ViewState({"p.d.orders": entry}).is_unchanged("p.d.orders", entry))
+
+
+if __name__ == "__main__":
+    unittest.main()